@@ -1,11 +1,67 @@
 from django.contrib import admin
+from django.http import HttpRequest, QueryDict
 
 from blogs.models import Blog, Post, User
 from logs.models import EventType, Log, SpaceType
 
+from .models import LogShardOverride
+from .sharding import get_shards
+
+
+def admin_shard(request: HttpRequest) -> str:
+    """
+    Возвращает шард логов, выбранный в админке.
+
+    Шард берётся из параметра `shard` списка или из сохранённых фильтров списка
+    (`_changelist_filters`) на страницах отдельного лога.
+
+    Аргументы:
+        request (HttpRequest): Запрос к админке.
+
+    Возвращает:
+        str: Псевдоним шарда; по умолчанию первый из `LOG_SHARDS`.
+    """
+    shards = get_shards()
+    shard = request.GET.get('shard') or QueryDict(request.GET.get('_changelist_filters', '')).get('shard')
+    return shard if shard in shards else shards[0]
+
+
+class LogShardFilter(admin.SimpleListFilter):
+    """
+    Фильтр списка логов по шарду.
+
+    Список логов показывает один шард: постраничный список по всем шардам потребовал бы
+    сортировки и подсчёта строк во всех базах на каждой странице.
+    """
+    title = "шард"
+    parameter_name = 'shard'
+
+    def lookups(self, request: HttpRequest, model_admin: admin.ModelAdmin) -> list[tuple[str, str]]:
+        shards = get_shards()
+        return [(shard, shard) for shard in shards] if len(shards) > 1 else []
+
+    def value(self) -> str | None:
+        return super().value() or (get_shards()[0] if len(get_shards()) > 1 else None)
+
+    def queryset(self, request: HttpRequest, queryset):
+        # Шард уже выбран в `LogAdmin.get_queryset`.
+        return queryset
+
+
+@admin.register(Log)
+class LogAdmin(admin.ModelAdmin):
+    """Логи в админке читаются из выбранного шарда (см. `admin_shard`)."""
+    list_display = ('id', 'datetime', 'user_id', 'event_type', 'space_type', 'space_id')
+    list_filter = (LogShardFilter,)
+    list_select_related = ('event_type', 'space_type')
+
+    def get_queryset(self, request: HttpRequest):
+        return super().get_queryset(request).using(admin_shard(request))
+
+
 admin.site.register(User)
 admin.site.register(Blog)
 admin.site.register(Post)
 admin.site.register(SpaceType)
 admin.site.register(EventType)
-admin.site.register(Log)
\ No newline at end of file
+admin.site.register(LogShardOverride)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UseractionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'UserActions'
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401
@@ -0,0 +1,189 @@
+import datetime
+import functools
+import zoneinfo
+
+from django.db.models import Case, CharField, DateField, F, Func, Value, When
+from django.db.models.expressions import Expression
+from django.db.models.functions import Concat, Substr
+
+# Логи хранят время в UTC текстом 'YYYY-MM-DD HH:MM:SS', поэтому начало часа и дня — префиксы строки,
+# а переход к местному времени — сдвиг встроенной функцией SQLite datetime(), без Python-функций на строку.
+HOUR_PREFIX = 13
+DAY_PREFIX = 10
+
+# Шаг поиска смены смещения часового пояса; переходы на летнее время не бывают чаще раза в сутки.
+OFFSET_SCAN_STEP = datetime.timedelta(days=1)
+
+
+def is_utc(zone: datetime.tzinfo) -> bool:
+    """Проверяет, что часовой пояс — UTC."""
+    return zone in (datetime.UTC, zoneinfo.ZoneInfo('UTC')) or str(zone) in ('UTC', 'Etc/UTC')
+
+
+def offset_minutes(zone: datetime.tzinfo, epoch: int) -> int:
+    """Возвращает смещение часового пояса от UTC в минутах в момент `epoch` (секунды)."""
+    moment = datetime.datetime.fromtimestamp(epoch, datetime.UTC)
+    return int(moment.astimezone(zone).utcoffset().total_seconds() // 60)
+
+
+@functools.lru_cache(maxsize=256)
+def offset_segments(zone: datetime.tzinfo, start: datetime.date, end: datetime.date) -> tuple[tuple[int | None, int], ...]:
+    """
+    Находит смещения часового пояса от UTC на отрезке дат и моменты их смены.
+
+    Аргументы:
+        zone (tzinfo): Часовой пояс.
+        start (date): Первый день отрезка (UTC).
+        end (date): День после последнего дня отрезка (UTC).
+
+    Возвращает:
+        tuple: Пары (момент начала действия смещения в секундах UTC или None для первого, смещение в минутах)
+        в порядке возрастания времени.
+    """
+    step = int(OFFSET_SCAN_STEP.total_seconds())
+    current = int(datetime.datetime.combine(start, datetime.time.min, datetime.UTC).timestamp())
+    last = int(datetime.datetime.combine(end, datetime.time.min, datetime.UTC).timestamp())
+    segments = [(None, offset_minutes(zone, current))]
+    while current < last:
+        following = min(current + step, last)
+        if offset_minutes(zone, following) != segments[-1][1]:
+            low, high = current, following
+            while high - low > 1:
+                middle = (low + high) // 2
+                if offset_minutes(zone, middle) == segments[-1][1]:
+                    low = middle
+                else:
+                    high = middle
+            segments.append((high, offset_minutes(zone, high)))
+            following = high
+        current = following
+    return tuple(segments)
+
+
+def offset_shift(zone: datetime.tzinfo, bounds: tuple[datetime.datetime, datetime.datetime] | None,
+                 sign: int = 1) -> Expression | None:
+    """
+    Возвращает модификатор функции SQLite datetime(), сдвигающий время лога на смещение часового пояса.
+
+    Смещение берётся на момент события: смены смещения внутри `bounds` (переходы на летнее время)
+    перечисляются в `CASE` по колонке `datetime`.
+
+    Аргументы:
+        zone (tzinfo): Часовой пояс.
+        bounds (tuple | None): Самое раннее и самое позднее время логов, которые будут сгруппированы.
+        sign (int): 1 — из UTC в местное время, -1 — обратно.
+
+    Возвращает:
+        Expression | None: Текст вида '+180 minutes'; None для UTC.
+    """
+    if is_utc(zone):
+        return None
+    low, high = bounds or (datetime.datetime.now(datetime.UTC),) * 2
+    segments = offset_segments(
+        zone, low.astimezone(datetime.UTC).date(),
+        high.astimezone(datetime.UTC).date() + datetime.timedelta(days=1),
+    )
+    modifiers = [Value(f"{sign * offset:+d} minutes") for _, offset in segments]
+    if len(segments) == 1:
+        return modifiers[0]
+    return Case(
+        *(
+            When(datetime__lt=datetime.datetime.fromtimestamp(moment, datetime.UTC), then=modifier)
+            for (moment, _), modifier in zip(segments[1:], modifiers)
+        ),
+        default=modifiers[-1],
+        output_field=CharField(),
+    )
+
+
+def local_datetime(zone: datetime.tzinfo, bounds: tuple[datetime.datetime, datetime.datetime] | None) -> Expression:
+    """
+    Возвращает выражение местного времени лога в часовом поясе `zone`.
+
+    Для UTC это сама колонка `datetime`, для других поясов — время, сдвинутое на смещение,
+    действовавшее в момент события (см. `offset_shift`).
+
+    Аргументы:
+        zone (tzinfo): Часовой пояс.
+        bounds (tuple | None): Самое раннее и самое позднее время логов, которые будут сгруппированы.
+
+    Возвращает:
+        Expression: Текст 'YYYY-MM-DD HH:MM:SS' в местном времени.
+    """
+    shift = offset_shift(zone, bounds)
+    if shift is None:
+        return F('datetime')
+    return Func(F('datetime'), shift, function='datetime', output_field=CharField())
+
+
+def bucket_expression(granularity: str, zone: datetime.tzinfo,
+                      bounds: tuple[datetime.datetime, datetime.datetime] | None = None) -> Expression:
+    """
+    Возвращает выражение начала интервала группировки лога.
+
+    Начало часа возвращается моментом в UTC: местный час, повторяющийся при переходе на зимнее время,
+    — это два разных интервала с разными смещениями, и текст местного времени их бы объединил.
+
+    Аргументы:
+        granularity (str): 'hour', 'day', 'week' (с понедельника) или 'month'.
+        zone (tzinfo): Часовой пояс интервалов.
+        bounds (tuple | None): Границы времени логов (см. `local_datetime`); для UTC не нужны.
+
+    Возвращает:
+        Expression: Дата начала интервала; для 'hour' — текст 'YYYY-MM-DD HH:MM:SS' в UTC (см. `parse_bucket`).
+    """
+    local = local_datetime(zone, bounds)
+    if granularity == 'hour':
+        start = Concat(Substr(local, 1, HOUR_PREFIX), Value(':00:00'), output_field=CharField())
+        shift = offset_shift(zone, bounds, sign=-1)
+        return start if shift is None else Func(start, shift, function='datetime', output_field=CharField())
+    if granularity == 'day':
+        return Substr(local, 1, DAY_PREFIX, output_field=DateField())
+    if granularity == 'week':
+        return Func(local, Value('weekday 0'), Value('-6 days'), function='date', output_field=DateField())
+    return Func(local, Value('start of month'), function='date', output_field=DateField())
+
+
+def parse_bucket(value: str | datetime.date, granularity: str, zone: datetime.tzinfo) -> datetime.date | datetime.datetime:
+    """
+    Переводит начало интервала из результата запроса или курсора в дату или время.
+
+    Аргументы:
+        value (str | date): Значение `bucket_expression` (для 'hour' — время в UTC без смещения)
+            или ISO-строка курсора (для 'hour' — со смещением).
+        granularity (str): Размер интервала.
+        zone (tzinfo): Часовой пояс интервалов.
+
+    Возвращает:
+        date | datetime: Дата начала интервала; для 'hour' — время начала часа с часовым поясом.
+
+    Исключения:
+        ValueError: Если значение не является датой или временем.
+    """
+    if granularity != 'hour':
+        return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(value)
+    moment = datetime.datetime.fromisoformat(value)
+    # Время без смещения — момент в UTC, поэтому повторяющийся местный час получает верное смещение (fold).
+    return (moment.replace(tzinfo=datetime.UTC) if moment.tzinfo is None else moment).astimezone(zone)
+
+
+def next_bucket_start(bucket: datetime.date | datetime.datetime, granularity: str,
+                      zone: datetime.tzinfo) -> datetime.datetime:
+    """
+    Возвращает начало интервала, следующего за `bucket`.
+
+    Аргументы:
+        bucket (date | datetime): Начало интервала (см. `parse_bucket`).
+        granularity (str): Размер интервала.
+        zone (tzinfo): Часовой пояс интервалов.
+
+    Возвращает:
+        datetime: Момент начала следующего интервала с часовым поясом.
+    """
+    if granularity == 'hour':
+        return (bucket.astimezone(datetime.UTC) + datetime.timedelta(hours=1)).astimezone(zone)
+    if granularity == 'month':
+        start = (bucket.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    else:
+        start = bucket + datetime.timedelta(days=7 if granularity == 'week' else 1)
+    return datetime.datetime.combine(start, datetime.time.min, zone)
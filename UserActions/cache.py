@@ -0,0 +1,284 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш с TTL и ограничением по количеству записей и суммарному размеру.
+
+    Записи вытесняются в порядке давности использования, как только превышено `max_entries`
+    или `max_bytes`. Просроченные записи удаляются при обращении к ним.
+
+    Атрибуты:
+        max_entries (int): Максимальное количество записей.
+        ttl (float | None): Время жизни записи в секундах; None — без ограничения.
+        max_bytes (int | None): Максимальный суммарный размер записей; None — без ограничения.
+        hits, misses, evictions, expirations (int): Счётчики обращений и вытеснений.
+    """
+
+    def __init__(self, max_entries: int, ttl: float | None = None, max_bytes: int | None = None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[Hashable, tuple[Any, float | None, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Возвращает значение по ключу и помечает запись как недавно использованную.
+
+        Аргументы:
+            key (Hashable): Ключ записи.
+            default (Any): Значение, возвращаемое при промахе.
+
+        Возвращает:
+            Any: Значение из кэша или `default`.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, size: int = 0, ttl: float | None = _MISSING) -> None:
+        """
+        Сохраняет значение и вытесняет давно не использованные записи при переполнении.
+
+        Аргументы:
+            key (Hashable): Ключ записи.
+            value (Any): Значение.
+            size (int): Размер записи в байтах, учитываемый в `max_bytes`.
+            ttl (float | None, optional): Время жизни записи; по умолчанию — `self.ttl`.
+        """
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Удаляет запись по ключу, если она есть."""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def delete_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Удаляет все записи, удовлетворяющие условию.
+
+        Аргументы:
+            predicate (Callable): Функция, принимающая ключ и значение записи.
+
+        Возвращает:
+            int: Количество удалённых записей.
+        """
+        with self._lock:
+            keys = [key for key, (value, _, _) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Очищает кэш и сбрасывает счётчики."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает счётчики кэша.
+
+        Возвращает:
+            dict: Количество записей, суммарный размер, попадания, промахи, вытеснения и истечения TTL.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+
+class DatasetCache:
+    """
+    Кэш сериализованных датасетов эндпоинтов comments и general.
+
+    Ключ записи — (эндпоинт, логин, параметры запроса). Каждая запись хранит id пользователя и версию
+    его данных на момент вычисления; версию возвращает функция, переданная в `get_or_build`, — обычно
+    `services.user_log_version`, читающая её из базы данных. Поэтому логи, записанные другим процессом
+    или сырым SQL, тоже делают запись устаревшей, а не только изменения в текущем процессе.
+    """
+
+    def __init__(self, max_entries: int, ttl: float | None, max_bytes: int | None, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.entries = LRUCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+        self.invalidations = 0
+
+    @classmethod
+    def from_settings(cls) -> 'DatasetCache':
+        """Создаёт кэш по настройке `DATASET_CACHE`."""
+        options = getattr(settings, 'DATASET_CACHE', {})
+        return cls(
+            max_entries=options.get('MAX_ENTRIES', 10000),
+            ttl=options.get('TTL', 300),
+            max_bytes=options.get('MAX_BYTES'),
+            enabled=options.get('ENABLED', True),
+        )
+
+    @staticmethod
+    def make_key(endpoint: str, login: str, params: dict | None = None) -> tuple:
+        """Формирует ключ записи из эндпоинта, логина и параметров запроса."""
+        return endpoint, login, tuple(sorted((params or {}).items()))
+
+    def get(self, endpoint: str, login: str, params: dict | None, user_id: int,
+            version: Hashable) -> list[dict] | None:
+        """
+        Возвращает закэшированный датасет или None, если записи нет или она устарела.
+
+        Аргументы:
+            endpoint (str): Название эндпоинта ('comments' или 'general').
+            login (str): Логин пользователя.
+            params (dict | None): Дополнительные параметры запроса.
+            user_id (int): Идентификатор пользователя с этим логином.
+            version (Hashable): Текущая версия данных пользователя.
+
+        Возвращает:
+            list | None: Датасет или None.
+        """
+        if not self.enabled:
+            return None
+        key = self.make_key(endpoint, login, params)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        cached_user_id, cached_version, payload = entry
+        if (cached_user_id, cached_version) != (user_id, version):
+            self.entries.delete(key)
+            self.invalidations += 1
+            return None
+        return json.loads(payload)
+
+    def set(self, endpoint: str, login: str, params: dict | None, user_id: int, data: list[dict],
+            version: Hashable) -> None:
+        """
+        Сохраняет датасет в кэш.
+
+        Аргументы:
+            endpoint (str): Название эндпоинта.
+            login (str): Логин пользователя.
+            params (dict | None): Дополнительные параметры запроса.
+            user_id (int): Идентификатор пользователя.
+            data (list): Сериализованный датасет.
+            version (Hashable): Версия данных пользователя, прочитанная до вычисления датасета.
+        """
+        if not self.enabled:
+            return
+        payload = json.dumps(data, cls=DjangoJSONEncoder).encode()
+        self.entries.set(self.make_key(endpoint, login, params), (user_id, version, payload), size=len(payload))
+
+    def get_or_build(self, endpoint: str, login: str, params: dict | None,
+                     resolve_user: Callable[[str], int], build: Callable[[int], list[dict]],
+                     version: Callable[[int], Hashable]) -> list[dict]:
+        """
+        Возвращает датасет из кэша или вычисляет и сохраняет его.
+
+        Версия читается до вычисления датасета, поэтому логи, записанные во время
+        вычисления, делают сохранённую запись устаревшей.
+
+        Аргументы:
+            endpoint (str): Название эндпоинта.
+            login (str): Логин пользователя.
+            params (dict | None): Дополнительные параметры запроса.
+            resolve_user (Callable): Функция, возвращающая идентификатор пользователя по логину.
+            build (Callable): Функция, вычисляющая датасет по идентификатору пользователя.
+            version (Callable): Функция, возвращающая версию данных пользователя по идентификатору.
+
+        Возвращает:
+            list: Датасет.
+        """
+        user_id = resolve_user(login)
+        current = version(user_id)
+        data = self.get(endpoint, login, params, user_id, current)
+        if data is not None:
+            return data
+        data = build(user_id)
+        self.set(endpoint, login, params, user_id, data, version=current)
+        return data
+
+    async def aget_or_build(self, endpoint: str, login: str, params: dict | None,
+                            resolve_user: Callable[[str], Awaitable[int]],
+                            build: Callable[[int], Awaitable[list[dict]]],
+                            version: Callable[[int], Awaitable[Hashable]]) -> list[dict]:
+        """
+        Асинхронный вариант `get_or_build` для корутин `resolve_user`, `build` и `version`.
+
+        Аргументы:
+            endpoint (str): Название эндпоинта.
+            login (str): Логин пользователя.
+            params (dict | None): Дополнительные параметры запроса.
+            resolve_user (Callable): Корутина, возвращающая идентификатор пользователя по логину.
+            build (Callable): Корутина, вычисляющая датасет по идентификатору пользователя.
+            version (Callable): Корутина, возвращающая версию данных пользователя по идентификатору.
+
+        Возвращает:
+            list: Датасет.
+        """
+        user_id = await resolve_user(login)
+        current = await version(user_id)
+        data = self.get(endpoint, login, params, user_id, current)
+        if data is not None:
+            return data
+        data = await build(user_id)
+        self.set(endpoint, login, params, user_id, data, version=current)
+        return data
+
+    def clear(self) -> None:
+        """Очищает кэш и счётчики."""
+        self.entries.clear()
+        self.invalidations = 0
+
+    def stats(self) -> dict[str, int]:
+        """Возвращает счётчики кэша, включая количество инвалидаций по версии."""
+        return {**self.entries.stats(), "invalidations": self.invalidations}
+
+
+dataset_cache = DatasetCache.from_settings()
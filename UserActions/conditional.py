@@ -0,0 +1,57 @@
+import hashlib
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpRequest
+from django.views.decorators.http import condition
+
+from .dimensions import dimensions
+from .services import comments_dataset_version
+
+# Увеличивается при изменении формата датасетов, чтобы клиенты не получили 304 на старый ответ.
+DATASET_FORMAT_VERSION = 1
+
+
+def request_login(request: HttpRequest, kwargs: dict) -> str | None:
+    """Возвращает логин пользователя из параметров пути (CSV) или GET-параметра `login` (API)."""
+    return kwargs.get('login') or request.GET.get('login')
+
+
+def dataset_version(request: HttpRequest, login: str | None) -> tuple | None:
+    """
+    Возвращает версию данных пользователя запроса (см. `services.comments_dataset_version`).
+
+    Аргументы:
+        request (HttpRequest): Запрос датасета.
+        login (str | None): Логин пользователя.
+
+    Возвращает:
+        tuple | None: id пользователя, версия логов и поколение метаданных постов;
+        None, если логин не указан или не найден — тогда запрос выполняется без проверки.
+    """
+    try:
+        user_id = dimensions.user_id(login) if login else None
+    except ObjectDoesNotExist:
+        return None
+    return None if user_id is None else (user_id, *comments_dataset_version(user_id))
+
+
+def dataset_etag(request: HttpRequest, *args, **kwargs) -> str | None:
+    """
+    Вычисляет ETag ответа датасета по версии данных пользователя.
+
+    Версия включает наибольший id, количество и счётчик изменений логов пользователя, поэтому
+    ETag меняется и при изменении логов на месте, а также поколение метаданных постов — заголовки
+    постов и логины авторов входят в датасет comments. В ETag также входят URL с параметрами,
+    заголовок Accept (JSON и HTML-интерфейс DRF отдаются по одному URL) и версия формата датасетов.
+    """
+    version = dataset_version(request, request_login(request, kwargs))
+    if version is None:
+        return None
+    source = f"{DATASET_FORMAT_VERSION}|{request.get_full_path()}|{request.headers.get('Accept', '')}|{version}"
+    return hashlib.md5(source.encode(), usedforsecurity=False).hexdigest()
+
+
+# Условные GET-запросы к датасетам: при совпадении If-None-Match ответ 304 возвращается до построения
+# датасета, иначе ответ получает заголовок ETag. Last-Modified не отдаётся: время последнего события
+# не является временем изменения датасета (логи пишутся задним числом, изменяются и удаляются).
+dataset_condition = condition(etag_func=dataset_etag)
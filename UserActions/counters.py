@@ -0,0 +1,154 @@
+from django.db import connections, transaction
+
+from .dimensions import dimensions
+
+COUNTER_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS "comment_counters" (
+        "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+        "user_id" INTEGER NOT NULL,
+        "post_id" INTEGER NOT NULL,
+        "comment_count" INTEGER NOT NULL DEFAULT 0,
+        UNIQUE ("user_id", "post_id")
+    )
+'''
+
+# Триггеры поддерживают счётчики в той же транзакции, что и изменение логов. Учитываются комментарии
+# с заданным id поста (как и в модели `Log`, где space_id обязателен); id типа comment подставляется
+# при установке, потому что в теле триггера нельзя использовать параметры запроса.
+COUNTER_INCREMENT_SQL = '''
+    INSERT INTO "comment_counters" ("user_id", "post_id", "comment_count")
+    SELECT NEW."user_id", NEW."space_id", 1
+    WHERE NEW."event_type_id" = {comment} AND NEW."space_id" IS NOT NULL
+    ON CONFLICT ("user_id", "post_id") DO UPDATE SET "comment_count" = "comment_count" + 1;
+'''
+
+COUNTER_DECREMENT_SQL = '''
+    UPDATE "comment_counters" SET "comment_count" = "comment_count" - 1
+    WHERE OLD."event_type_id" = {comment} AND "user_id" = OLD."user_id" AND "post_id" = OLD."space_id";
+    DELETE FROM "comment_counters"
+    WHERE "user_id" = OLD."user_id" AND "post_id" = OLD."space_id" AND "comment_count" <= 0;
+'''
+
+COUNTER_TRIGGERS_SQL = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS "comment_counters_insert" AFTER INSERT ON "logs"
+    BEGIN {COUNTER_INCREMENT_SQL} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS "comment_counters_delete" AFTER DELETE ON "logs"
+    BEGIN {COUNTER_DECREMENT_SQL} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS "comment_counters_update"
+    AFTER UPDATE OF "user_id", "event_type_id", "space_id" ON "logs"
+    BEGIN {COUNTER_DECREMENT_SQL} {COUNTER_INCREMENT_SQL} END
+    ''',
+)
+
+DROP_COUNTERS_SQL = (
+    'DROP TRIGGER IF EXISTS "comment_counters_insert"',
+    'DROP TRIGGER IF EXISTS "comment_counters_delete"',
+    'DROP TRIGGER IF EXISTS "comment_counters_update"',
+    'DROP TABLE IF EXISTS "comment_counters"',
+)
+
+BACKFILL_SQL = '''
+    INSERT INTO "comment_counters" ("user_id", "post_id", "comment_count")
+    SELECT "user_id", "space_id", COUNT(*)
+    FROM "logs"
+    WHERE "event_type_id" = %s AND "space_id" IS NOT NULL
+    GROUP BY "user_id", "space_id"
+'''
+
+# Строки, которые есть только в счётчиках или только в агрегатах логов.
+VERIFY_SQL = '''
+    SELECT COUNT(*) FROM (
+        SELECT * FROM (
+            SELECT "user_id", "post_id", "comment_count" FROM "comment_counters"
+            EXCEPT
+            SELECT "user_id", "space_id", COUNT(*) FROM "logs"
+            WHERE "event_type_id" = %s AND "space_id" IS NOT NULL GROUP BY "user_id", "space_id"
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT "user_id", "space_id", COUNT(*) FROM "logs"
+            WHERE "event_type_id" = %s AND "space_id" IS NOT NULL GROUP BY "user_id", "space_id"
+            EXCEPT
+            SELECT "user_id", "post_id", "comment_count" FROM "comment_counters"
+        )
+    )
+'''
+
+
+def counters_available(alias: str = 'logs_db') -> bool:
+    """
+    Проверяет, установлены ли в базе данных счётчики комментариев.
+
+    Счётчики считаются установленными, если есть таблица и триггер вставки: таблица без триггеров
+    отставала бы от логов.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных (или реплики) с таблицей 'logs'.
+
+    Возвращает:
+        bool: True, если счётчики можно читать вместо агрегирования логов.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE (type = 'table' AND name = 'comment_counters') "
+            "OR (type = 'trigger' AND name = 'comment_counters_insert')"
+        )
+        return cursor.fetchone()[0] == 2
+
+
+def install_comment_counters(alias: str = 'logs_db') -> int:
+    """
+    Создаёт таблицу счётчиков комментариев и триггеры и заполняет таблицу по текущим логам.
+
+    Всё выполняется одной транзакцией, поэтому логи, записанные во время заполнения,
+    учитываются триггерами ровно один раз. Повторный вызов пересчитывает таблицу.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs' (шард или партиция).
+
+    Возвращает:
+        int: Количество строк счётчиков (пар пользователь — пост).
+    """
+    comment = dimensions.event_type_id("comment")
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        cursor.execute(COUNTER_TABLE_SQL)
+        for sql in DROP_COUNTERS_SQL[:-1]:
+            cursor.execute(sql)
+        for sql in COUNTER_TRIGGERS_SQL:
+            cursor.execute(sql.replace('{comment}', str(int(comment))))
+        cursor.execute('DELETE FROM "comment_counters"')
+        cursor.execute(BACKFILL_SQL, [comment])
+        return cursor.rowcount
+
+
+def drop_comment_counters(alias: str = 'logs_db') -> None:
+    """
+    Удаляет триггеры и таблицу счётчиков комментариев.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+    """
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        for sql in DROP_COUNTERS_SQL:
+            cursor.execute(sql)
+
+
+def verify_comment_counters(alias: str = 'logs_db') -> int:
+    """
+    Сравнивает счётчики комментариев с агрегатами логов.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+
+    Возвращает:
+        int: Количество расходящихся строк; 0 — счётчики точны.
+    """
+    comment = dimensions.event_type_id("comment")
+    with connections[alias].cursor() as cursor:
+        cursor.execute(VERIFY_SQL, [comment, comment])
+        return cursor.fetchone()[0]
@@ -1,5 +1,86 @@
+import random
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
 from django.db.models import Model
 
+# Состояние маршрутизации текущего запроса: выбранная реплика для каждой основной базы
+# и основные базы, в которые запрос уже писал (см. `routing_context`).
+_routing_state: ContextVar[dict | None] = ContextVar('db_routing_state', default=None)
+
+
+def get_replicas(primary: str) -> list[str]:
+    """
+    Возвращает псевдонимы реплик для чтения основной базы из настройки `DATABASE_REPLICAS`.
+
+    Аргументы:
+        primary (str): Псевдоним основной базы данных.
+
+    Возвращает:
+        list: Псевдонимы реплик; пустой список, если реплик нет.
+    """
+    return list(getattr(settings, 'DATABASE_REPLICAS', {}).get(primary, ()))
+
+
+def is_replica(db: str) -> bool:
+    """Проверяет, является ли псевдоним репликой какой-либо основной базы."""
+    return any(db in replicas for replicas in getattr(settings, 'DATABASE_REPLICAS', {}).values())
+
+
+def read_db(primary: str) -> str:
+    """
+    Выбирает базу данных для чтения данных основной базы.
+
+    Внутри `routing_context` реплика выбирается случайно один раз и используется для всех чтений
+    запроса, чтобы данные разных запросов к базе были согласованы между собой; после записи
+    в основную базу чтения возвращаются на неё (read-your-writes). Вне контекста реплика
+    выбирается при каждом вызове.
+
+    Аргументы:
+        primary (str): Псевдоним основной базы данных.
+
+    Возвращает:
+        str: Псевдоним основной базы или одной из её реплик.
+    """
+    replicas = get_replicas(primary)
+    if not replicas:
+        return primary
+    state = _routing_state.get()
+    if state is None:
+        return random.choice(replicas)
+    if primary in state["pinned"]:
+        return primary
+    return state["reads"].setdefault(primary, random.choice(replicas))
+
+
+def pin_primary(primary: str) -> None:
+    """
+    Закрепляет чтения текущего запроса за основной базой после записи в неё.
+
+    Аргументы:
+        primary (str): Псевдоним основной базы данных, в которую выполнена запись.
+    """
+    state = _routing_state.get()
+    if state is not None and get_replicas(primary):
+        state["pinned"].add(primary)
+
+
+@contextmanager
+def routing_context() -> Iterator[None]:
+    """
+    Область, в пределах которой выбор реплики сохраняется и действует read-your-writes.
+
+    Открывается `ReadYourWritesMiddleware` на время обработки запроса; может использоваться
+    и в командах или фоновых задачах.
+    """
+    token = _routing_state.set({"reads": {}, "pinned": set()})
+    try:
+        yield
+    finally:
+        _routing_state.reset(token)
+
 
 class BlogsDBRouter:
     """
@@ -12,11 +93,11 @@ class BlogsDBRouter:
     Методы:
         db_for_read(model, **hints):
             Определяет базу данных для операций чтения (SELECT).
-            Возвращает 'blogs_db', если модель относится к приложению 'blogs'.
+            Возвращает 'blogs_db' или её реплику (см. `read_db`), если модель относится к приложению 'blogs'.
 
         db_for_write(model, **hints):
             Определяет базу данных для операций записи (INSERT, UPDATE, DELETE).
-            Возвращает 'blogs_db', если модель относится к приложению 'blogs'.
+            Возвращает 'blogs_db', если модель относится к приложению 'blogs', и закрепляет за ней чтения запроса.
 
         allow_relation(obj1, obj2, **hints):
             Определяет, разрешено ли устанавливать отношения между моделями из разных баз данных.
@@ -24,7 +105,7 @@ class BlogsDBRouter:
 
         allow_migrate(db, app_label, model_name=None, **hints):
             Определяет, разрешена ли миграция для базы данных 'blogs_db'.
-            Возвращает False, что запрещает миграции для базы данных 'blogs_db'.
+            Возвращает False, что запрещает миграции для базы данных 'blogs_db' и её реплик.
     """
 
     def db_for_read(self, model: type[Model], **hints) -> str | None:
@@ -36,10 +117,10 @@ class BlogsDBRouter:
             **hints: Дополнительные параметры для маршрутизации.
 
         Возвращает:
-            str: Название базы данных, если модель принадлежит приложению 'blogs', иначе None.
+            str: Название базы данных или реплики, если модель принадлежит приложению 'blogs', иначе None.
         """
         if model._meta.app_label == 'blogs':
-            return 'blogs_db'
+            return read_db('blogs_db')
         return None
 
     def db_for_write(self, model: type[Model], **hints) -> str | None:
@@ -54,6 +135,7 @@ class BlogsDBRouter:
             str: Название базы данных, если модель принадлежит приложению 'blogs', иначе None.
         """
         if model._meta.app_label == 'blogs':
+            pin_primary('blogs_db')
             return 'blogs_db'
         return None
 
@@ -82,9 +164,9 @@ class BlogsDBRouter:
             **hints: Дополнительные параметры для проверки миграции.
 
         Возвращает:
-            bool: Возвращает False, чтобы запретить миграции для базы данных 'blogs_db'.
+            bool: Возвращает False, чтобы запретить миграции для базы данных 'blogs_db' и её реплик.
         """
-        if app_label == 'blogs':
+        if app_label == 'blogs' or db in get_replicas('blogs_db'):
             return False
         return None
 
@@ -99,11 +181,15 @@ class LogsDBRouter:
     Методы:
         db_for_read(model, **hints):
             Определяет базу данных для операций чтения (SELECT).
-            Возвращает 'logs_db', если модель относится к приложению 'logs'.
+            Возвращает 'logs_db' или её реплику (см. `read_db`), если модель относится к приложению 'logs';
+            логи пользователя (подсказка `user_id` или `instance`) читаются из его шарда или реплики шарда.
 
         db_for_write(model, **hints):
             Определяет базу данных для операций записи (INSERT, UPDATE, DELETE).
-            Возвращает 'logs_db', если модель относится к приложению 'logs'.
+            Возвращает 'logs_db', если модель относится к приложению 'logs', и закрепляет за ней чтения запроса;
+            лог пользователя (в том числе `create`, `bulk_create` и изменения по фильтру `user_id`)
+            записывается в его шард (см. `sharding.shard_map`), а строки, прочитанные из шарда
+            или партиции логов, записываются обратно туда же.
 
         allow_relation(obj1, obj2, **hints):
             Определяет, разрешено ли устанавливать отношения между моделями из разных баз данных.
@@ -111,7 +197,7 @@ class LogsDBRouter:
 
         allow_migrate(db, app_label, model_name=None, **hints):
             Определяет, разрешена ли миграция для базы данных 'logs_db'.
-            Возвращает False, что запрещает миграции для базы данных 'logs_db'.
+            Возвращает False, что запрещает миграции для базы данных 'logs_db', её реплик и партиций.
     """
 
     def db_for_read(self, model: type[Model], **hints) -> str | None:
@@ -123,12 +209,35 @@ class LogsDBRouter:
             **hints: Дополнительные параметры для маршрутизации.
 
         Возвращает:
-            str: Название базы данных, если модель принадлежит приложению 'logs', иначе None.
+            str: Название базы данных или реплики, если модель принадлежит приложению 'logs', иначе None.
         """
+        from .sharding import shard_map
+
         if model._meta.app_label == 'logs':
-            return 'logs_db'
+            user_id = self.user_id_hint(model, hints)
+            return read_db('logs_db' if user_id is None else shard_map.shard_for(user_id))
         return None
 
+    @staticmethod
+    def user_id_hint(model: type[Model], hints: dict) -> int | None:
+        """
+        Возвращает пользователя, по шарду которого маршрутизируется запрос к логам.
+
+        Аргументы:
+            model (Model): Модель запроса.
+            hints (dict): Подсказки маршрутизатору: `user_id` (фильтр `Log.objects.filter(user_id=...)`,
+                см. `logs.models.LogQuerySet`) или `instance` — строка лога.
+
+        Возвращает:
+            int | None: Идентификатор пользователя или None для справочников и запросов без пользователя.
+        """
+        if model._meta.model_name != 'log':
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, model) and instance.user_id is not None:
+            return instance.user_id
+        return hints.get('user_id')
+
     def db_for_write(self, model: type[Model], **hints) -> str | None:
         """
         Определяет, какую базу данных использовать для операций записи.
@@ -140,8 +249,21 @@ class LogsDBRouter:
         Возвращает:
             str: Название базы данных, если модель принадлежит приложению 'logs', иначе None.
         """
+        from .partitions import is_partition
+        from .sharding import get_shards, shard_map
+
         if model._meta.app_label == 'logs':
-            return 'logs_db'
+            instance = hints.get('instance')
+            if instance is not None and instance._state.db and is_partition(instance._state.db):
+                # Строка, прочитанная из партиции логов, изменяется в той же партиции.
+                return instance._state.db
+            user_id = self.user_id_hint(model, hints)
+            db = 'logs_db' if user_id is None else shard_map.shard_for(user_id)
+            if isinstance(instance, model) and instance._state.db in get_shards():
+                # Прочитанная из шарда строка записывается в тот же шард.
+                db = instance._state.db
+            pin_primary(db)
+            return db
         return None
 
     def allow_relation(self, obj1: type[Model], obj2: type[Model], **hints) -> None:
@@ -169,9 +291,11 @@ class LogsDBRouter:
             **hints: Дополнительные параметры для проверки миграции.
 
         Возвращает:
-            bool: Возвращает False, чтобы запретить миграции для базы данных 'logs_db'.
+            bool: Возвращает False, чтобы запретить миграции для базы данных 'logs_db' и её реплик.
         """
-        if app_label == 'logs':
+        from .partitions import is_partition
+
+        if app_label == 'logs' or db in get_replicas('logs_db') or is_partition(db):
             return False
         return None
 
@@ -0,0 +1,194 @@
+import threading
+from collections.abc import Iterable
+
+from django.conf import settings
+
+from blogs.models import User
+from logs.models import EventType, SpaceType
+
+from .cache import LRUCache
+
+_MISSING = object()
+
+
+class DimensionCache:
+    """
+    Кэш справочников процесса: типы событий, типы пространств и соответствие логина идентификатору.
+
+    Справочники `event_type` и `space_type` почти не меняются, поэтому загружаются целиком
+    (при старте процесса — см. `testtask/wsgi.py` и `testtask/asgi.py` — или при первом обращении).
+    Соответствие логина идентификатору хранится в ограниченном LRU-кэше с TTL (`LOGIN_TTL`), чтобы
+    переименования в других процессах не отдавались бесконечно; несуществующие логины тоже
+    кэшируются, но на меньшее время (`NEGATIVE_TTL`). Изменения моделей сбрасывают
+    соответствующие записи через сигналы (см. `UserActions.signals`).
+    """
+
+    def __init__(self, max_logins: int, login_ttl: float | None, negative_ttl: float | None) -> None:
+        self.negative_ttl = negative_ttl
+        self.logins = LRUCache(max_entries=max_logins, ttl=login_ttl)
+        self._event_types: dict[str, int] | None = None
+        self._space_types: dict[str, int] | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'DimensionCache':
+        """Создаёт кэш по настройке `DIMENSION_CACHE`."""
+        options = getattr(settings, 'DIMENSION_CACHE', {})
+        return cls(
+            max_logins=options.get('MAX_LOGINS', 100000),
+            login_ttl=options.get('LOGIN_TTL', 300),
+            negative_ttl=options.get('NEGATIVE_TTL', 60),
+        )
+
+    def preload(self) -> tuple[dict[str, int], dict[str, int]]:
+        """
+        Загружает справочники типов событий и пространств из 'logs_db'.
+
+        Возвращает:
+            tuple: Названия типов событий → id и названия типов пространств → id.
+        """
+        event_types = dict(EventType.objects.using('logs_db').values_list('name', 'id'))
+        space_types = dict(SpaceType.objects.using('logs_db').values_list('name', 'id'))
+        with self._lock:
+            self._event_types, self._space_types = event_types, space_types
+        return event_types, space_types
+
+    def types(self) -> tuple[dict[str, int], dict[str, int]]:
+        """
+        Возвращает справочники типов, загружая их при необходимости.
+
+        Оба справочника читаются под блокировкой в локальные переменные, поэтому одновременный
+        `invalidate_types` не может сбросить их между проверкой и обращением.
+        """
+        with self._lock:
+            event_types, space_types = self._event_types, self._space_types
+        if event_types is None or space_types is None:
+            return self.preload()
+        return event_types, space_types
+
+    def refresh(self) -> None:
+        """Сбрасывает все справочники; типы будут загружены заново при следующем обращении."""
+        with self._lock:
+            self._event_types = self._space_types = None
+        self.logins.clear()
+
+    def invalidate_types(self) -> None:
+        """Сбрасывает справочники типов событий и пространств."""
+        with self._lock:
+            self._event_types = self._space_types = None
+
+    def invalidate_user(self, user_id: int | None = None, login: str | None = None) -> None:
+        """
+        Удаляет из кэша записи пользователя по идентификатору и/или логину.
+
+        Аргументы:
+            user_id (int, optional): Идентификатор пользователя.
+            login (str, optional): Логин пользователя, в том числе закэшированный как несуществующий.
+        """
+        self.logins.delete_where(lambda key, value: key == login or (user_id is not None and value == user_id))
+
+    def event_type_id(self, name: str) -> int:
+        """
+        Возвращает идентификатор типа события по названию.
+
+        Аргументы:
+            name (str): Название типа события.
+
+        Возвращает:
+            int: Идентификатор типа события.
+
+        Исключения:
+            EventType.DoesNotExist: Если тип события не найден.
+        """
+        event_types, _ = self.types()
+        try:
+            return event_types[name]
+        except KeyError:
+            raise EventType.DoesNotExist(f"EventType '{name}' does not exist") from None
+
+    def space_type_id(self, name: str) -> int:
+        """
+        Возвращает идентификатор типа пространства по названию.
+
+        Аргументы:
+            name (str): Название типа пространства.
+
+        Возвращает:
+            int: Идентификатор типа пространства.
+
+        Исключения:
+            SpaceType.DoesNotExist: Если тип пространства не найден.
+        """
+        _, space_types = self.types()
+        try:
+            return space_types[name]
+        except KeyError:
+            raise SpaceType.DoesNotExist(f"SpaceType '{name}' does not exist") from None
+
+    def user_id(self, login: str) -> int:
+        """
+        Возвращает идентификатор пользователя по логину.
+
+        Аргументы:
+            login (str): Логин пользователя.
+
+        Возвращает:
+            int: Идентификатор пользователя.
+
+        Исключения:
+            User.DoesNotExist: Если пользователь не найден (в том числе по закэшированному промаху).
+        """
+        user_id = self.logins.get(login, _MISSING)
+        if user_id is _MISSING:
+            user_id = User.objects.using('blogs_db').filter(login=login).values_list('id', flat=True).first()
+            self.remember(login, user_id)
+        if user_id is None:
+            raise User.DoesNotExist(f"User '{login}' does not exist")
+        return user_id
+
+    def user_ids(self, logins: Iterable[str], chunk_size: int = 500) -> dict[str, int]:
+        """
+        Возвращает идентификаторы пользователей для набора логинов, запрашивая из базы только промахи.
+
+        Аргументы:
+            logins (Iterable): Логины пользователей.
+            chunk_size (int): Количество логинов в одном запросе.
+
+        Возвращает:
+            dict: Логин → идентификатор; несуществующие логины в словарь не попадают.
+        """
+        found, unknown = {}, []
+        for login in set(logins):
+            user_id = self.logins.get(login, _MISSING)
+            if user_id is _MISSING:
+                unknown.append(login)
+            elif user_id is not None:
+                found[login] = user_id
+
+        for start in range(0, len(unknown), chunk_size):
+            chunk = unknown[start:start + chunk_size]
+            resolved = dict(User.objects.using('blogs_db').filter(login__in=chunk).values_list('login', 'id'))
+            for login in chunk:
+                self.remember(login, resolved.get(login))
+            found.update(resolved)
+        return found
+
+    def remember(self, login: str, user_id: int | None) -> None:
+        """
+        Сохраняет соответствие логина идентификатору; None означает несуществующий логин.
+
+        Аргументы:
+            login (str): Логин пользователя.
+            user_id (int | None): Идентификатор пользователя или None.
+        """
+        if user_id is None:
+            self.logins.set(login, None, ttl=self.negative_ttl)
+        else:
+            self.logins.set(login, user_id)
+
+    def stats(self) -> dict[str, int]:
+        """Возвращает счётчики кэша логинов."""
+        return self.logins.stats()
+
+
+dimensions = DimensionCache.from_settings()
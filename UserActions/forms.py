@@ -1,56 +1,62 @@
 from django import forms
-from django_select2.forms import Select2Widget
+from django_select2.forms import HeavySelect2Widget
 
 from blogs.models import User
 
+from .dimensions import dimensions
+
 
 class InputUserLogin(forms.Form):
     """
     Форма для ввода или выбора логина пользователя.
 
-    Эта форма предназначена для отображения выпадающего списка логинов пользователей,
-    с возможностью ввода логина вручную.
+    Логины не загружаются в форму целиком: виджет `HeavySelect2Widget` запрашивает их постранично
+    по мере ввода у эндпоинта `login-autocomplete`, а при отправке формы введённый логин
+    проверяется одним запросом по уникальному индексу.
 
     Поля:
-        input_login (ChoiceField): Поле для выбора или ввода логина пользователя.
-            - Предоставляет список логинов, загружаемых через метод `get_user_choices`.
-            - Также поддерживает возможность ввода логина вручную, если он не найден в списке.
-            - Используется виджет `Select2Widget` для улучшения интерфейса выбора.
+        input_login (CharField): Поле для выбора или ввода логина пользователя.
+            - Варианты подгружаются через AJAX по началу логина.
+            - В разметку попадает только выбранный логин, чтобы он отобразился после отправки формы.
     """
-    input_login = forms.ChoiceField(
+    input_login = forms.CharField(
         label="Логин Пользователя",
-        choices=[],
         required=False,
-        widget=Select2Widget(attrs={'class': 'form-select', 'data-placeholder': 'Введите или выберите логин'})
+        widget=HeavySelect2Widget(
+            data_view='login-autocomplete',
+            attrs={
+                'class': 'form-select',
+                'data-placeholder': 'Введите или выберите логин',
+                'data-minimum-input-length': 0,
+            },
+        )
     )
 
     def __init__(self, *args, **kwargs) -> None:
         """
-        Инициализация формы с заполнением выбора логинов.
-
-        При инициализации формы происходит вызов метода `get_user_choices`, который заполняет
-        поле выбора доступными логинами пользователей.
+        Инициализация формы с единственным вариантом выбора — текущим логином.
 
         Аргументы:
             *args, **kwargs: Передаются аргументы родительскому классу `forms.Form`.
         """
         super().__init__(*args, **kwargs)
-        self.fields["input_login"].choices = self.get_user_choices()
+        login = self.data.get(self.add_prefix("input_login")) if self.is_bound else self.initial.get("input_login")
+        self.fields["input_login"].widget.choices = [(login, login)] if login else []
 
-    @staticmethod
-    def get_user_choices() -> list[tuple[str, str]]:
+    def clean_input_login(self) -> str:
         """
-        Получение списка логинов всех пользователей.
-
-        Этот метод формирует список кортежей для поля выбора логинов пользователей.
-        Список логинов пользователей загружается из базы данных.
+        Проверяет, что пользователь с введённым логином существует.
 
         Возвращает:
-            list: Список кортежей в формате (значение, отображаемое название), включая
-            опцию для ввода логина вручную.
-        """
-        users = User.objects.all()
-        choices = [("", "--- Введите или выберите логин ---")] + [(user.login, user.login) for user in users]
-        return choices
-
+            str: Логин пользователя.
 
+        Исключения:
+            ValidationError: Если пользователь с таким логином не найден.
+        """
+        login = self.cleaned_data["input_login"]
+        if login:
+            try:
+                dimensions.user_id(login)
+            except User.DoesNotExist:
+                raise forms.ValidationError("Пользователь с таким логином не найден.") from None
+        return login
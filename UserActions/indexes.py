@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+
+from django.db import connections
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """
+    Описание вторичного индекса для неуправляемой (managed = False) таблицы.
+
+    Таблицы приложений 'logs' и 'blogs' не мигрируются Django (см. `db_routers`),
+    поэтому индексы для них объявляются здесь и создаются командой `db_indexes`.
+
+    Атрибуты:
+        alias (str): Псевдоним базы данных, в которой находится таблица.
+        name (str): Имя индекса.
+        table (str): Имя таблицы.
+        columns (tuple): Колонки индекса в порядке следования.
+    """
+    alias: str
+    name: str
+    table: str
+    columns: tuple[str, ...]
+
+    @property
+    def create_sql(self) -> str:
+        """Возвращает SQL для создания индекса."""
+        columns = ", ".join(f'"{column}"' for column in self.columns)
+        return f'CREATE INDEX IF NOT EXISTS "{self.name}" ON "{self.table}" ({columns})'
+
+    @property
+    def drop_sql(self) -> str:
+        """Возвращает SQL для удаления индекса."""
+        return f'DROP INDEX IF EXISTS "{self.name}"'
+
+
+INDEXES = (
+    # comments: WHERE user_id = ? AND event_type_id = ? GROUP BY space_id
+    IndexSpec('logs_db', 'logs_user_event_space_idx', 'logs', ('user_id', 'event_type_id', 'space_id')),
+    # general: WHERE user_id = ? GROUP BY date(datetime), счётчики по event_type_id и space_type_id
+    IndexSpec('logs_db', 'logs_user_datetime_idx', 'logs', ('user_id', 'datetime', 'event_type_id', 'space_type_id')),
+    # посты по автору
+    IndexSpec('blogs_db', 'post_author_idx', 'post', ('author_id',)),
+)
+
+
+def get_index_columns(alias: str, name: str) -> tuple[str, ...] | None:
+    """
+    Возвращает колонки существующего индекса.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных.
+        name (str): Имя индекса.
+
+    Возвращает:
+        tuple | None: Колонки индекса или None, если индекса нет.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = %s", [name])
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute(f'PRAGMA index_info("{name}")')
+        return tuple(row[2] for row in sorted(cursor.fetchall()))
+
+
+def create_indexes(specs: tuple[IndexSpec, ...] = INDEXES) -> None:
+    """
+    Создаёт объявленные индексы, если их ещё нет.
+
+    Аргументы:
+        specs (tuple): Индексы, которые нужно создать.
+    """
+    for spec in specs:
+        with connections[spec.alias].cursor() as cursor:
+            cursor.execute(spec.create_sql)
+
+
+def drop_indexes(specs: tuple[IndexSpec, ...] = INDEXES) -> None:
+    """
+    Удаляет объявленные индексы.
+
+    Аргументы:
+        specs (tuple): Индексы, которые нужно удалить.
+    """
+    for spec in specs:
+        with connections[spec.alias].cursor() as cursor:
+            cursor.execute(spec.drop_sql)
+
+
+def verify_indexes(specs: tuple[IndexSpec, ...] = INDEXES) -> dict[IndexSpec, str]:
+    """
+    Проверяет, что объявленные индексы существуют и совпадают по колонкам.
+
+    Аргументы:
+        specs (tuple): Индексы для проверки.
+
+    Возвращает:
+        dict: Состояние каждого индекса: 'ok', 'missing' или 'mismatch'.
+    """
+    result = {}
+    for spec in specs:
+        columns = get_index_columns(spec.alias, spec.name)
+        if columns is None:
+            result[spec] = 'missing'
+        elif columns != spec.columns:
+            result[spec] = 'mismatch'
+        else:
+            result[spec] = 'ok'
+    return result
@@ -0,0 +1,169 @@
+import datetime
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from logs.models import EventType, SpaceType
+
+from .db_routers import pin_primary
+from .dimensions import dimensions
+from .parsers import InvalidLine
+from .services import chunked
+from .sharding import shard_map
+
+# Количество событий, записываемых одной транзакцией.
+INGEST_BATCH_SIZE = 5000
+
+# Наибольший размер пачки, который можно задать в запросе.
+INGEST_MAX_BATCH_SIZE = 50000
+
+INSERT_SQL = (
+    'INSERT INTO "logs" ("datetime", "user_id", "space_type_id", "event_type_id", "space_id") '
+    'VALUES (%s, %s, %s, %s, %s)'
+)
+
+
+class InvalidEvent(ValueError):
+    """Событие не может быть записано: не хватает полей или значения неверны."""
+
+
+@dataclass
+class BatchReport:
+    """
+    Результат записи одной пачки событий.
+
+    Атрибуты:
+        accepted (int): Количество записанных событий.
+        rejected (int): Количество отклонённых событий.
+        errors (list): Причины отклонения: {"index": номер события в запросе, "error": причина}.
+    """
+    accepted: int = 0
+    rejected: int = 0
+    errors: list[dict] = field(default_factory=list)
+
+    def reject(self, index: int, error: str) -> None:
+        """Учитывает отклонённое событие."""
+        self.rejected += 1
+        self.errors.append({"index": index, "error": error})
+
+    def as_dict(self) -> dict:
+        """Возвращает отчёт в виде словаря для ответа API."""
+        return {"accepted": self.accepted, "rejected": self.rejected, "errors": self.errors}
+
+
+def parse_event(event: object, user_ids: dict[str, int]) -> tuple[datetime.datetime, int, int, int, int | None]:
+    """
+    Проверяет событие и переводит его в строку таблицы логов.
+
+    Событие — объект {"datetime": ISO 8601, "user_id": id или "login": логин, "event_type": имя,
+    "space_type": имя, "space_id": id или null}. Время без часового пояса считается временем UTC.
+
+    Аргументы:
+        event (object): Событие из тела запроса.
+        user_ids (dict): Логин → идентификатор для логинов пачки (см. `DimensionCache.user_ids`).
+
+    Возвращает:
+        tuple: Время, id пользователя, id типа пространства, id типа события и id пространства.
+
+    Исключения:
+        InvalidEvent: Если событие не объект или его поля неверны.
+    """
+    if isinstance(event, InvalidLine):
+        raise InvalidEvent(event.error)
+    if not isinstance(event, dict):
+        raise InvalidEvent("Event must be a JSON object")
+
+    moment = parse_datetime(event['datetime']) if isinstance(event.get('datetime'), str) else None
+    if moment is None:
+        raise InvalidEvent("Invalid datetime")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.UTC)
+
+    user_id = event.get('user_id')
+    if user_id is None and isinstance(event.get('login'), str):
+        user_id = user_ids.get(event['login'])
+        if user_id is None:
+            raise InvalidEvent("Unknown login")
+    if not isinstance(user_id, int) or isinstance(user_id, bool) or user_id <= 0:
+        raise InvalidEvent("Invalid user_id")
+
+    try:
+        event_type_id = dimensions.event_type_id(event.get('event_type'))
+    except (EventType.DoesNotExist, TypeError):
+        raise InvalidEvent("Unknown event_type") from None
+    try:
+        space_type_id = dimensions.space_type_id(event.get('space_type'))
+    except (SpaceType.DoesNotExist, TypeError):
+        raise InvalidEvent("Unknown space_type") from None
+
+    space_id = event.get('space_id')
+    if space_id is not None and (not isinstance(space_id, int) or isinstance(space_id, bool)):
+        raise InvalidEvent("Invalid space_id")
+    return moment, user_id, space_type_id, event_type_id, space_id
+
+
+def ingest_batch(events: list, offset: int = 0) -> BatchReport:
+    """
+    Записывает пачку событий в таблицу логов.
+
+    Логины разрешаются одним запросом на пачку, типы событий и пространств — по справочникам
+    в памяти процесса. Строки группируются по шардам пользователей и записываются через
+    `executemany` одной транзакцией на шард, поэтому ошибка базы данных отклоняет события
+    шарда целиком, а неверные события отклоняются по отдельности. Сигналы моделей при этом
+    не отправляются; кэш датасетов замечает новые логи по их версии в базе данных.
+
+    Аргументы:
+        events (list): События (см. `parse_event`).
+        offset (int): Номер первого события пачки в запросе.
+
+    Возвращает:
+        BatchReport: Количество записанных и отклонённых событий.
+    """
+    report = BatchReport()
+    logins = {event['login'] for event in events if isinstance(event, dict) and isinstance(event.get('login'), str)}
+    user_ids = dimensions.user_ids(logins) if logins else {}
+
+    rows_by_shard: dict[str, list[tuple[int, tuple]]] = {}
+    for index, event in enumerate(events, offset):
+        try:
+            row = parse_event(event, user_ids)
+        except InvalidEvent as error:
+            report.reject(index, str(error))
+            continue
+        rows_by_shard.setdefault(shard_map.shard_for(row[1]), []).append((index, row))
+
+    for shard, rows in rows_by_shard.items():
+        adapt = connections[shard].ops.adapt_datetimefield_value
+        params = [(adapt(moment), *rest) for _, (moment, *rest) in rows]
+        try:
+            with transaction.atomic(using=shard), connections[shard].cursor() as cursor:
+                cursor.executemany(INSERT_SQL, params)
+        except DatabaseError:
+            for index, _ in rows:
+                report.reject(index, "Database error")
+            continue
+        pin_primary(shard)
+        report.accepted += len(rows)
+    return report
+
+
+def ingest_events(events: Iterable, batch_size: int = INGEST_BATCH_SIZE) -> list[BatchReport]:
+    """
+    Записывает события пачками по `batch_size` (см. `ingest_batch`).
+
+    События читаются из итератора по мере записи, поэтому поток NDJSON не загружается в память целиком.
+
+    Аргументы:
+        events (Iterable): События.
+        batch_size (int): Количество событий в пачке.
+
+    Возвращает:
+        list: Отчёты по пачкам в порядке записи.
+    """
+    return [
+        ingest_batch(batch, number * batch_size)
+        for number, batch in enumerate(chunked(events, batch_size))
+    ]
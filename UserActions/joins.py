@@ -0,0 +1,90 @@
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any
+
+from django.db.models import Model
+
+from .db_routers import read_db
+
+# Количество идентификаторов в одном условии `IN (...)`; держится ниже лимита переменных SQLite.
+IN_CHUNK_SIZE = 500
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Разбивает последовательность на списки длиной не больше `size`.
+
+    Аргументы:
+        iterable (Iterable): Исходная последовательность.
+        size (int): Максимальная длина пачки.
+
+    Возвращает:
+        Iterator: Пачки элементов.
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@dataclass(frozen=True)
+class ForeignLookup:
+    """
+    Описание соединения строк с таблицей другой базы данных по внешнему id.
+
+    Атрибуты:
+        model (type[Model]): Модель таблицы, в которой ищутся строки.
+        key (str): Колонка строки с id записи модели.
+        columns (dict): Колонка результата → поле модели; читаются только эти поля.
+        defaults (dict): Значения колонок результата, если id не задан или запись не найдена.
+        alias (str): Основная база данных модели; чтение идёт из неё или её реплики.
+    """
+    model: type[Model]
+    key: str
+    columns: dict[str, str]
+    defaults: dict[str, Any] = field(default_factory=dict)
+    alias: str = 'blogs_db'
+
+    def fetch(self, ids: Iterable[int], chunk_size: int = IN_CHUNK_SIZE) -> dict[int, tuple]:
+        """
+        Читает нужные поля записей по id пачками не больше `chunk_size`.
+
+        Аргументы:
+            ids (Iterable): Идентификаторы записей без повторов.
+            chunk_size (int): Количество id в одном условии `IN (...)`.
+
+        Возвращает:
+            dict: id → значения полей в порядке `columns`.
+        """
+        queryset = self.model.objects.using(read_db(self.alias))
+        found = {}
+        for chunk in chunked(ids, chunk_size):
+            for pk, *values in queryset.filter(pk__in=chunk).values_list('pk', *self.columns.values()):
+                found[pk] = tuple(values)
+        return found
+
+
+def join_foreign(rows: Iterable[dict], lookups: Sequence[ForeignLookup], chunk_size: int = 2000) -> Iterator[dict]:
+    """
+    Построчно дополняет строки одной базы данных колонками из таблиц другой.
+
+    Строки читаются пачками по `chunk_size`; для каждой пачки каждая таблица из `lookups` запрашивается
+    один раз по уникальным id пачки (с разбиением на `IN_CHUNK_SIZE`). Соединения выполняются по порядку,
+    поэтому следующее может использовать колонку, добавленную предыдущим (пост → автор).
+
+    Аргументы:
+        rows (Iterable): Строки-словари, например агрегаты логов.
+        lookups (Sequence): Соединения (см. `ForeignLookup`).
+        chunk_size (int): Количество строк в пачке.
+
+    Возвращает:
+        Iterator: Копии строк с добавленными колонками, в исходном порядке.
+    """
+    for chunk in chunked(rows, chunk_size):
+        chunk = [dict(row) for row in chunk]
+        for lookup in lookups:
+            found = lookup.fetch({row[lookup.key] for row in chunk if row.get(lookup.key) is not None})
+            missing = tuple(lookup.defaults.get(column) for column in lookup.columns)
+            for row in chunk:
+                row.update(zip(lookup.columns, found.get(row.get(lookup.key), missing)))
+        yield from chunk
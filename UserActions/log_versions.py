@@ -0,0 +1,108 @@
+from django.db import connections, transaction
+
+VERSION_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS "log_versions" (
+        "user_id" INTEGER PRIMARY KEY,
+        "version" INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+# Триггеры увеличивают версию пользователя в той же транзакции, что и изменение его логов,
+# в том числе при изменении строки на месте, которое не меняет ни наибольший id, ни количество логов.
+# Вместо {row} подставляется NEW или OLD; при изменении лога версия нового пользователя строки
+# увеличивается, только если пользователь сменился.
+VERSION_BUMP_SQL = '''
+    INSERT INTO "log_versions" ("user_id", "version") SELECT {row}."user_id", 1 WHERE {condition}
+    ON CONFLICT ("user_id") DO UPDATE SET "version" = "version" + 1;
+'''
+
+VERSION_TRIGGERS_SQL = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS "log_versions_insert" AFTER INSERT ON "logs"
+    BEGIN {VERSION_BUMP_SQL.format(row='NEW', condition='1')} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS "log_versions_delete" AFTER DELETE ON "logs"
+    BEGIN {VERSION_BUMP_SQL.format(row='OLD', condition='1')} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS "log_versions_update" AFTER UPDATE ON "logs"
+    BEGIN
+        {VERSION_BUMP_SQL.format(row='OLD', condition='1')}
+        {VERSION_BUMP_SQL.format(row='NEW', condition='NEW."user_id" IS NOT OLD."user_id"')}
+    END
+    ''',
+)
+
+DROP_VERSIONS_SQL = (
+    'DROP TRIGGER IF EXISTS "log_versions_insert"',
+    'DROP TRIGGER IF EXISTS "log_versions_delete"',
+    'DROP TRIGGER IF EXISTS "log_versions_update"',
+    'DROP TABLE IF EXISTS "log_versions"',
+)
+
+
+def log_versions_available(alias: str = 'logs_db') -> bool:
+    """
+    Проверяет, установлены ли в базе данных версии логов пользователей.
+
+    Версии считаются установленными, если есть таблица и триггер изменения: без триггеров
+    таблица не отражала бы изменения логов.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных (или реплики) с таблицей 'logs'.
+
+    Возвращает:
+        bool: True, если версии можно читать.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE (type = 'table' AND name = 'log_versions') "
+            "OR (type = 'trigger' AND name = 'log_versions_update')"
+        )
+        return cursor.fetchone()[0] == 2
+
+
+def install_log_versions(alias: str = 'logs_db') -> None:
+    """
+    Создаёт таблицу версий логов и триггеры на вставку, изменение и удаление логов.
+
+    Версии начинаются с нуля: они сравниваются только между собой, поэтому заполнять
+    таблицу по текущим логам не нужно.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs' (шард или партиция).
+    """
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        cursor.execute(VERSION_TABLE_SQL)
+        for sql in VERSION_TRIGGERS_SQL:
+            cursor.execute(sql)
+
+
+def drop_log_versions(alias: str = 'logs_db') -> None:
+    """
+    Удаляет триггеры и таблицу версий логов.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+    """
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        for sql in DROP_VERSIONS_SQL:
+            cursor.execute(sql)
+
+
+def get_log_version(user_id: int, alias: str = 'logs_db') -> int:
+    """
+    Возвращает версию логов пользователя в базе данных.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        alias (str): Псевдоним базы данных с установленными версиями (см. `log_versions_available`).
+
+    Возвращает:
+        int: Количество изменений логов пользователя с момента установки; 0, если изменений не было.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT "version" FROM "log_versions" WHERE "user_id" = %s', [user_id])
+        row = cursor.fetchone()
+    return row[0] if row else 0
@@ -0,0 +1,240 @@
+import atexit
+import datetime
+import queue
+import threading
+import time
+from collections.abc import Callable
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .ingest import BatchReport, ingest_batch
+
+# Пробуждает фоновый поток при остановке; в базу не записывается.
+_WAKE = object()
+
+
+class LogWriterFull(Exception):
+    """Очередь буферизованной записи логов заполнена, событие не принято."""
+
+
+class BufferedLogWriter:
+    """
+    Буферизованная запись логов в фоновом потоке.
+
+    Производители кладут события (формат см. в `ingest.parse_event`) в ограниченную очередь
+    и не ждут записи в базу. Фоновый поток забирает события пачками и записывает их через
+    `ingest.ingest_batch`: пачка уходит в базу, как только набрано `batch_size` событий или
+    с момента первого события пачки прошло `flush_interval` секунд. Если очередь заполнена,
+    производитель ждёт до `put_timeout` секунд, после чего получает `LogWriterFull`.
+    При завершении процесса оставшиеся в очереди события записываются (`close`).
+
+    Атрибуты:
+        max_queue (int): Наибольшее количество событий в очереди.
+        batch_size (int): Наибольшее количество событий в одной записи.
+        flush_interval (float): Наибольшее время ожидания события в очереди, секунды.
+        put_timeout (float | None): Время ожидания места в очереди, секунды; None — ждать без ограничения.
+        shutdown_timeout (float): Время на запись остатка очереди при завершении, секунды.
+    """
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, put_timeout: float | None = 0.5,
+                 shutdown_timeout: float = 10, flush_batch: Callable[[list], BatchReport] = ingest_batch) -> None:
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self._flush_batch = flush_batch
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.enqueued = self.written = self.rejected = self.dropped = 0
+        self.flushes = self.failed_flushes = 0
+        self.flush_seconds_total = self.flush_seconds_max = self.flush_seconds_last = 0.0
+        self.last_error: str | None = None
+
+    @classmethod
+    def from_settings(cls) -> 'BufferedLogWriter':
+        """Создаёт запись логов по настройке `LOG_WRITER`."""
+        options = getattr(settings, 'LOG_WRITER', {})
+        return cls(
+            max_queue=options.get('MAX_QUEUE', 100000),
+            batch_size=options.get('BATCH_SIZE', 5000),
+            flush_interval=options.get('FLUSH_INTERVAL', 1.0),
+            put_timeout=options.get('PUT_TIMEOUT', 0.5),
+            shutdown_timeout=options.get('SHUTDOWN_TIMEOUT', 10),
+        )
+
+    def write(self, event: dict, timeout: float | None = None) -> None:
+        """
+        Ставит событие в очередь записи.
+
+        Аргументы:
+            event (dict): Событие в формате `ingest.parse_event`.
+            timeout (float | None, optional): Время ожидания места в очереди; по умолчанию — `put_timeout`.
+
+        Исключения:
+            LogWriterFull: Если очередь заполнена дольше `timeout` секунд или запись остановлена.
+        """
+        if self._stopping.is_set():
+            raise LogWriterFull("Log writer is closed")
+        self.start()
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put(event, timeout=self.put_timeout if timeout is None else timeout)
+        except queue.Full:
+            with self._idle:
+                self._pending -= 1
+                self.dropped += 1
+                self._idle.notify_all()
+            raise LogWriterFull("Log writer queue is full") from None
+        with self._lock:
+            self.enqueued += 1
+
+    def log(self, user_id: int, event_type: str, space_type: str, space_id: int | None = None,
+            moment: datetime.datetime | None = None, timeout: float | None = None) -> None:
+        """
+        Ставит в очередь событие пользователя (см. `write`).
+
+        Аргументы:
+            user_id (int): Идентификатор пользователя.
+            event_type (str): Имя типа события.
+            space_type (str): Имя типа пространства.
+            space_id (int | None): Идентификатор пространства.
+            moment (datetime | None): Время события; по умолчанию — текущее.
+            timeout (float | None, optional): Время ожидания места в очереди.
+        """
+        self.write({
+            "datetime": (moment or timezone.now()).isoformat(),
+            "user_id": user_id,
+            "event_type": event_type,
+            "space_type": space_type,
+            "space_id": space_id,
+        }, timeout)
+
+    def start(self) -> None:
+        """Запускает фоновый поток записи, если он ещё не запущен."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Ждёт, пока все поставленные в очередь события будут записаны.
+
+        Аргументы:
+            timeout (float | None): Наибольшее время ожидания, секунды; None — без ограничения.
+
+        Возвращает:
+            bool: True, если очередь опустела за отведённое время.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float | None = None) -> bool:
+        """
+        Останавливает приём событий и записывает остаток очереди.
+
+        Аргументы:
+            timeout (float | None, optional): Время на запись остатка; по умолчанию — `shutdown_timeout`.
+
+        Возвращает:
+            bool: True, если все события записаны.
+        """
+        self._stopping.set()
+        thread = self._thread
+        if thread is None:
+            return True
+        try:
+            self._queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass
+        thread.join(self.shutdown_timeout if timeout is None else timeout)
+        return not thread.is_alive()
+
+    def stats(self) -> dict[str, int | float | str | None]:
+        """
+        Возвращает метрики записи: глубину очереди, счётчики событий и время записи пачек.
+
+        Возвращает:
+            dict: Метрики в виде словаря.
+        """
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+                "flushes": self.flushes,
+                "failed_flushes": self.failed_flushes,
+                "flush_seconds_last": self.flush_seconds_last,
+                "flush_seconds_max": self.flush_seconds_max,
+                "flush_seconds_avg": self.flush_seconds_total / self.flushes if self.flushes else 0.0,
+                "last_error": self.last_error,
+            }
+
+    def _next_batch(self) -> list:
+        """Собирает пачку: ждёт первое событие, затем добирает до `batch_size` не дольше `flush_interval`."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if self._stopping.is_set():
+                remaining = 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [event for event in batch if event is not _WAKE]
+
+    def _run(self) -> None:
+        """Цикл фонового потока: записывает пачки, пока запись не остановлена и очередь не пуста."""
+        try:
+            while not (self._stopping.is_set() and self._queue.empty()):
+                batch = self._next_batch()
+                if batch:
+                    self._write_batch(batch)
+        finally:
+            connections.close_all()
+
+    def _write_batch(self, batch: list) -> None:
+        """Записывает пачку и обновляет метрики; ошибка записи отклоняет пачку, но не останавливает поток."""
+        started = time.perf_counter()
+        try:
+            report = self._flush_batch(batch)
+            error = None
+        except Exception as exc:
+            report = BatchReport(rejected=len(batch))
+            error = f"{type(exc).__name__}: {exc}"
+        elapsed = time.perf_counter() - started
+        with self._idle:
+            self.written += report.accepted
+            self.rejected += report.rejected
+            self.flushes += 1
+            if error is not None:
+                self.failed_flushes += 1
+                self.last_error = error
+            elif report.errors:
+                self.last_error = report.errors[-1]["error"]
+            self.flush_seconds_last = elapsed
+            self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+            self.flush_seconds_total += elapsed
+            self._pending -= len(batch)
+            self._idle.notify_all()
+
+
+log_writer = BufferedLogWriter.from_settings()
@@ -0,0 +1,116 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from UserActions.cache import dataset_cache
+
+ENDPOINTS = {
+    "comments": ("comments-api", "comments-async-api"),
+    "general": ("general-api", "general-async-api"),
+}
+
+
+class Command(BaseCommand):
+    """
+    Сравнение пропускной способности синхронных (WSGI) и асинхронных (ASGI) эндпоинтов датасетов.
+
+    Запросы выполняются в процессе через тестовые клиенты Django: синхронные — `Client` в пуле потоков,
+    асинхронные — `AsyncClient` в одном цикле событий. Кэш датасетов на время замера отключается,
+    чтобы измерялись запросы к базам данных. Параметр --query-delay добавляет задержку к каждому
+    SQL-запросу и имитирует удалённую базу данных.
+    """
+    help = "Сравнивает пропускную способность WSGI- и ASGI-вариантов эндпоинтов comments и general."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--login', default='user1', help="Логин пользователя в запросах.")
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='comments', help="Эндпоинт.")
+        parser.add_argument('--requests', type=int, default=200, help="Количество запросов в каждом режиме.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Количество одновременных запросов.")
+        parser.add_argument('--query-delay', type=float, default=0.0, help="Задержка каждого SQL-запроса, мс.")
+
+    def handle(self, *args, **options) -> None:
+        sync_name, async_name = ENDPOINTS[options['endpoint']]
+        params = {'login': options['login']}
+        delay = options['query_delay'] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_query)
+
+        connections.close_all()
+        if delay:
+            connection_created.connect(add_delay)
+        enabled, dataset_cache.enabled = dataset_cache.enabled, False
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                wsgi = self.run_wsgi(reverse(sync_name), params, options['requests'], options['concurrency'])
+                asgi = asyncio.run(
+                    self.run_asgi(reverse(async_name), params, options['requests'], options['concurrency'])
+                )
+        finally:
+            dataset_cache.enabled = enabled
+            connection_created.disconnect(add_delay)
+            connections.close_all()
+
+        self.report("WSGI", *wsgi)
+        self.report("ASGI", *asgi)
+
+    @staticmethod
+    def run_wsgi(url: str, params: dict, requests: int, concurrency: int) -> tuple[float, list[float]]:
+        """
+        Выполняет запросы к синхронному эндпоинту из пула потоков.
+
+        Возвращает:
+            tuple: Общее время в секундах и длительности отдельных запросов.
+        """
+        def request(_):
+            started = time.perf_counter()
+            response = Client().get(url, params)
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(request, range(requests)))
+        return time.perf_counter() - started, latencies
+
+    @staticmethod
+    async def run_asgi(url: str, params: dict, requests: int, concurrency: int) -> tuple[float, list[float]]:
+        """
+        Выполняет запросы к асинхронному эндпоинту из одного цикла событий.
+
+        Возвращает:
+            tuple: Общее время в секундах и длительности отдельных запросов.
+        """
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url, params)
+                assert response.status_code == 200, response.content
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(request() for _ in range(requests)))
+        return time.perf_counter() - started, list(latencies)
+
+    def report(self, mode: str, elapsed: float, latencies: list[float]) -> None:
+        """Выводит пропускную способность и перцентили задержки."""
+        quantiles = statistics.quantiles(latencies, n=20)
+        self.stdout.write(
+            f"{mode}: {len(latencies) / elapsed:.1f} запросов/с, "
+            f"p50 {statistics.median(latencies) * 1000:.1f} мс, p95 {quantiles[18] * 1000:.1f} мс"
+        )
@@ -0,0 +1,99 @@
+import json
+import random
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from blogs.models import User
+from UserActions.dimensions import dimensions
+from UserActions.sharding import get_shards
+from UserActions.views import ingest_logs
+
+# Тип события и тип пространства синтетических событий.
+EVENT_KINDS = (
+    ("login", "global"),
+    ("logout", "global"),
+    ("comment", "post"),
+    ("create_post", "blog"),
+)
+
+
+class Command(BaseCommand):
+    """
+    Замер устойчивой скорости записи логов через эндпоинт `ingest_logs`.
+
+    Тела запросов (NDJSON или JSON-массив синтетических событий) готовятся заранее и передаются
+    представлению через `APIRequestFactory`, поэтому замер включает разбор тела, проверку событий
+    и запись, но не сетевой стек. По умолчанию все записи откатываются: замер выполняется внутри
+    транзакции на каждом шарде, которая в конце отменяется; флаг --commit сохраняет события.
+    """
+    help = "Измеряет скорость записи логов эндпоинтом api/logs/ingest (строк в секунду)."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--events', type=int, default=100000, help="Общее количество событий.")
+        parser.add_argument('--request-size', type=int, default=20000, help="Событий в одном запросе.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Событий в одной транзакции.")
+        parser.add_argument('--format', choices=['ndjson', 'json'], default='ndjson', help="Формат тела запроса.")
+        parser.add_argument('--commit', action='store_true', help="Сохранить записанные события.")
+
+    def handle(self, *args, **options) -> None:
+        dimensions.preload()
+        logins = list(User.objects.using('blogs_db').values_list('login', flat=True)[:1000])
+        bodies = [
+            self.make_body(logins, min(options['request_size'], options['events'] - start), options['format'])
+            for start in range(0, options['events'], options['request_size'])
+        ]
+        content_type = 'application/x-ndjson' if options['format'] == 'ndjson' else 'application/json'
+        url = f"{reverse('ingest-logs')}?batch_size={options['batch_size']}"
+        factory = APIRequestFactory()
+        user = get_user_model()(username='benchmark', is_active=True, is_superuser=True)
+
+        accepted = rejected = 0
+        latencies = []
+        with ExitStack() as stack:
+            for shard in get_shards():
+                stack.enter_context(transaction.atomic(using=shard))
+            started = time.perf_counter()
+            for body in bodies:
+                request = factory.post(url, body, content_type=content_type)
+                force_authenticate(request, user)
+                request_started = time.perf_counter()
+                response = ingest_logs(request)
+                latencies.append(time.perf_counter() - request_started)
+                accepted += response.data['accepted']
+                rejected += response.data['rejected']
+            elapsed = time.perf_counter() - started
+            if not options['commit']:
+                for shard in get_shards():
+                    transaction.set_rollback(True, using=shard)
+
+        self.stdout.write(
+            f"{options['format']}: {accepted / elapsed:.0f} строк/с, принято {accepted}, отклонено {rejected}, "
+            f"запрос p50 {statistics.median(latencies) * 1000:.1f} мс, max {max(latencies) * 1000:.1f} мс"
+            + ("" if options['commit'] else " (записи отменены)")
+        )
+
+    @staticmethod
+    def make_body(logins: list[str], count: int, body_format: str) -> bytes:
+        """Формирует тело запроса из `count` синтетических событий."""
+        now = timezone.now()
+        events = []
+        for _ in range(count):
+            event_type, space_type = random.choice(EVENT_KINDS)
+            events.append({
+                "datetime": (now - timezone.timedelta(seconds=random.randrange(86400))).isoformat(),
+                "login": random.choice(logins),
+                "event_type": event_type,
+                "space_type": space_type,
+                "space_id": None if space_type == "global" else random.randrange(1, 1000),
+            })
+        if body_format == 'json':
+            return json.dumps(events).encode()
+        return "".join(json.dumps(event) + "\n" for event in events).encode()
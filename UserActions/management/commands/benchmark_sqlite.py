@@ -0,0 +1,124 @@
+import copy
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import OperationalError, connections
+from django.utils import timezone
+
+from logs.models import Log
+from UserActions.dimensions import dimensions
+from UserActions.services import general_queryset
+
+STOCK_OPTIONS = {'init_command': 'PRAGMA journal_mode = DELETE; PRAGMA synchronous = FULL'}
+
+
+class Command(BaseCommand):
+    """
+    Сравнение пропускной способности чтения 'logs_db' при одновременной записи логов.
+
+    Для каждого режима создаётся временная копия базы 'logs_db': стандартные настройки sqlite3
+    (журнал отката, synchronous=FULL) и профиль из `SQLITE_PROFILES` (WAL, mmap, размер кэша).
+    Один поток непрерывно добавляет логи короткими транзакциями, остальные выполняют запрос
+    датасета general для случайных пользователей. Исходная база не изменяется.
+    """
+    help = "Сравнивает чтение logs_db во время записи логов со стандартными настройками SQLite и с профилем."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--seconds', type=float, default=5.0, help="Длительность замера каждого режима.")
+        parser.add_argument('--readers', type=int, default=4, help="Количество читающих потоков.")
+        parser.add_argument('--write-batch', type=int, default=10, help="Количество логов в одной транзакции записи.")
+
+    def handle(self, *args, **options) -> None:
+        source = Path(settings.DATABASES['logs_db']['NAME'])
+        user_ids = list(Log.objects.using('logs_db').values_list('user_id', flat=True).distinct())
+        dimensions.preload()
+
+        # Профиль сравнивается в режиме WAL независимо от SQLITE_WAL: копии базы временные.
+        profile = {**settings.SQLITE_PROFILES['logs_db'], 'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+        profile_options = {
+            **settings.DATABASES['logs_db']['OPTIONS'],
+            'init_command': "; ".join(f"PRAGMA {name} = {value}" for name, value in profile.items()),
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for mode, db_options in (("stock", STOCK_OPTIONS), ("profile", profile_options)):
+                alias = f"benchmark_{mode}"
+                path = Path(directory) / f"{mode}.sqlite3"
+                shutil.copyfile(source, path)
+                connections.settings[alias] = {
+                    **copy.deepcopy(connections.settings['logs_db']),
+                    'NAME': path,
+                    'OPTIONS': dict(db_options),
+                    'CONN_MAX_AGE': None,
+                }
+                try:
+                    reads, writes, errors = self.run_mode(alias, user_ids, options)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+                seconds = options['seconds']
+                self.stdout.write(
+                    f"{mode}: чтений {reads / seconds:.1f}/с, записей логов {writes / seconds:.1f}/с, "
+                    f"ошибок блокировки {errors}"
+                )
+
+    @staticmethod
+    def run_mode(alias: str, user_ids: list[int], options: dict) -> tuple[int, int, int]:
+        """
+        Запускает писателя и читателей на базе `alias` на заданное время.
+
+        Возвращает:
+            tuple: Количество выполненных чтений, записанных логов и ошибок блокировки.
+        """
+        stop = threading.Event()
+        counters = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        login_id = dimensions.event_type_id("login")
+        global_id = dimensions.space_type_id("global")
+
+        def count(name: str, value: int = 1) -> None:
+            with lock:
+                counters[name] += value
+
+        def writer() -> None:
+            try:
+                while not stop.is_set():
+                    logs = [
+                        Log(datetime=timezone.now(), user_id=random.choice(user_ids),
+                            event_type_id=login_id, space_type_id=global_id)
+                        for _ in range(options['write_batch'])
+                    ]
+                    try:
+                        Log.objects.using(alias).bulk_create(logs)
+                        count("writes", len(logs))
+                    except OperationalError:
+                        count("errors")
+            finally:
+                connections[alias].close()
+
+        def reader() -> None:
+            try:
+                while not stop.is_set():
+                    try:
+                        list(general_queryset(random.choice(user_ids)).using(alias))
+                        count("reads")
+                    except OperationalError:
+                        count("errors")
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=writer)] + [
+            threading.Thread(target=reader) for _ in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counters["reads"], counters["writes"], counters["errors"]
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from UserActions.counters import (
+    counters_available,
+    drop_comment_counters,
+    install_comment_counters,
+    verify_comment_counters,
+)
+from UserActions.partitions import get_partitions
+from UserActions.sharding import get_shards
+
+
+class Command(BaseCommand):
+    """
+    Управление счётчиками комментариев (user_id, post_id, comment_count) в базах логов.
+
+    Счётчики поддерживаются триггерами на вставку, удаление и изменение логов, поэтому эндпоинт
+    comments без периода читает готовые количества вместо агрегирования всех комментариев пользователя.
+    По умолчанию действие выполняется для всех шардов из `LOG_SHARDS` и партиций логов.
+
+    Действия:
+        install: Создаёт таблицу и триггеры и заполняет таблицу по текущим логам.
+        verify: Сравнивает счётчики с агрегатами логов (по умолчанию).
+        drop: Удаляет триггеры и таблицу; comments снова агрегирует логи.
+    """
+    help = "Устанавливает, проверяет и удаляет счётчики комментариев, поддерживаемые триггерами."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('action', nargs='?', default='verify', choices=['install', 'verify', 'drop'])
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help="Ограничить действие указанными базами данных (можно указать несколько раз).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        action = options['action']
+        aliases = options['databases'] or [*get_shards(), *get_partitions()]
+        for alias in aliases:
+            if action == 'install':
+                rows = install_comment_counters(alias)
+                self.stdout.write(self.style.SUCCESS(f"{alias}: счётчики установлены, строк — {rows}."))
+            elif action == 'drop':
+                drop_comment_counters(alias)
+                self.stdout.write(self.style.SUCCESS(f"{alias}: счётчики удалены."))
+            elif not counters_available(alias):
+                self.stdout.write(self.style.WARNING(f"{alias}: счётчики не установлены."))
+            elif mismatched := verify_comment_counters(alias):
+                raise CommandError(f"{alias}: расходящихся строк — {mismatched}, выполните install.")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{alias}: счётчики совпадают с логами."))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from UserActions.indexes import INDEXES, create_indexes, drop_indexes, verify_indexes
+from UserActions.services import comments_queryset, general_queryset
+
+
+class Command(BaseCommand):
+    """
+    Управление вторичными индексами неуправляемых таблиц 'logs_db' и 'blogs_db'.
+
+    Маршрутизаторы запрещают миграции для приложений 'logs' и 'blogs', поэтому индексы
+    создаются напрямую через соединения с базами данных, минуя механизм миграций.
+
+    Действия:
+        verify: Проверяет наличие объявленных индексов (по умолчанию).
+        create: Создаёт индексы и выводит планы запросов эндпоинтов до и после.
+        drop: Удаляет индексы и выводит планы запросов эндпоинтов до и после.
+        explain: Выводит текущие планы запросов эндпоинтов.
+    """
+    help = "Создаёт, проверяет и удаляет индексы для таблиц logs и post."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            'action', nargs='?', default='verify', choices=['verify', 'create', 'drop', 'explain'],
+        )
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help="Ограничить действие указанными базами данных (можно указать несколько раз).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        action = options['action']
+        specs = tuple(
+            spec for spec in INDEXES
+            if not options['databases'] or spec.alias in options['databases']
+        )
+
+        if action == 'explain':
+            self.print_plans()
+            return
+
+        if action in ('create', 'drop'):
+            self.print_plans("до")
+            if action == 'create':
+                mismatched = tuple(spec for spec, state in verify_indexes(specs).items() if state == 'mismatch')
+                drop_indexes(mismatched)
+                create_indexes(specs)
+            else:
+                drop_indexes(specs)
+            self.print_plans("после")
+
+        for spec, state in verify_indexes(specs).items():
+            style = self.style.SUCCESS if state == 'ok' else self.style.WARNING
+            columns = ", ".join(spec.columns)
+            self.stdout.write(style(f"[{state}] {spec.alias}: {spec.name} ON {spec.table}({columns})"))
+
+    def print_plans(self, stage: str | None = None) -> None:
+        """
+        Выводит EXPLAIN QUERY PLAN для запросов эндпоинтов comments и general.
+
+        Аргументы:
+            stage (str, optional): Подпись этапа ("до" или "после").
+        """
+        suffix = f" ({stage})" if stage else ""
+        for name, queryset in (("comments", comments_queryset(0)), ("general", general_queryset(0))):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"EXPLAIN QUERY PLAN {name}{suffix}:"))
+            self.stdout.write(queryset.explain())
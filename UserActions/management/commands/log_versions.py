@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from UserActions.log_versions import (
+    drop_log_versions,
+    install_log_versions,
+    log_versions_available,
+)
+from UserActions.partitions import get_partitions
+from UserActions.sharding import get_shards
+
+
+class Command(BaseCommand):
+    """
+    Управление версиями логов пользователей (user_id, version) в базах логов.
+
+    Версия увеличивается триггерами на вставку, изменение и удаление логов пользователя и входит
+    в ETag датасетов и версию записей кэша датасетов (см. `services.user_log_version`), поэтому
+    они меняются и при изменении логов на месте. По умолчанию действие выполняется для всех шардов
+    из `LOG_SHARDS` и партиций логов.
+
+    Действия:
+        install: Создаёт таблицу и триггеры.
+        status: Показывает, в каких базах версии установлены (по умолчанию).
+        drop: Удаляет триггеры и таблицу.
+    """
+    help = "Устанавливает и удаляет версии логов пользователей, поддерживаемые триггерами."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('action', nargs='?', default='status', choices=['install', 'status', 'drop'])
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help="Ограничить действие указанными базами данных (можно указать несколько раз).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        action = options['action']
+        aliases = options['databases'] or [*get_shards(), *get_partitions()]
+        for alias in aliases:
+            if action == 'install':
+                install_log_versions(alias)
+                self.stdout.write(self.style.SUCCESS(f"{alias}: версии логов установлены."))
+            elif action == 'drop':
+                drop_log_versions(alias)
+                self.stdout.write(self.style.SUCCESS(f"{alias}: версии логов удалены."))
+            elif log_versions_available(alias):
+                self.stdout.write(self.style.SUCCESS(f"{alias}: версии логов установлены."))
+            else:
+                self.stdout.write(self.style.WARNING(f"{alias}: версии логов не установлены."))
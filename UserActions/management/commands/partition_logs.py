@@ -0,0 +1,55 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+from django.utils import timezone
+
+from UserActions.cache import dataset_cache
+from UserActions.partitions import month_start, move_month
+from UserActions.rollups import get_high_water_mark, refresh_rollups, rollups_available
+
+
+class Command(BaseCommand):
+    """
+    Перенос закрытых месяцев логов из 'logs_db' в помесячные файлы-партиции.
+
+    Для каждого месяца раньше --before создаётся файл `logs_YYYY_MM.sqlite3` в каталоге
+    `LOG_PARTITIONS_DIR`, и логи месяца переносятся в него. Если в базе есть дневная сводка,
+    она сначала обновляется, и переносятся только уже учтённые в ней логи. Новые логи
+    по-прежнему пишутся в 'logs_db'. После переноса процессы приложения нужно перезапустить,
+    чтобы они зарегистрировали новые партиции.
+    """
+    help = "Переносит логи закрытых месяцев из logs_db в помесячные партиции."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--before', help="Первый месяц, который остаётся в базе (YYYY-MM); по умолчанию текущий.")
+        parser.add_argument('--database', default='logs_db', help="База данных с текущими логами.")
+        parser.add_argument('--directory', help="Каталог партиций; по умолчанию LOG_PARTITIONS_DIR.")
+
+    def handle(self, *args, **options) -> None:
+        alias = options['database']
+        if options['before']:
+            try:
+                before = datetime.datetime.strptime(options['before'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("Параметр --before должен быть в формате YYYY-MM.") from None
+        else:
+            before = month_start(timezone.now().date())
+
+        max_id = None
+        if rollups_available(alias):
+            refresh_rollups(alias)
+            max_id = get_high_water_mark(alias)
+
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                'SELECT DISTINCT substr("datetime", 1, 7) FROM "logs" WHERE "datetime" < %s ORDER BY 1',
+                [f"{before.isoformat()} 00:00:00"],
+            )
+            months = [datetime.datetime.strptime(row[0], '%Y-%m').date() for row in cursor.fetchall()]
+
+        for month in months:
+            moved = move_month(month, alias, max_id, options['directory'])
+            self.stdout.write(self.style.SUCCESS(f"{month:%Y-%m}: перенесено логов — {moved}."))
+        if months:
+            dataset_cache.clear()
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from UserActions.services import resolve_user_ids
+from UserActions.sharding import (
+    get_shards,
+    move_user,
+    pin_users,
+    prepare_shard,
+    rebalance,
+)
+
+
+class Command(BaseCommand):
+    """
+    Управление шардами логов из настройки `LOG_SHARDS`.
+
+    Действия:
+        prepare — создаёт в шардах таблицы логов и справочников, индексы и диапазоны id;
+        pin — закрепляет пользователей за шардами, где сейчас лежат их логи (перед изменением `LOG_SHARDS`);
+        move — переносит логи пользователей из --user в шард --to;
+        rebalance — переносит закреплённых пользователей в их шарды по умолчанию.
+
+    Перенос выполняется без остановки приложения (см. `sharding.move_user`): логи копируются пачками,
+    пользователь переключается на новый шард, и через --settle секунд логи удаляются из прежнего шарда.
+    """
+    help = "Готовит шарды логов и переносит пользователей между ними."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('action', choices=['prepare', 'pin', 'move', 'rebalance'], help="Действие.")
+        parser.add_argument('--user', action='append', default=[], help="Логин пользователя для move; можно повторять.")
+        parser.add_argument('--to', help="Целевой шард для move.")
+        parser.add_argument('--limit', type=int, help="Наибольшее количество пользователей для rebalance.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Логов в одной транзакции копирования.")
+        parser.add_argument('--settle', type=float, help="Пауза перед удалением логов из прежнего шарда, секунды; "
+                                                         "по умолчанию SHARD_MAP_TTL.")
+
+    def handle(self, *args, **options) -> None:
+        action = options['action']
+        if action == 'prepare':
+            for alias in get_shards():
+                prepare_shard(alias)
+                self.stdout.write(self.style.SUCCESS(f"{alias}: шард подготовлен."))
+        elif action == 'pin':
+            self.stdout.write(self.style.SUCCESS(f"Закреплено пользователей: {pin_users()}."))
+        elif action == 'move':
+            if options['to'] not in get_shards():
+                raise CommandError(f"Шард {options['to']} не указан в LOG_SHARDS.")
+            user_ids = resolve_user_ids(options['user'])
+            missing = sorted(set(options['user']) - set(user_ids))
+            if missing:
+                raise CommandError(f"Пользователи не найдены: {', '.join(missing)}.")
+            for login, user_id in user_ids.items():
+                moved = move_user(user_id, options['to'], options['batch_size'], options['settle'])
+                self.stdout.write(self.style.SUCCESS(f"{login} → {options['to']}: перенесено логов — {moved}."))
+        else:
+            for user_id, target, moved in rebalance(options['limit'], options['batch_size'], options['settle']):
+                self.stdout.write(self.style.SUCCESS(f"{user_id} → {target}: перенесено логов — {moved}."))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from UserActions.partitions import get_partitions
+from UserActions.rollups import (
+    create_rollup_tables,
+    drop_rollup_tables,
+    get_high_water_mark,
+    rebuild_rollups,
+    refresh_rollups,
+)
+
+
+class Command(BaseCommand):
+    """
+    Инкрементальное обновление дневной сводки активности (`daily_activity`) в 'logs_db'.
+
+    При первом запуске создаёт таблицы сводки и триггеры, поддерживающие её при удалении и изменении
+    учтённых логов (и учитывает в ней партиции логов, если они есть), затем учитывает логи с id больше отметки.
+    С флагом --loop работает как фоновая задача и повторяет обновление с заданным интервалом.
+    """
+    help = "Обновляет дневную сводку активности пользователей по новым логам."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--database', default='logs_db', help="База данных с таблицей logs.")
+        parser.add_argument('--batch-size', type=int, default=100000, help="Размер пачки id логов на транзакцию.")
+        parser.add_argument('--rebuild', action='store_true', help="Пересчитать сводку с нуля.")
+        parser.add_argument('--drop', action='store_true', help="Удалить таблицы сводки.")
+        parser.add_argument('--loop', action='store_true', help="Повторять обновление с интервалом --interval.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Интервал между обновлениями, секунды.")
+
+    def handle(self, *args, **options) -> None:
+        alias = options['database']
+
+        if options['drop']:
+            drop_rollup_tables(alias)
+            self.stdout.write(self.style.SUCCESS(f"Таблицы сводки удалены из {alias}."))
+            return
+
+        created = create_rollup_tables(alias)
+        if options['rebuild'] or (created and alias == 'logs_db' and get_partitions()):
+            processed = rebuild_rollups(alias, options['batch_size'])
+            self.report(alias, processed)
+
+        while True:
+            processed = refresh_rollups(alias, options['batch_size'])
+            self.report(alias, processed)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def report(self, alias: str, processed: int) -> None:
+        """Выводит количество обработанных логов и текущую отметку."""
+        self.stdout.write(
+            f"{alias}: обработано логов — {processed}, отметка — {get_high_water_mark(alias)}."
+        )
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from UserActions.indexes import INDEXES, IndexSpec, verify_indexes
+from UserActions.slow_queries import SlowQueryLog, slow_query_log, summarize
+
+
+class Command(BaseCommand):
+    """
+    Сводка журнала медленных SQL-запросов (настройка `SLOW_QUERY_LOG`).
+
+    Запросы группируются по виду (текст без параметров, списки `IN (...)` любой длины считаются одинаковыми)
+    и выводятся по убыванию суммарного времени с представлениями, из которых они выполнялись.
+    Для полных просмотров таблиц logs и post по плану самого медленного запроса группы указывается индекс,
+    который избавил бы от просмотра: объявленный в `indexes.INDEXES` (с его состоянием в базе)
+    или новый по колонкам условий запроса.
+
+    Действия:
+        report: Выводит сводку (по умолчанию).
+        clear: Очищает журнал.
+    """
+    help = "Выводит сводку журнала медленных SQL-запросов с рекомендациями индексов."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('action', nargs='?', default='report', choices=['report', 'clear'])
+        parser.add_argument('--path', help="Файл журнала; по умолчанию SLOW_QUERY_LOG['PATH'].")
+        parser.add_argument('--top', type=int, default=20, help="Количество выводимых видов запросов.")
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help="Учитывать только запросы к указанным базам данных (можно указать несколько раз).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        log = SlowQueryLog(options['path'], slow_query_log.threshold_ms) if options['path'] else slow_query_log
+        if options['action'] == 'clear':
+            log.clear()
+            self.stdout.write(self.style.SUCCESS(f"Журнал {log.path} очищен."))
+            return
+
+        entries = [
+            entry for entry in log.read()
+            if not options['databases'] or entry["alias"] in options['databases']
+        ]
+        if not entries:
+            self.stdout.write(self.style.WARNING(f"В журнале {log.path} нет медленных запросов."))
+            return
+
+        groups = summarize(entries)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Медленных запросов: {len(entries)}, видов запросов: {len(groups)}."
+        ))
+        index_states = {}
+        for group in groups[:options['top']]:
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_LABEL(
+                f"{group['count']} × {group['total_ms'] / group['count']:.1f} мс (всего {group['total_ms']:.1f} мс, "
+                f"максимум {group['max_ms']:.1f} мс) — {', '.join(sorted(group['aliases']))}; "
+                f"представления: {', '.join(sorted(group['views']))}"
+            ))
+            if group['errors']:
+                self.stdout.write(self.style.ERROR(f"  завершились ошибкой: {group['errors']}"))
+            self.stdout.write(f"  {group['fingerprint']}")
+            for _, _, detail in group['slowest'].get("plan") or ():
+                self.stdout.write(f"    {detail}")
+            for table, spec in group['scans']:
+                self.stdout.write(self.style.WARNING(f"  Полный просмотр таблицы {table}: {self.advice(spec, index_states)}"))
+
+    def advice(self, spec: IndexSpec | None, index_states: dict) -> str:
+        """
+        Формулирует рекомендацию по индексу для полного просмотра таблицы.
+
+        Аргументы:
+            spec (IndexSpec | None): Индекс из `slow_queries.advise_index`.
+            index_states (dict): Уже проверенные состояния объявленных индексов.
+
+        Возвращает:
+            str: Текст рекомендации.
+        """
+        if spec is None:
+            return "у запроса нет условий на колонки таблицы, индекс не поможет."
+        columns = ", ".join(spec.columns)
+        if spec not in INDEXES:
+            return f"индекса нет среди объявленных, подойдёт {spec.create_sql} (добавьте его в indexes.INDEXES)."
+        if spec not in index_states:
+            index_states[spec] = verify_indexes((spec,))[spec]
+        state = index_states[spec]
+        if state == 'ok':
+            return (f"индекс {spec.name}({columns}) создан, но не использован — проверьте условия запроса "
+                    f"и выполните ANALYZE в {spec.alias}.")
+        return f"индекс {spec.name}({columns}) в состоянии {state}, выполните `manage.py db_indexes create`."
@@ -0,0 +1,36 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+
+
+class Command(BaseCommand):
+    """
+    Обновление реплик для чтения из настройки `DATABASE_REPLICAS` копией основной базы.
+
+    Копирование выполняется через SQLite Online Backup API, поэтому основная база остаётся
+    доступной для записи, а реплика получает согласованный снимок. Команду можно запускать
+    по расписанию; задержка реплик равна интервалу между запусками.
+    """
+    help = "Копирует основные базы SQLite в их реплики для чтения."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('primaries', nargs='*', help="Основные базы; по умолчанию все из DATABASE_REPLICAS.")
+        parser.add_argument('--pages', type=int, default=1024, help="Страниц за один шаг копирования.")
+
+    def handle(self, *args, **options) -> None:
+        replicas = getattr(settings, 'DATABASE_REPLICAS', {})
+        for primary in options['primaries'] or replicas:
+            if primary not in replicas:
+                raise CommandError(f"Для базы {primary} не настроены реплики.")
+            for replica in replicas[primary]:
+                connections[replica].close()
+                source = sqlite3.connect(settings.DATABASES[primary]['NAME'])
+                target = sqlite3.connect(settings.DATABASES[replica]['NAME'])
+                try:
+                    source.backup(target, pages=options['pages'])
+                finally:
+                    target.close()
+                    source.close()
+                self.stdout.write(self.style.SUCCESS(f"{primary} → {replica}: реплика обновлена."))
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from UserActions.tracing import TraceExporter, exporter
+
+
+class Command(BaseCommand):
+    """
+    Выгрузка трасс запросов (настройка `TRACING`) для просмотрщиков трасс.
+
+    Спаны файла трасс собираются в JSON `{"traceEvents": [...]}` (формат Trace Event), который открывают
+    chrome://tracing, Perfetto (ui.perfetto.dev) и speedscope. Трассы, id которых передан через `--trace`
+    (id запроса из заголовка X-Request-ID), выгружаются отдельно от остальных.
+
+    Действия:
+        export: Выгружает трассы (по умолчанию).
+        clear: Удаляет файл трасс.
+    """
+    help = "Выгружает трассы запросов в формате chrome://tracing и Perfetto."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('action', nargs='?', default='export', choices=['export', 'clear'])
+        parser.add_argument('--path', help="Файл трасс; по умолчанию TRACING['PATH'].")
+        parser.add_argument(
+            '--trace', action='append', dest='trace_ids', default=[],
+            help="Выгружать только трассу с этим id (можно указать несколько раз).",
+        )
+        parser.add_argument('--output', '-o', help="Файл для выгрузки; по умолчанию вывод в stdout.")
+
+    def handle(self, *args, **options) -> None:
+        traces = TraceExporter(options['path']) if options['path'] else exporter
+        if options['action'] == 'clear':
+            traces.clear()
+            self.stdout.write(self.style.SUCCESS(f"Файл трасс {traces.path} удалён."))
+            return
+
+        events = list(traces.read(options['trace_ids']))
+        document = json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False)
+        if not options['output']:
+            self.stdout.write(document)
+            return
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            file.write(document)
+        trace_count = len({event["args"]["trace_id"] for event in events})
+        self.stderr.write(self.style.SUCCESS(
+            f"Выгружено трасс: {trace_count}, спанов: {len(events)} в {options['output']}."
+        ))
@@ -0,0 +1,336 @@
+import re
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.http import HttpRequest
+
+# Время ответа в секундах и размер ответа в байтах: верхние границы корзин гистограмм по умолчанию.
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Тип содержимого текстового формата Prometheus.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+INF_LABEL = 'le="+Inf"'
+
+# Допустимый id запроса из заголовка X-Request-ID; он же используется в именах файлов профилей.
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+
+@dataclass
+class RequestScope:
+    """
+    Текущий HTTP-запрос, которому приписываются выполняемые SQL-запросы (см. `request_scope`).
+
+    Атрибуты:
+        request (HttpRequest): Запрос.
+        request_id (str): Id запроса из заголовка X-Request-ID или новый; возвращается в ответе
+            и связывает записи журнала медленных запросов и профили с запросом.
+        queries (dict): SQL-запросы запроса для метрик: псевдоним базы → [количество, секунды].
+    """
+    request: HttpRequest
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    queries: dict[str, list] = field(default_factory=dict)
+
+    @classmethod
+    def for_request(cls, request: HttpRequest) -> 'RequestScope':
+        """Создаёт область запроса с id из заголовка X-Request-ID, если он допустим, иначе с новым id."""
+        request_id = request.headers.get('X-Request-ID', '')
+        return cls(request, request_id) if REQUEST_ID_RE.match(request_id) else cls(request)
+
+    @property
+    def view(self) -> str:
+        """Имя представления запроса (см. `view_label`)."""
+        return view_label(self.request)
+
+
+# HTTP-запрос, в контексте которого выполняется код (см. `request_scope`).
+_request_scope: ContextVar[RequestScope | None] = ContextVar('metrics_request_scope', default=None)
+
+
+def view_label(request: HttpRequest) -> str:
+    """Возвращает имя представления запроса для меток метрик: имя URL или путь к функции."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unresolved>'
+
+
+def escape_label(value: str) -> str:
+    """Экранирует значение метки для текстового формата Prometheus."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: tuple[str, ...], values: tuple, extra: str = '') -> str:
+    """
+    Формирует блок меток `{name="value",...}` строки метрики.
+
+    Аргументы:
+        names (tuple): Имена меток.
+        values (tuple): Значения меток в том же порядке.
+        extra (str): Уже отформатированная дополнительная метка, например `le="0.5"`.
+
+    Возвращает:
+        str: Блок меток или пустая строка, если меток нет.
+    """
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value: float) -> str:
+    """Форматирует значение метрики: целые — без дробной части."""
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class Counter:
+    """
+    Счётчик с метками, который только возрастает.
+
+    Атрибуты:
+        name (str): Имя метрики.
+        help (str): Описание метрики.
+        labels (tuple): Имена меток.
+    """
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], lock: threading.Lock) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = lock
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        """Увеличивает счётчик с указанными значениями меток на `amount`."""
+        with self._lock:
+            self.add(labels, amount)
+
+    def add(self, labels: tuple, amount: float) -> None:
+        """Увеличивает счётчик без блокировки; вызывается под блокировкой реестра."""
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        """Возвращает строки значений в текстовом формате; вызывается под блокировкой реестра."""
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+
+    def clear(self) -> None:
+        """Удаляет все значения; вызывается под блокировкой реестра."""
+        self._values.clear()
+
+
+class Histogram(Counter):
+    """
+    Гистограмма с метками: количество наблюдений по корзинам, их сумма и общее количество.
+
+    Атрибуты:
+        buckets (tuple): Верхние границы корзин по возрастанию; корзина `+Inf` добавляется автоматически.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], lock: threading.Lock,
+                 buckets: Iterable[float]) -> None:
+        super().__init__(name, help, labels, lock)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        """Добавляет наблюдение `value` с указанными значениями меток."""
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = format_labels(self.labels, labels, f'le="{format_value(float(bound))}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_bucket{format_labels(self.labels, labels, INF_LABEL)} {count}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {count}"
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса: время и размер ответов представлений, количество и время SQL-запросов по базам.
+
+    Все метрики защищены одной блокировкой, поэтому обновления из потоков WSGI-сервера,
+    пулов `scatter`/`run_in_thread` и фоновой записи логов не теряются, а `render` видит
+    согласованный снимок. Метрики выводятся в текстовом формате Prometheus (см. `render`).
+    """
+
+    def __init__(self, latency_buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS,
+                 size_buckets: Iterable[float] = DEFAULT_SIZE_BUCKETS) -> None:
+        self._lock = threading.Lock()
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', "Время обработки запроса представлением, включая потоковую отдачу.",
+            ('view', 'method', 'status'), self._lock, latency_buckets,
+        )
+        self.response_size = Histogram(
+            'http_response_size_bytes', "Размер тела ответа.", ('view',), self._lock, size_buckets,
+        )
+        self.db_queries = Counter(
+            'db_queries_total', "Количество SQL-запросов по базам данных.", ('alias',), self._lock,
+        )
+        self.db_query_seconds = Counter(
+            'db_query_duration_seconds_total', "Суммарное время выполнения SQL-запросов по базам данных.",
+            ('alias',), self._lock,
+        )
+        self.db_errors = Counter(
+            'db_query_errors_total', "Количество SQL-запросов, завершившихся ошибкой.", ('alias',), self._lock,
+        )
+        self.view_queries = Counter(
+            'http_request_db_queries_total', "Количество SQL-запросов, выполненных при обработке запросов представления.",
+            ('view', 'alias'), self._lock,
+        )
+        self.view_query_seconds = Counter(
+            'http_request_db_query_duration_seconds_total',
+            "Суммарное время SQL-запросов, выполненных при обработке запросов представления.",
+            ('view', 'alias'), self._lock,
+        )
+        self.metrics = (
+            self.request_duration, self.response_size, self.db_queries, self.db_query_seconds,
+            self.db_errors, self.view_queries, self.view_query_seconds,
+        )
+
+    @classmethod
+    def from_settings(cls) -> 'MetricsRegistry':
+        """Создаёт реестр по настройке `METRICS`."""
+        options = getattr(settings, 'METRICS', {})
+        return cls(
+            latency_buckets=options.get('LATENCY_BUCKETS', DEFAULT_LATENCY_BUCKETS),
+            size_buckets=options.get('SIZE_BUCKETS', DEFAULT_SIZE_BUCKETS),
+        )
+
+    def record_query(self, alias: str, seconds: float, failed: bool = False) -> None:
+        """
+        Учитывает выполненный SQL-запрос в метриках базы и текущего HTTP-запроса.
+
+        Аргументы:
+            alias (str): Псевдоним базы данных.
+            seconds (float): Время выполнения.
+            failed (bool): Запрос завершился исключением.
+        """
+        scope = _request_scope.get()
+        with self._lock:
+            self.db_queries.add((alias,), 1)
+            self.db_query_seconds.add((alias,), seconds)
+            if failed:
+                self.db_errors.add((alias,), 1)
+            if scope is not None:
+                entry = scope.queries.setdefault(alias, [0, 0.0])
+                entry[0] += 1
+                entry[1] += seconds
+
+    def record_request(self, view: str, method: str, status: int, seconds: float,
+                       size: int | None, queries: dict[str, list]) -> None:
+        """
+        Учитывает обработанный HTTP-запрос.
+
+        Аргументы:
+            view (str): Имя представления (см. `view_label`).
+            method (str): HTTP-метод.
+            status (int): Код ответа.
+            seconds (float): Время обработки.
+            size (int | None): Размер тела ответа; None, если неизвестен.
+            queries (dict): SQL-запросы запроса по базам (см. `RequestScope`).
+        """
+        self.request_duration.observe((view, method, str(status)), seconds)
+        if size is not None:
+            self.response_size.observe((view,), size)
+        with self._lock:
+            for alias, (count, total) in queries.items():
+                self.view_queries.add((view, alias), count)
+                self.view_query_seconds.add((view, alias), total)
+
+    def render(self) -> str:
+        """Возвращает все метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            for metric in self.metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self) -> None:
+        """Сбрасывает все метрики."""
+        with self._lock:
+            for metric in self.metrics:
+                metric.clear()
+
+
+def metrics_enabled() -> bool:
+    """Проверяет, включён ли сбор метрик настройкой `METRICS['ENABLED']`."""
+    return getattr(settings, 'METRICS', {}).get('ENABLED', True)
+
+
+def current_scope() -> RequestScope | None:
+    """Возвращает HTTP-запрос, в контексте которого выполняется код, или None вне запроса."""
+    return _request_scope.get()
+
+
+@contextmanager
+def request_scope(scope: RequestScope) -> Iterator[RequestScope]:
+    """
+    Область, в которой SQL-запросы приписываются HTTP-запросу `scope`.
+
+    Открывается `MetricsMiddleware` на время обработки запроса и каждой части потокового ответа.
+    Потоки `services.scatter` получают копию контекста и учитывают запросы в том же `scope`.
+
+    Аргументы:
+        scope (RequestScope): Запрос.
+    """
+    token = _request_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _request_scope.reset(token)
+
+
+def query_timer(execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:
+    """
+    Обёртка выполнения SQL (`connection.execute_wrappers`), измеряющая время каждого запроса.
+
+    Учитывается только выполнение запроса; чтение строк курсором после него (`iterator()`) не входит.
+    """
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = execute(sql, params, many, context)
+        failed = False
+        return result
+    finally:
+        registry.record_query(context['connection'].alias, time.perf_counter() - started, failed)
+
+
+def install_query_timer(connection: BaseDatabaseWrapper) -> None:
+    """
+    Добавляет `query_timer` в обёртки выполнения SQL соединения, если он ещё не добавлен.
+
+    Вызывается из обработчика сигнала `connection_created` (см. `UserActions.signals`), поэтому
+    действует для всех баз данных, включая реплики, партиции и шарды, и для соединений всех потоков.
+    """
+    if metrics_enabled() and query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+registry = MetricsRegistry.from_settings()
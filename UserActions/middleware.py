@@ -0,0 +1,275 @@
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Iterator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.urls import reverse
+
+from .db_routers import routing_context
+from .metrics import (
+    RequestScope,
+    current_scope,
+    metrics_enabled,
+    registry,
+    request_scope,
+    view_label,
+)
+from .profiling import (
+    RequestProfiler,
+    may_profile,
+    profile_store,
+    profile_stream,
+    profiling_enabled,
+    requested_mode,
+)
+from .tracing import (
+    Trace,
+    exporter,
+    sampled,
+    trace_request,
+    trace_stream,
+    tracing_enabled,
+)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Открывает `routing_context` на время обработки запроса.
+
+    Все чтения запроса идут в одну случайно выбранную реплику, а после записи в основную базу —
+    в основную базу, поэтому запрос видит собственные изменения. Строки потоковых ответов
+    формируются уже после выхода из контекста и выбирают реплику при каждом запросе к базе.
+
+    Работает как в синхронной (WSGI), так и в асинхронной (ASGI) цепочке middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse | Awaitable[HttpResponse]]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse | Awaitable[HttpResponse]:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_context():
+            return self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        with routing_context():
+            return await self.get_response(request)
+
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики запросов для `/metrics` (см. `UserActions.metrics`).
+
+    Учитывает время обработки и размер ответа по представлениям, а также количество и время
+    SQL-запросов, выполненных при обработке запроса, по базам данных. Для потоковых ответов
+    (download_csv) время, размер и запросы к базам учитываются по окончании отдачи.
+    Открывает `metrics.request_scope`, по которому SQL-запросы приписываются запросу и его представлению,
+    в том числе в журнале медленных запросов, поэтому работает и при отключённых метриках.
+    Id запроса (X-Request-ID) берётся из заголовка запроса или создаётся и возвращается в ответе.
+    Должен стоять первым в `MIDDLEWARE`, чтобы учитывать время остальных middleware.
+
+    Работает как в синхронной (WSGI), так и в асинхронной (ASGI) цепочке middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse | Awaitable[HttpResponse]]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse | Awaitable[HttpResponse]:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with request_scope(RequestScope.for_request(request)) as scope:
+            response = self.get_response(request)
+        return self.observe(scope, response, started)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        started = time.perf_counter()
+        with request_scope(RequestScope.for_request(request)) as scope:
+            response = await self.get_response(request)
+        return self.observe(scope, response, started)
+
+    def observe(self, scope: RequestScope, response: HttpResponse, started: float) -> HttpResponse:
+        """
+        Учитывает ответ в метриках; потоковый ответ — после отдачи последней части.
+
+        Аргументы:
+            scope (RequestScope): Запрос и его SQL-запросы.
+            response (HttpResponse): Ответ представления.
+            started (float): Момент начала обработки (`time.perf_counter`).
+
+        Возвращает:
+            HttpResponse: Тот же ответ с заголовком X-Request-ID.
+        """
+        response['X-Request-ID'] = scope.request_id
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.measure_stream(response.streaming_content, scope, response, started)
+        elif metrics_enabled():
+            size = None if response.streaming else len(response.content)
+            registry.record_request(scope.view, scope.request.method, response.status_code,
+                                    time.perf_counter() - started, size, scope.queries)
+        return response
+
+    @staticmethod
+    def measure_stream(content: Iterator[bytes], scope: RequestScope, response: HttpResponse,
+                       started: float) -> Iterator[bytes]:
+        """Отдаёт части потокового ответа в области запроса, учитывая их размер, и записывает метрики в конце."""
+        size = 0
+        iterator = iter(content)
+        try:
+            while True:
+                with request_scope(scope):
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            if metrics_enabled():
+                registry.record_request(scope.view, scope.request.method, response.status_code,
+                                        time.perf_counter() - started, size, scope.queries)
+
+
+class TracingMiddleware:
+    """
+    Трассирует долю запросов `TRACING['SAMPLE_RATE']` (см. `UserActions.tracing`).
+
+    Для выбранного запроса открывает трассу с id запроса (X-Request-ID) и спан всего запроса, которому
+    подчиняются спаны представлений, сервисного слоя, сериализаторов, шаблонов и SQL-запросов ко всем базам.
+    Трасса дописывается в файл `TRACING['PATH']` после ответа, для потоковых ответов — после отдачи
+    последней части. Невыбранные запросы обрабатываются без замеров. Стоит сразу после `MetricsMiddleware`.
+
+    Работает как в синхронной (WSGI), так и в асинхронной (ASGI) цепочке middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse | Awaitable[HttpResponse]]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse | Awaitable[HttpResponse]:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not tracing_enabled() or not sampled():
+            return self.get_response(request)
+        trace, span_id, started = self.start(request)
+        with trace_request(trace, span_id):
+            response = self.get_response(request)
+        return self.finish(request, response, trace, span_id, started)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not tracing_enabled() or not sampled():
+            return await self.get_response(request)
+        trace, span_id, started = self.start(request)
+        with trace_request(trace, span_id):
+            response = await self.get_response(request)
+        return self.finish(request, response, trace, span_id, started)
+
+    @staticmethod
+    def start(request: HttpRequest) -> tuple[Trace, str, int]:
+        """Создаёт трассу запроса и возвращает её, id спана запроса и время его начала."""
+        scope = current_scope()
+        trace = Trace(scope.request_id if scope is not None else uuid.uuid4().hex)
+        return trace, trace.new_span_id(), trace.now_us()
+
+    @staticmethod
+    def finish(request: HttpRequest, response: HttpResponse, trace: Trace, span_id: str, started: int) -> HttpResponse:
+        """
+        Закрывает спан запроса и записывает трассу; для потокового ответа — после отдачи последней части.
+
+        Аргументы:
+            request (HttpRequest): Запрос.
+            response (HttpResponse): Ответ.
+            trace (Trace): Трасса запроса.
+            span_id (str): Id спана запроса.
+            started (int): Время начала спана запроса (`Trace.now_us`).
+
+        Возвращает:
+            HttpResponse: Тот же ответ.
+        """
+        def export() -> None:
+            trace.add(f"{request.method} {view_label(request)}", 'http', started, {
+                "span_id": span_id, "parent_id": None, "path": request.path, "status": response.status_code,
+            })
+            exporter.export(trace)
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = trace_stream(response.streaming_content, trace, span_id, export)
+        else:
+            export()
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует отдельные запросы сотрудников по запросу (см. `UserActions.profiling`).
+
+    Профилирование включается заголовком `X-Profile` или GET-параметром `profile` со значением
+    `cprofile` (или `1`) либо `sample` — для любого представления, в том числе comments и general.
+    Запрос должен выполнять сотрудник (`is_staff`), вошедший через сессию, поэтому middleware стоит
+    после `AuthenticationMiddleware`. Профиль сохраняется под id запроса (X-Request-ID); ответ получает
+    заголовок `X-Profile-URL` со ссылкой на скачивание. Потоковые ответы профилируются до отдачи последней части.
+
+    Одновременно профилируется cProfile только один запрос; остальные запросы с `cprofile` в это время
+    профилируются в режиме `sample`.
+
+    В асинхронной цепочке (ASGI) запросы не профилируются: представление выполняется в другом потоке.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse | Awaitable[HttpResponse]]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse | Awaitable[HttpResponse]:
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        mode = requested_mode(request)
+        if mode is None or not profiling_enabled() or not may_profile(request):
+            return self.get_response(request)
+
+        scope = current_scope()
+        request_id = scope.request_id if scope is not None else uuid.uuid4().hex
+        profiler = RequestProfiler(mode, getattr(settings, 'PROFILING', {}).get('SAMPLE_INTERVAL', 0.001))
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profiler.finish()
+            raise
+        finally:
+            profiler.disable()
+
+        def save() -> None:
+            data = profiler.finish()
+            profile_store.save(request_id, profiler.mode, data, {
+                "method": request.method,
+                "path": request.get_full_path(),
+                "view": scope.view if scope is not None else None,
+                "user": request.user.get_username(),
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = profile_stream(response.streaming_content, profiler, save)
+        else:
+            save()
+        response['X-Profile-URL'] = reverse('profile-download', args=[request_id])
+        return response
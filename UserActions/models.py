@@ -0,0 +1,25 @@
+from django.db import models
+
+
+class LogShardOverride(models.Model):
+    """
+    Модель для явного назначения шарда логов пользователю.
+
+    По умолчанию шард пользователя определяется по `user_id` (см. `UserActions.sharding`);
+    запись в этой таблице закрепляет пользователя за другим шардом — например, на время
+    перебалансировки или после переноса командой `reshard_logs`. Таблица хранится в базе 'default'.
+
+    Атрибуты:
+        user_id (IntegerField): Идентификатор пользователя. Уникален.
+        shard (CharField): Псевдоним базы данных шарда из настройки `LOG_SHARDS`.
+        updated_at (DateTimeField): Время последнего изменения назначения.
+
+    Метаданные:
+        db_table (str): Имя таблицы в базе данных — 'log_shard_override'.
+    """
+    user_id = models.IntegerField(unique=True)
+    shard = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'log_shard_override'
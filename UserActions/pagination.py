@@ -0,0 +1,174 @@
+import base64
+import binascii
+import datetime
+import json
+import zoneinfo
+from dataclasses import dataclass
+from typing import Any
+
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Размеры интервалов группировки датасета general.
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+
+class InvalidDatasetParams(ValueError):
+    """Ошибка разбора параметров фильтрации и пагинации датасета."""
+
+
+@dataclass(frozen=True)
+class DatasetFilters:
+    """
+    Фильтры по времени и параметры keyset-пагинации датасета.
+
+    Атрибуты:
+        date_from (datetime | None): Начало периода, включительно.
+        date_to (datetime | None): Конец периода, не включительно.
+        after (Any): Ключ последней строки предыдущей страницы: id поста для comments, дата для general.
+        limit (int | None): Размер страницы; None — без пагинации.
+        granularity (str): Интервал группировки general: 'hour', 'day', 'week' или 'month'.
+        tz (str | None): Часовой пояс интервалов general; None — текущий часовой пояс.
+    """
+    date_from: datetime.datetime | None = None
+    date_to: datetime.datetime | None = None
+    after: Any = None
+    limit: int | None = None
+    granularity: str = 'day'
+    tz: str | None = None
+
+    @property
+    def paginated(self) -> bool:
+        """Возвращает True, если запрошена постраничная выдача."""
+        return self.limit is not None
+
+    @property
+    def zone(self) -> datetime.tzinfo:
+        """Возвращает часовой пояс интервалов general."""
+        return zoneinfo.ZoneInfo(self.tz) if self.tz else timezone.get_current_timezone()
+
+    def as_params(self) -> dict[str, str]:
+        """Возвращает заданные фильтры в виде словаря строк для ключа кэша."""
+        params = {
+            "from": self.date_from.isoformat() if self.date_from else None,
+            "to": self.date_to.isoformat() if self.date_to else None,
+            "after": str(self.after) if self.after is not None else None,
+            "limit": str(self.limit) if self.limit is not None else None,
+            "granularity": self.granularity if self.granularity != 'day' else None,
+            "tz": self.tz,
+        }
+        return {key: value for key, value in params.items() if value is not None}
+
+
+NO_FILTERS = DatasetFilters()
+
+
+def encode_cursor(after: Any) -> str:
+    """
+    Кодирует ключ последней строки страницы в непрозрачный курсор.
+
+    Аргументы:
+        after (Any): JSON-сериализуемый ключ строки.
+
+    Возвращает:
+        str: Курсор в кодировке base64url.
+    """
+    return base64.urlsafe_b64encode(json.dumps({"after": after}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Any:
+    """
+    Декодирует курсор, полученный от `encode_cursor`.
+
+    Аргументы:
+        cursor (str): Курсор.
+
+    Возвращает:
+        Any: Ключ последней строки предыдущей страницы.
+
+    Исключения:
+        InvalidDatasetParams: Если курсор повреждён.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return payload["after"]
+    except (binascii.Error, ValueError, TypeError, KeyError) as error:
+        raise InvalidDatasetParams("Invalid cursor") from error
+
+
+def parse_moment(value: str, name: str, zone: datetime.tzinfo | None = None) -> datetime.datetime:
+    """
+    Разбирает дату или дату со временем из параметра запроса.
+
+    Значения без часового пояса трактуются в часовом поясе `zone` (по умолчанию текущем);
+    дата без времени — как её начало.
+
+    Аргументы:
+        value (str): Значение параметра.
+        name (str): Имя параметра для сообщения об ошибке.
+        zone (tzinfo, optional): Часовой пояс значений без смещения.
+
+    Возвращает:
+        datetime: Момент времени с часовым поясом.
+
+    Исключения:
+        InvalidDatasetParams: Если значение не является датой.
+    """
+    try:
+        moment = parse_datetime(value)
+        if moment is None and (date := parse_date(value)) is not None:
+            moment = datetime.datetime.combine(date, datetime.time.min)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise InvalidDatasetParams(f"Invalid '{name}' datetime")
+    return timezone.make_aware(moment, zone) if timezone.is_naive(moment) else moment
+
+
+def parse_dataset_filters(query: QueryDict) -> DatasetFilters:
+    """
+    Разбирает параметры `from`, `to`, `limit`, `cursor`, `granularity` и `tz` запроса к датасету.
+
+    Аргументы:
+        query (QueryDict): GET-параметры запроса.
+
+    Возвращает:
+        DatasetFilters: Фильтры датасета.
+
+    Исключения:
+        InvalidDatasetParams: Если параметры заданы неверно.
+    """
+    granularity = query.get('granularity') or 'day'
+    if granularity not in GRANULARITIES:
+        raise InvalidDatasetParams(f"'granularity' must be one of {', '.join(GRANULARITIES)}")
+    tz = query.get('tz') or None
+    zone = None
+    if tz:
+        try:
+            zone = zoneinfo.ZoneInfo(tz)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError) as error:
+            raise InvalidDatasetParams("Invalid 'tz'") from error
+
+    date_from = parse_moment(query['from'], 'from', zone) if query.get('from') else None
+    date_to = parse_moment(query['to'], 'to', zone) if query.get('to') else None
+
+    limit = None
+    if query.get('limit'):
+        try:
+            limit = int(query['limit'])
+        except ValueError as error:
+            raise InvalidDatasetParams("Invalid 'limit'") from error
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise InvalidDatasetParams(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+
+    after = None
+    if query.get('cursor'):
+        after = decode_cursor(query['cursor'])
+        limit = limit or DEFAULT_PAGE_SIZE
+
+    return DatasetFilters(date_from=date_from, date_to=date_to, after=after, limit=limit,
+                          granularity=granularity, tz=tz)
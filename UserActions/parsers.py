@@ -0,0 +1,36 @@
+import json
+from collections.abc import Iterator
+
+from rest_framework.parsers import BaseParser
+
+
+class InvalidLine:
+    """Строка NDJSON, которую не удалось разобрать; отклоняется при записи как неверное событие."""
+
+    def __init__(self, error: str) -> None:
+        self.error = error
+
+
+class NDJSONParser(BaseParser):
+    """
+    Разбор тела запроса в формате NDJSON (один JSON-объект в строке).
+
+    Возвращает итератор, который читает тело построчно по мере обработки, поэтому большой
+    поток событий не загружается в память целиком. Пустые строки пропускаются, а строка
+    с неверным JSON превращается в `InvalidLine` и не прерывает разбор остальных.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None) -> Iterator[object]:
+        return self.iter_lines(stream) if stream is not None else iter(())
+
+    @staticmethod
+    def iter_lines(stream) -> Iterator[object]:
+        """Построчно разбирает поток NDJSON."""
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield InvalidLine("Invalid JSON")
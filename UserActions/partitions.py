@@ -0,0 +1,246 @@
+import copy
+import dataclasses
+import datetime
+import re
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .db_routers import read_db
+from .indexes import INDEXES, create_indexes
+
+PARTITION_ALIAS_RE = re.compile(r'^logs_(\d{4})_(\d{2})$')
+PARTITION_FILE_GLOB = 'logs_[0-9][0-9][0-9][0-9]_[0-9][0-9].sqlite3'
+
+# Время изменения каталога партиций при последнем просмотре (см. `discover_partitions`).
+_scanned_mtimes: dict[Path, int] = {}
+_scan_lock = threading.Lock()
+
+# Таблица логов в файле партиции: те же колонки, что и в 'logs_db', но без внешних ключей —
+# справочники event_type и space_type остаются в 'logs_db'. id сохраняется при переносе.
+PARTITION_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS "logs" (
+        "id" INTEGER PRIMARY KEY,
+        "datetime" INTEGER NOT NULL,
+        "user_id" INTEGER NOT NULL,
+        "space_type_id" INTEGER NOT NULL,
+        "event_type_id" INTEGER NOT NULL,
+        "space_id" INTEGER DEFAULT NULL
+    )
+'''
+
+LOG_COLUMNS = '"id", "datetime", "user_id", "space_type_id", "event_type_id", "space_id"'
+
+
+def month_start(moment: datetime.date) -> datetime.date:
+    """Возвращает первый день месяца даты."""
+    return moment.replace(day=1)
+
+
+def next_month(month: datetime.date) -> datetime.date:
+    """Возвращает первый день следующего месяца."""
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def partition_alias(month: datetime.date) -> str:
+    """
+    Возвращает псевдоним базы данных партиции месяца.
+
+    Аргументы:
+        month (date): Любой день месяца.
+
+    Возвращает:
+        str: Псевдоним вида 'logs_2025_03'; так же называется файл партиции.
+    """
+    return f"logs_{month.year:04d}_{month.month:02d}"
+
+
+def discover_partitions(directory: Path | None = None) -> list[str]:
+    """
+    Регистрирует файлы партиций, появившиеся в каталоге после старта процесса.
+
+    Партиции, созданные командой `partition_logs` в другом процессе, становятся видны без перезапуска.
+    Каталог просматривается заново, только если изменилось время его изменения, поэтому обычный вызов
+    стоит одного `stat`.
+
+    Аргументы:
+        directory (Path, optional): Каталог партиций; по умолчанию `settings.LOG_PARTITIONS_DIR`.
+
+    Возвращает:
+        list: Псевдонимы зарегистрированных этим вызовом партиций.
+    """
+    directory = Path(directory or settings.LOG_PARTITIONS_DIR)
+    try:
+        mtime = directory.stat().st_mtime_ns
+    except OSError:
+        return []
+    if _scanned_mtimes.get(directory) == mtime:
+        return []
+    registered = []
+    with _scan_lock:
+        for path in sorted(directory.glob(PARTITION_FILE_GLOB)):
+            if path.stem not in connections.settings:
+                register_partition(path.stem, path)
+                registered.append(path.stem)
+        # Сохраняется время до просмотра: файл, добавленный во время просмотра, найдётся при следующем вызове.
+        _scanned_mtimes[directory] = mtime
+    return registered
+
+
+def get_partitions() -> dict[str, tuple[datetime.date, datetime.date]]:
+    """
+    Возвращает зарегистрированные партиции логов, предварительно проверив каталог партиций на новые файлы.
+
+    Возвращает:
+        dict: Псевдоним → (первый день месяца, первый день следующего месяца), по возрастанию месяца.
+    """
+    discover_partitions()
+    partitions = {}
+    for alias in sorted(connections.settings):
+        if match := PARTITION_ALIAS_RE.match(alias):
+            month = datetime.date(int(match[1]), int(match[2]), 1)
+            partitions[alias] = (month, next_month(month))
+    return partitions
+
+
+def is_partition(db: str) -> bool:
+    """Проверяет, является ли псевдоним партицией логов."""
+    return PARTITION_ALIAS_RE.match(db) is not None and db in connections.settings
+
+
+def partitions_for_period(date_from: datetime.datetime | None = None,
+                          date_to: datetime.datetime | None = None) -> list[str]:
+    """
+    Возвращает партиции, месяцы которых пересекаются с периодом [date_from, date_to).
+
+    Месяцы партиций считаются в UTC, как и даты в таблице логов.
+
+    Аргументы:
+        date_from (datetime | None): Начало периода, включительно.
+        date_to (datetime | None): Конец периода, не включительно.
+
+    Возвращает:
+        list: Псевдонимы партиций по возрастанию месяца.
+    """
+    low = date_from.astimezone(datetime.UTC).date() if date_from else datetime.date.min
+    high = date_to.astimezone(datetime.UTC) if date_to else None
+    aliases = []
+    for alias, (start, end) in get_partitions().items():
+        if end <= low:
+            continue
+        if high is not None and datetime.datetime.combine(start, datetime.time.min, datetime.UTC) >= high:
+            continue
+        aliases.append(alias)
+    return aliases
+
+
+def log_read_aliases(date_from: datetime.datetime | None = None,
+                     date_to: datetime.datetime | None = None, primary: str = 'logs_db') -> list[str]:
+    """
+    Возвращает базы данных, которые нужно прочитать, чтобы получить логи за период.
+
+    Текущие логи пишутся в 'logs_db' или шард пользователя (читаются из них или их реплик),
+    закрытые месяцы переносятся в партиции командой `partition_logs`.
+
+    Аргументы:
+        date_from (datetime | None): Начало периода, включительно.
+        date_to (datetime | None): Конец периода, не включительно.
+        primary (str): База с текущими логами — 'logs_db' или шард пользователя.
+
+    Возвращает:
+        list: `primary` (или её реплика) и партиции периода.
+    """
+    return [read_db(primary), *partitions_for_period(date_from, date_to)]
+
+
+def register_partition(alias: str, path: Path) -> None:
+    """
+    Регистрирует файл партиции как базу данных в текущем процессе.
+
+    При старте процесса партиции из `LOG_PARTITIONS_DIR` регистрируются в `settings.DATABASES`;
+    партиции, созданные после старта, регистрируются через эту функцию (см. `discover_partitions`).
+
+    Аргументы:
+        alias (str): Псевдоним партиции.
+        path (Path): Путь к файлу партиции.
+    """
+    if alias in connections.settings:
+        return
+    options = copy.deepcopy(connections.settings['logs_db'])
+    options['NAME'] = path
+    options['TEST'].update({'NAME': None, 'MIRROR': alias})
+    connections.settings[alias] = options
+
+
+def create_partition(month: datetime.date, directory: Path | None = None) -> str:
+    """
+    Создаёт файл партиции месяца с таблицей логов и индексами, если его ещё нет.
+
+    Аргументы:
+        month (date): Любой день месяца.
+        directory (Path, optional): Каталог партиций; по умолчанию `settings.LOG_PARTITIONS_DIR`.
+
+    Возвращает:
+        str: Псевдоним партиции.
+    """
+    alias = partition_alias(month)
+    directory = Path(directory or settings.LOG_PARTITIONS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    register_partition(alias, directory / f"{alias}.sqlite3")
+    with connections[alias].cursor() as cursor:
+        cursor.execute(PARTITION_TABLE_SQL)
+    create_indexes(tuple(
+        dataclasses.replace(spec, alias=alias) for spec in INDEXES if spec.alias == 'logs_db' and spec.table == 'logs'
+    ))
+    return alias
+
+
+def move_month(month: datetime.date, source: str = 'logs_db', max_id: int | None = None,
+               directory: Path | None = None) -> int:
+    """
+    Переносит логи месяца из базы `source` в партицию этого месяца.
+
+    Файл партиции подключается к соединению `source` через ATTACH, и копирование
+    с удалением выполняются одной транзакцией, поэтому читатели не видят строку
+    одновременно в обеих базах. В режиме WAL атомарность между файлами не гарантируется
+    только при сбое питания во время COMMIT. Триггеры дневной сводки на время переноса отключаются:
+    перенесённые логи остаются в сводке `source` (см. `rollups.add_partition_rollups`).
+
+    Аргументы:
+        month (date): Любой день переносимого месяца.
+        source (str): Псевдоним базы с текущими логами.
+        max_id (int, optional): Переносить только логи с id не больше этого значения
+            (например, уже учтённые в дневной сводке).
+        directory (Path, optional): Каталог партиций.
+
+    Возвращает:
+        int: Количество перенесённых логов.
+    """
+    alias = create_partition(month, directory)
+    connections[alias].close()
+    start, end = month_start(month), next_month(month)
+    condition = '"datetime" >= %s AND "datetime" < %s'
+    params = [f"{start.isoformat()} 00:00:00", f"{end.isoformat()} 00:00:00"]
+    if max_id is not None:
+        condition += ' AND "id" <= %s'
+        params.append(max_id)
+
+    from .rollups import rollup_triggers_suspended
+
+    connection = connections[source]
+    with connection.cursor() as cursor:
+        cursor.execute('ATTACH DATABASE %s AS "partition"', [str(connections.settings[alias]['NAME'])])
+        try:
+            with transaction.atomic(using=source), rollup_triggers_suspended(cursor):
+                cursor.execute(
+                    f'INSERT OR IGNORE INTO "partition"."logs" ({LOG_COLUMNS}) '
+                    f'SELECT {LOG_COLUMNS} FROM "main"."logs" WHERE {condition}',
+                    params,
+                )
+                cursor.execute(f'DELETE FROM "main"."logs" WHERE {condition}', params)
+                moved = cursor.rowcount
+        finally:
+            cursor.execute('DETACH DATABASE "partition"')
+    return moved
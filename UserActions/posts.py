@@ -0,0 +1,108 @@
+import threading
+from collections.abc import Iterable
+
+from django.conf import settings
+
+from blogs.models import Post, User
+
+from .cache import LRUCache
+from .joins import IN_CHUNK_SIZE, ForeignLookup, join_foreign
+
+_MISSING = object()
+
+# Заголовок и автор поста по space_id агрегата комментариев: сначала пост, затем логин его автора.
+POST_LOOKUPS = (
+    ForeignLookup(Post, 'space_id', {'header': 'header', 'author_id': 'author_id'}, {'header': "Unknown"}),
+    ForeignLookup(User, 'author_id', {'author_login': 'login'}, {'author_login': "Unknown"}),
+)
+
+
+class PostMetadataCache:
+    """
+    Кэш метаданных постов процесса: id поста → (заголовок, id автора, логин автора).
+
+    Популярные посты встречаются в датасетах comments многих пользователей, поэтому их метаданные
+    хранятся в ограниченном LRU-кэше и читаются из 'blogs_db' только при промахе (через `join_foreign`).
+    Несуществующие посты тоже кэшируются со значениями "Unknown". Изменения постов и пользователей
+    сбрасывают записи через сигналы (см. `UserActions.signals`); чтение, начатое до сброса, не сохраняет
+    в кэш прочитанные до него значения.
+    """
+
+    def __init__(self, max_entries: int, ttl: float | None) -> None:
+        self.entries = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'PostMetadataCache':
+        """Создаёт кэш по настройке `POST_METADATA_CACHE`."""
+        options = getattr(settings, 'POST_METADATA_CACHE', {})
+        return cls(max_entries=options.get('MAX_ENTRIES', 50000), ttl=options.get('TTL'))
+
+    def get_many(self, post_ids: Iterable[int]) -> dict[int, dict[str, str]]:
+        """
+        Возвращает заголовки постов и логины их авторов, запрашивая из базы только отсутствующие в кэше.
+
+        Аргументы:
+            post_ids (Iterable): Идентификаторы постов.
+
+        Возвращает:
+            dict: id поста → {'header': ..., 'author_login': ...}; для несуществующего поста или автора — "Unknown".
+        """
+        found, missing = {}, []
+        for post_id in set(post_ids):
+            entry = self.entries.get(post_id, _MISSING)
+            if entry is _MISSING:
+                missing.append(post_id)
+            else:
+                found[post_id] = entry
+        if missing:
+            generation = self._generation
+            rows = join_foreign(({'space_id': post_id} for post_id in missing), POST_LOOKUPS, IN_CHUNK_SIZE)
+            fetched = {row['space_id']: (row['header'], row['author_id'], row['author_login']) for row in rows}
+            with self._lock:
+                if generation == self._generation:
+                    for post_id, entry in fetched.items():
+                        self.entries.set(post_id, entry)
+            found.update(fetched)
+        return {
+            post_id: {"header": header, "author_login": author_login}
+            for post_id, (header, _, author_login) in found.items()
+        }
+
+    @property
+    def generation(self) -> int:
+        """
+        Поколение метаданных: увеличивается при каждом сбросе записей кэша.
+
+        Входит в версию датасетов comments (см. `services.comments_dataset_version`), поэтому изменение
+        заголовка поста или логина автора делает устаревшими и закэшированные датасеты с ними.
+        """
+        return self._generation
+
+    def invalidate_post(self, post_id: int) -> None:
+        """Удаляет метаданные поста (после изменения или удаления поста)."""
+        with self._lock:
+            self._generation += 1
+            self.entries.delete(post_id)
+
+    def invalidate_author(self, user_id: int) -> None:
+        """Удаляет метаданные всех постов автора (после изменения логина или удаления пользователя)."""
+        with self._lock:
+            self._generation += 1
+            self.entries.delete_where(lambda key, entry: entry[1] == user_id)
+
+    def clear(self) -> None:
+        """Очищает кэш и счётчики."""
+        with self._lock:
+            self._generation += 1
+            self.entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """Возвращает счётчики кэша и долю попаданий."""
+        stats = self.entries.stats()
+        lookups = stats["hits"] + stats["misses"]
+        return {**stats, "hit_ratio": stats["hits"] / lookups if lookups else 0.0}
+
+
+post_cache = PostMetadataCache.from_settings()
@@ -0,0 +1,281 @@
+import cProfile
+import datetime
+import json
+import marshal
+import os
+import sys
+import threading
+from collections import Counter
+from collections.abc import Iterator
+from pathlib import Path
+from types import FrameType
+
+from django.conf import settings
+from django.http import HttpRequest
+
+from .metrics import REQUEST_ID_RE
+
+# Режимы профилирования: детерминированный cProfile (файл pstats) и сэмплирующий (свёрнутые стеки для flamegraph).
+PROFILE_MODES = ('cprofile', 'sample')
+PROFILE_EXTENSIONS = {'cprofile': '.prof', 'sample': '.folded'}
+
+INDEX_FILE = 'index.jsonl'
+
+
+def profiling_enabled() -> bool:
+    """Проверяет, разрешено ли профилирование запросов настройкой `PROFILING['ENABLED']`."""
+    return getattr(settings, 'PROFILING', {}).get('ENABLED', True)
+
+
+def requested_mode(request: HttpRequest) -> str | None:
+    """
+    Возвращает режим профилирования, запрошенный заголовком `X-Profile` или GET-параметром `profile`.
+
+    Аргументы:
+        request (HttpRequest): Запрос.
+
+    Возвращает:
+        str | None: 'cprofile' (также для значений '1' и 'true'), 'sample' или None, если профилирование не запрошено.
+    """
+    value = (request.headers.get('X-Profile') or request.GET.get('profile') or '').strip().lower()
+    if value in ('1', 'true'):
+        return 'cprofile'
+    return value if value in PROFILE_MODES else None
+
+
+def may_profile(request: HttpRequest) -> bool:
+    """Проверяет, что запрос выполняет сотрудник (`is_staff`), аутентифицированный сессией."""
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+def frame_label(frame: FrameType) -> str:
+    """Возвращает подпись кадра стека для свёрнутых стеков: функция (файл:строка начала)."""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик одного потока.
+
+    Фоновый поток каждые `interval` секунд снимает стек профилируемого потока (`sys._current_frames`)
+    и считает одинаковые стеки. Результат — свёрнутые стеки (`collapsed`), которые читают flamegraph.pl,
+    speedscope и inferno. Накладные расходы не зависят от количества вызовов функций, поэтому
+    профиль искажён меньше, чем у cProfile, но короткие функции могут не попасть в выборку.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[tuple[str, ...]] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self) -> None:
+        """Запускает снятие стеков."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает снятие стеков и дожидается фонового потока."""
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Возвращает стеки в свёрнутом формате: `корень;...;лист количество` по строке на стек."""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+# cProfile в Python 3.12+ регистрируется в общем для процесса `sys.monitoring`: второй одновременный сеанс
+# завершается ValueError, а включённый сеанс видит вызовы всех потоков. Поэтому сеансы cProfile идут по одному.
+_cprofile_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """
+    Профилировщик одного запроса в режиме 'cprofile' или 'sample'.
+
+    `enable`/`disable` охватывают участки, выполняемые в потоке запроса: обработку представлением
+    и получение каждой части потокового ответа. Потоки пулов (`services.scatter`) не профилируются.
+    Если cProfile уже занят другим запросом или другим инструментом, запрос профилируется в режиме 'sample';
+    итоговый режим — в атрибуте `mode`.
+    """
+
+    def __init__(self, mode: str, interval: float) -> None:
+        self.interval = interval
+        self._profile = None
+        self._sampler = None
+        if mode == 'cprofile' and _cprofile_lock.acquire(blocking=False):
+            self._profile = cProfile.Profile()
+        self.mode = 'cprofile' if self._profile is not None else 'sample'
+
+    def enable(self) -> None:
+        """Продолжает профилирование в текущем потоке."""
+        if self._profile is not None:
+            try:
+                self._profile.enable()
+                return
+            except ValueError:
+                # Другой профилировщик уже зарегистрирован в sys.monitoring.
+                self._release()
+        if self._sampler is None:
+            self._sampler = SamplingProfiler(threading.get_ident(), self.interval)
+            self._sampler.start()
+
+    def disable(self) -> None:
+        """Приостанавливает профилирование (сэмплирование продолжается до `finish`)."""
+        if self._profile is not None:
+            self._profile.disable()
+
+    def finish(self) -> bytes:
+        """
+        Завершает профилирование и возвращает профиль.
+
+        Возвращает:
+            bytes: Файл pstats (`pstats.Stats(path)`, snakeviz) для 'cprofile' или свёрнутые стеки для 'sample'.
+        """
+        if self._profile is not None:
+            try:
+                self._profile.disable()
+                self._profile.create_stats()
+                return marshal.dumps(self._profile.stats)
+            finally:
+                _cprofile_lock.release()
+        if self._sampler is None:
+            return b''
+        self._sampler.stop()
+        return self._sampler.collapsed().encode()
+
+    def _release(self) -> None:
+        """Отказывается от cProfile и переключает профилировщик в режим 'sample'."""
+        self._profile = None
+        self.mode = 'sample'
+        _cprofile_lock.release()
+
+
+class ProfileStore:
+    """
+    Каталог сохранённых профилей запросов и их индекс (`index.jsonl`).
+
+    Профиль хранится в файле `<id запроса>.prof` или `<id запроса>.folded`; сверх `max_profiles`
+    самые старые профили удаляются вместе с записями индекса.
+
+    Атрибуты:
+        directory (Path): Каталог профилей.
+        max_profiles (int): Максимальное количество хранимых профилей.
+    """
+
+    def __init__(self, directory: str | Path, max_profiles: int) -> None:
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'ProfileStore':
+        """Создаёт каталог по настройке `PROFILING`."""
+        options = getattr(settings, 'PROFILING', {})
+        return cls(
+            directory=options.get('DIR', Path(settings.BASE_DIR) / 'profiles'),
+            max_profiles=options.get('MAX_PROFILES', 200),
+        )
+
+    def save(self, request_id: str, mode: str, data: bytes, meta: dict) -> dict:
+        """
+        Сохраняет профиль и добавляет его в индекс.
+
+        Аргументы:
+            request_id (str): Id запроса (см. `metrics.RequestScope`).
+            mode (str): Режим профилирования.
+            data (bytes): Профиль (см. `RequestProfiler.finish`).
+            meta (dict): Сведения о запросе: метод, путь, представление, пользователь, код ответа, время.
+
+        Возвращает:
+            dict: Запись индекса.
+        """
+        entry = {
+            "request_id": request_id,
+            "time": datetime.datetime.now(datetime.UTC).isoformat(timespec='milliseconds'),
+            "mode": mode,
+            "file": f"{request_id}{PROFILE_EXTENSIONS[mode]}",
+            **meta,
+        }
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / entry["file"]).write_bytes(data)
+            entries = self._read()
+            stale = [old for old in entries if old["request_id"] == request_id and old["file"] != entry["file"]]
+            entries = [old for old in entries if old["request_id"] != request_id] + [entry]
+            for old in stale + entries[:-self.max_profiles]:
+                (self.directory / old["file"]).unlink(missing_ok=True)
+            entries = entries[-self.max_profiles:]
+            index = self.directory / INDEX_FILE
+            temporary = index.with_suffix('.tmp')
+            temporary.write_text(''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in entries), encoding='utf-8')
+            temporary.replace(index)
+        return entry
+
+    def _read(self) -> list[dict]:
+        index = self.directory / INDEX_FILE
+        if not index.exists():
+            return []
+        return [json.loads(line) for line in index.read_text(encoding='utf-8').splitlines() if line]
+
+    def entries(self) -> list[dict]:
+        """Возвращает записи индекса, начиная с последних."""
+        with self._lock:
+            return list(reversed(self._read()))
+
+    def get(self, request_id: str) -> tuple[dict, Path] | None:
+        """
+        Находит профиль запроса.
+
+        Аргументы:
+            request_id (str): Id запроса.
+
+        Возвращает:
+            tuple | None: Запись индекса и путь к файлу профиля или None, если профиля нет.
+        """
+        if not REQUEST_ID_RE.match(request_id):
+            return None
+        for entry in self.entries():
+            if entry["request_id"] == request_id:
+                path = self.directory / entry["file"]
+                return (entry, path) if path.exists() else None
+        return None
+
+
+def profile_stream(content: Iterator[bytes], profiler: RequestProfiler, on_finish) -> Iterator[bytes]:
+    """
+    Отдаёт части потокового ответа, профилируя их получение, и сохраняет профиль по окончании отдачи.
+
+    Аргументы:
+        content (Iterator): Части ответа.
+        profiler (RequestProfiler): Профилировщик запроса.
+        on_finish (Callable): Вызывается без аргументов после последней части или обрыва отдачи.
+    """
+    iterator = iter(content)
+    try:
+        while True:
+            profiler.enable()
+            try:
+                chunk = next(iterator, None)
+            finally:
+                profiler.disable()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        on_finish()
+
+
+profile_store = ProfileStore.from_settings()
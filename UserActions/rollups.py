@@ -0,0 +1,384 @@
+import datetime
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from django.db import connections, transaction
+
+from logs.models import ActivityRollupState, EventType, SpaceType
+
+from .dimensions import dimensions
+from .partitions import get_partitions
+
+ROLLUP_TABLES_SQL = (
+    '''
+    CREATE TABLE IF NOT EXISTS "daily_activity" (
+        "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+        "user_id" INTEGER NOT NULL,
+        "date" TEXT NOT NULL,
+        "logins" INTEGER NOT NULL DEFAULT 0,
+        "logouts" INTEGER NOT NULL DEFAULT 0,
+        "blog_actions" INTEGER NOT NULL DEFAULT 0,
+        "events" INTEGER NOT NULL DEFAULT 0,
+        UNIQUE ("user_id", "date")
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS "daily_activity_state" (
+        "id" INTEGER PRIMARY KEY,
+        "last_log_id" INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'INSERT OR IGNORE INTO "daily_activity_state" ("id", "last_log_id") VALUES (1, 0)',
+)
+
+# Текущая отметка сводки в теле триггера.
+MARK_SQL = '(SELECT "last_log_id" FROM "daily_activity_state" WHERE "id" = 1)'
+
+# Триггеры поддерживают сводку при удалении и изменении уже учтённых логов (id не больше отметки)
+# в той же транзакции, что и изменение логов. День пользователя удаляется из сводки вместе с его
+# последним логом (`events`), как и строка агрегации по логам. Id типов подставляются при установке,
+# потому что в теле триггера нельзя использовать параметры запроса.
+ROLLUP_SUBTRACT_SQL = f'''
+    UPDATE "daily_activity" SET
+        "logins" = "logins" - (OLD."event_type_id" = {{login}}),
+        "logouts" = "logouts" - (OLD."event_type_id" = {{logout}}),
+        "blog_actions" = "blog_actions" - (OLD."space_type_id" = {{blog}}),
+        "events" = "events" - 1
+    WHERE OLD."id" <= {MARK_SQL} AND "user_id" = OLD."user_id" AND "date" = date(OLD."datetime");
+    DELETE FROM "daily_activity"
+    WHERE "user_id" = OLD."user_id" AND "date" = date(OLD."datetime") AND "events" <= 0;
+'''
+
+ROLLUP_ADD_SQL = f'''
+    INSERT INTO "daily_activity" ("user_id", "date", "logins", "logouts", "blog_actions", "events")
+    SELECT NEW."user_id", date(NEW."datetime"),
+           NEW."event_type_id" = {{login}}, NEW."event_type_id" = {{logout}}, NEW."space_type_id" = {{blog}}, 1
+    WHERE NEW."id" <= {MARK_SQL}
+    ON CONFLICT ("user_id", "date") DO UPDATE SET
+        "logins" = "logins" + excluded."logins",
+        "logouts" = "logouts" + excluded."logouts",
+        "blog_actions" = "blog_actions" + excluded."blog_actions",
+        "events" = "events" + 1;
+'''
+
+ROLLUP_TRIGGERS_SQL = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS "daily_activity_delete" AFTER DELETE ON "logs"
+    WHEN OLD."id" <= {MARK_SQL}
+    BEGIN {ROLLUP_SUBTRACT_SQL} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS "daily_activity_update"
+    AFTER UPDATE OF "id", "datetime", "user_id", "event_type_id", "space_type_id" ON "logs"
+    WHEN OLD."id" <= {MARK_SQL} OR NEW."id" <= {MARK_SQL}
+    BEGIN {ROLLUP_SUBTRACT_SQL} {ROLLUP_ADD_SQL} END
+    ''',
+)
+
+DROP_ROLLUP_TABLES_SQL = (
+    'DROP TRIGGER IF EXISTS "daily_activity_delete"',
+    'DROP TRIGGER IF EXISTS "daily_activity_update"',
+    'DROP TABLE IF EXISTS "daily_activity"',
+    'DROP TABLE IF EXISTS "daily_activity_state"',
+)
+
+# Дата берётся в UTC так же, как дневной интервал `buckets.bucket_expression` при TIME_ZONE = 'UTC'.
+REFRESH_SQL = '''
+    INSERT INTO "daily_activity" ("user_id", "date", "logins", "logouts", "blog_actions", "events")
+    SELECT "user_id", date("datetime"),
+           SUM("event_type_id" = %s), SUM("event_type_id" = %s), SUM("space_type_id" = %s), COUNT(*)
+    FROM "logs"
+    WHERE "id" > %s AND "id" <= %s
+    GROUP BY "user_id", date("datetime")
+    ON CONFLICT ("user_id", "date") DO UPDATE SET
+        "logins" = "logins" + excluded."logins",
+        "logouts" = "logouts" + excluded."logouts",
+        "blog_actions" = "blog_actions" + excluded."blog_actions",
+        "events" = "events" + excluded."events"
+'''
+
+# Агрегаты партиции логов (всех пользователей или одного); добавляются к сводке 'logs_db' при её пересчёте.
+PARTITION_ROWS_SQL = '''
+    SELECT "user_id", date("datetime"),
+           SUM("event_type_id" = %s), SUM("event_type_id" = %s), SUM("space_type_id" = %s), COUNT(*)
+    FROM "logs"
+    WHERE %s IS NULL OR "user_id" = %s
+    GROUP BY "user_id", date("datetime")
+'''
+
+# Сводка одного пользователя по логам до отметки; строки пользователя перед этим удаляются.
+USER_REBUILD_SQL = '''
+    INSERT INTO "daily_activity" ("user_id", "date", "logins", "logouts", "blog_actions", "events")
+    SELECT "user_id", date("datetime"),
+           SUM("event_type_id" = %s), SUM("event_type_id" = %s), SUM("space_type_id" = %s), COUNT(*)
+    FROM "logs"
+    WHERE "user_id" = %s AND "id" <= %s
+    GROUP BY "user_id", date("datetime")
+'''
+
+UPSERT_SQL = '''
+    INSERT INTO "daily_activity" ("user_id", "date", "logins", "logouts", "blog_actions", "events")
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT ("user_id", "date") DO UPDATE SET
+        "logins" = "logins" + excluded."logins",
+        "logouts" = "logouts" + excluded."logouts",
+        "blog_actions" = "blog_actions" + excluded."blog_actions",
+        "events" = "events" + excluded."events"
+'''
+
+# Дни из сводки и агрегаты логов после отметки объединяются одним запросом,
+# поэтому обновление сводки между чтениями не может учесть логи дважды.
+GENERAL_ROWS_SQL = '''
+    SELECT "user_id", "date", SUM("logins"), SUM("logouts"), SUM("blog_actions")
+    FROM (
+        SELECT "user_id", "date", "logins", "logouts", "blog_actions"
+        FROM "daily_activity"
+        WHERE "user_id" IN ({user_ids}) AND "date" >= %s AND "date" < %s
+        UNION ALL
+        SELECT "user_id", date("datetime"), "event_type_id" = %s, "event_type_id" = %s, "space_type_id" = %s
+        FROM "logs"
+        WHERE "user_id" IN ({user_ids}) AND "datetime" >= %s AND "datetime" < %s
+          AND "id" > (SELECT "last_log_id" FROM "daily_activity_state" WHERE "id" = 1)
+    )
+    GROUP BY "user_id", "date"
+    ORDER BY "user_id", "date"
+'''
+
+
+def rollups_available(alias: str = 'logs_db') -> bool:
+    """
+    Проверяет, построена ли в базе данных дневная сводка.
+
+    Сводка считается построенной, если есть таблица состояния и триггер удаления логов: сводка без триггеров
+    (созданная до их появления) расходилась бы с логами после удаления или изменения учтённых строк.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+
+    Возвращает:
+        bool: True, если сводку можно читать вместо агрегирования логов.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE (type = 'table' AND name = 'daily_activity_state') "
+            "OR (type = 'trigger' AND name = 'daily_activity_delete')"
+        )
+        return cursor.fetchone()[0] == 2
+
+
+def create_rollup_tables(alias: str = 'logs_db') -> bool:
+    """
+    Создаёт таблицы и триггеры дневной сводки, если их ещё нет.
+
+    Сводка без колонки `events` (созданная до появления триггеров) удаляется, а отметка сбрасывается.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+
+    Возвращает:
+        bool: True, если сводка создана заново и её нужно пересчитать (см. `rebuild_rollups`).
+    """
+    login_id, logout_id, blog_id = rollup_type_ids(alias)
+    introspection = connections[alias].introspection
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        existing = 'daily_activity' in introspection.table_names(cursor)
+        outdated = existing and 'events' not in {
+            column.name for column in introspection.get_table_description(cursor, 'daily_activity')
+        }
+        if outdated:
+            cursor.execute('DROP TABLE "daily_activity"')
+            cursor.execute('UPDATE "daily_activity_state" SET "last_log_id" = 0 WHERE "id" = 1')
+        for sql in ROLLUP_TABLES_SQL:
+            cursor.execute(sql)
+        for sql in ROLLUP_TRIGGERS_SQL:
+            cursor.execute(sql.format(login=int(login_id), logout=int(logout_id), blog=int(blog_id)))
+    return not existing or outdated
+
+
+def drop_rollup_tables(alias: str = 'logs_db') -> None:
+    """
+    Удаляет таблицы дневной сводки.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+    """
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        for sql in DROP_ROLLUP_TABLES_SQL:
+            cursor.execute(sql)
+
+
+@contextmanager
+def rollup_triggers_suspended(cursor) -> Iterator[None]:
+    """
+    Отключает триггеры дневной сводки в пределах блока `with`.
+
+    Нужно при переносе учтённых логов в партиции (см. `partitions.move_month`): перенесённые логи
+    остаются в сводке 'logs_db'. Вызывается внутри транзакции, поэтому другие соединения
+    не видят базу без триггеров.
+
+    Аргументы:
+        cursor: Курсор базы данных с таблицей 'logs'.
+    """
+    cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN "
+        "('daily_activity_delete', 'daily_activity_update')"
+    )
+    triggers = cursor.fetchall()
+    for name, _ in triggers:
+        cursor.execute(f'DROP TRIGGER "{name}"')
+    try:
+        yield
+    finally:
+        for _, sql in triggers:
+            cursor.execute(sql)
+
+
+def get_high_water_mark(alias: str = 'logs_db') -> int:
+    """
+    Возвращает id последнего лога, учтённого в дневной сводке.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+
+    Возвращает:
+        int: Отметка обработанных логов.
+    """
+    return ActivityRollupState.objects.using(alias).values_list('last_log_id', flat=True).get(pk=1)
+
+
+def iter_general_rows(user_ids: list[int], alias: str = 'logs_db', chunk_size: int = 2000,
+                      date_from: datetime.date | None = None,
+                      date_to: datetime.date | None = None) -> Iterator[tuple[int, dict]]:
+    """
+    Построчно возвращает агрегаты датасета general из дневной сводки и логов после отметки.
+
+    Аргументы:
+        user_ids (list): Идентификаторы пользователей.
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+        chunk_size (int): Количество строк, читаемых из курсора за раз.
+        date_from (date, optional): Первая включаемая дата (UTC).
+        date_to (date, optional): Первая не включаемая дата (UTC).
+
+    Возвращает:
+        Iterator: Пары (user_id, {'date': ..., 'logins': ..., 'logouts': ..., 'blog_actions': ...}),
+        упорядоченные по пользователю и дате.
+    """
+    login_id = dimensions.event_type_id("login")
+    logout_id = dimensions.event_type_id("logout")
+    blog_id = dimensions.space_type_id("blog")
+
+    date_from = (date_from or datetime.date.min).isoformat()
+    date_to = (date_to or datetime.date.max).isoformat()
+    sql = GENERAL_ROWS_SQL.format(user_ids=", ".join(["%s"] * len(user_ids)))
+    params = [
+        *user_ids, date_from, date_to,
+        login_id, logout_id, blog_id, *user_ids, f"{date_from} 00:00:00", f"{date_to} 00:00:00",
+    ]
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(chunk_size):
+            for user_id, date, logins, logouts, blog_actions in rows:
+                yield user_id, {
+                    "date": datetime.date.fromisoformat(date),
+                    "logins": logins,
+                    "logouts": logouts,
+                    "blog_actions": blog_actions,
+                }
+
+
+def refresh_rollups(alias: str = 'logs_db', batch_size: int = 100000) -> int:
+    """
+    Дополняет дневную сводку логами, появившимися после отметки, и сдвигает отметку.
+
+    Логи обрабатываются пачками по диапазону id; каждая пачка и сдвиг отметки выполняются
+    в одной транзакции, поэтому прерванное обновление можно безопасно повторить.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+        batch_size (int): Размер диапазона id, обрабатываемого за одну транзакцию.
+
+    Возвращает:
+        int: Количество обработанных строк логов.
+    """
+    login_id, logout_id, blog_id = rollup_type_ids(alias)
+
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT MAX("id") FROM "logs"')
+        max_id = cursor.fetchone()[0] or 0
+
+    processed = 0
+    while True:
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            low = get_high_water_mark(alias)
+            if low >= max_id:
+                return processed
+            high = min(low + batch_size, max_id)
+            cursor.execute(REFRESH_SQL, [login_id, logout_id, blog_id, low, high])
+            cursor.execute('SELECT COUNT(*) FROM "logs" WHERE "id" > %s AND "id" <= %s', [low, high])
+            processed += cursor.fetchone()[0]
+            cursor.execute('UPDATE "daily_activity_state" SET "last_log_id" = %s WHERE "id" = 1', [high])
+
+
+def rebuild_rollups(alias: str = 'logs_db', batch_size: int = 100000) -> int:
+    """
+    Пересчитывает дневную сводку с нуля.
+
+    Нужна, если строки логов ниже отметки менялись при отключённых триггерах сводки. Для 'logs_db' в сводку
+    также добавляются агрегаты партиций логов (см. `partitions.move_month`).
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+        batch_size (int): Размер диапазона id, обрабатываемого за одну транзакцию.
+
+    Возвращает:
+        int: Количество обработанных строк логов.
+    """
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        cursor.execute('DELETE FROM "daily_activity"')
+        cursor.execute('UPDATE "daily_activity_state" SET "last_log_id" = 0 WHERE "id" = 1')
+        if alias == 'logs_db':
+            add_partition_rollups(cursor, rollup_type_ids(alias))
+    return refresh_rollups(alias, batch_size)
+
+
+def rebuild_user_rollups(alias: str, user_id: int) -> None:
+    """
+    Пересчитывает дневную сводку одного пользователя по логам до отметки.
+
+    Нужна после переноса логов пользователя между шардами (см. `sharding.move_user`):
+    перенесённые строки могут оказаться ниже отметки целевого шарда.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных с таблицей 'logs'.
+        user_id (int): Идентификатор пользователя.
+    """
+    type_ids = rollup_type_ids(alias)
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        cursor.execute('DELETE FROM "daily_activity" WHERE "user_id" = %s', [user_id])
+        cursor.execute(USER_REBUILD_SQL, [*type_ids, user_id, get_high_water_mark(alias)])
+        if alias == 'logs_db':
+            add_partition_rollups(cursor, type_ids, user_id)
+
+
+def rollup_type_ids(alias: str) -> tuple[int, int, int]:
+    """Возвращает id типов событий login и logout и типа пространства blog."""
+    return (
+        EventType.objects.using(alias).get(name="login").id,
+        EventType.objects.using(alias).get(name="logout").id,
+        SpaceType.objects.using(alias).get(name="blog").id,
+    )
+
+
+def add_partition_rollups(cursor, type_ids: tuple[int, int, int], user_id: int | None = None) -> None:
+    """
+    Добавляет к сводке агрегаты логов из партиций (всех пользователей или одного).
+
+    Аргументы:
+        cursor: Курсор базы данных со сводкой, внутри транзакции пересчёта.
+        type_ids (tuple): Результат `rollup_type_ids`.
+        user_id (int, optional): Идентификатор пользователя.
+    """
+    for partition in get_partitions():
+        with connections[partition].cursor() as partition_cursor:
+            partition_cursor.execute(PARTITION_ROWS_SQL, [*type_ids, user_id, user_id])
+            cursor.executemany(UPSERT_SQL, partition_cursor.fetchall())
@@ -1,5 +1,24 @@
 from rest_framework import serializers
 
+from .tracing import span
+
+
+class TracedListSerializer(serializers.ListSerializer):
+    """
+    Сериализатор списка, записывающий спан трассировки (см. `UserActions.tracing`) при получении `data`.
+
+    Подключается к сериализаторам строк датасетов через `Meta.list_serializer_class`.
+    """
+
+    @property
+    def data(self):
+        with span(f"{type(self.child).__name__}(many=True)", 'serializer') as args:
+            data = super().data
+            if args is not None:
+                args["rows"] = len(data)
+            return data
+
+
 
 class CommentsSerializer(serializers.Serializer):
     """
@@ -18,6 +37,9 @@ class CommentsSerializer(serializers.Serializer):
     author_login = serializers.CharField()
     comments_count = serializers.IntegerField()
 
+    class Meta:
+        list_serializer_class = TracedListSerializer
+
 class UserActivitySerializer(serializers.Serializer):
     """
     Сериализатор для данных о действиях пользователя в блоге.
@@ -35,4 +57,16 @@ class UserActivitySerializer(serializers.Serializer):
     logouts = serializers.IntegerField()
     blog_actions_count = serializers.IntegerField()
 
+    class Meta:
+        list_serializer_class = TracedListSerializer
+
+
+
 
+class HourlyActivitySerializer(UserActivitySerializer):
+    """
+    Сериализатор почасовых данных о действиях пользователя (`/api/general?granularity=hour`).
+
+    Поля те же, что у `UserActivitySerializer`, но `date` — время начала часа в часовом поясе запроса.
+    """
+    date = serializers.DateTimeField()
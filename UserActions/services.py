@@ -0,0 +1,947 @@
+import asyncio
+import contextvars
+import datetime
+import heapq
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, F, Max, Min, Q, QuerySet
+from django.utils import timezone
+
+from blogs.models import User
+from logs.models import CommentCounter, Log
+
+from . import rollups
+from .buckets import bucket_expression, is_utc, next_bucket_start, parse_bucket
+from .cache import dataset_cache
+from .counters import counters_available
+from .db_routers import read_db
+from .dimensions import dimensions
+from .joins import IN_CHUNK_SIZE, chunked
+from .log_versions import get_log_version, log_versions_available
+from .pagination import NO_FILTERS, DatasetFilters, InvalidDatasetParams
+from .partitions import log_read_aliases, partitions_for_period
+from .posts import post_cache
+from .rollups import rollups_available
+from .serializers import (
+    CommentsSerializer,
+    HourlyActivitySerializer,
+    UserActivitySerializer,
+)
+from .sharding import shard_map
+from .tracing import traced
+
+# Количество логинов на одной странице автодополнения.
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+
+def get_user_id(login: str) -> int:
+    """
+    Возвращает идентификатор пользователя по его логину из кэша справочников.
+
+    Аргументы:
+        login (str): Логин пользователя.
+
+    Возвращает:
+        int: Идентификатор пользователя в базе данных 'blogs_db'.
+
+    Исключения:
+        User.DoesNotExist: Если пользователь с таким логином не найден.
+    """
+    return dimensions.user_id(login)
+
+
+def resolve_user_ids(logins: Iterable[str]) -> dict[str, int]:
+    """
+    Возвращает идентификаторы пользователей для набора логинов; из базы запрашиваются только промахи кэша.
+
+    Аргументы:
+        logins (Iterable): Логины пользователей.
+
+    Возвращает:
+        dict: Логин → идентификатор; несуществующие логины в словарь не попадают.
+    """
+    return dimensions.user_ids(logins, IN_CHUNK_SIZE)
+
+
+def search_logins(prefix: str, page: int = 1, page_size: int = AUTOCOMPLETE_PAGE_SIZE) -> tuple[list[str], bool]:
+    """
+    Возвращает страницу логинов, начинающихся с префикса, в алфавитном порядке.
+
+    Префикс ищется диапазоном `login >= prefix AND login < prefix + U+10FFFF`, который SQLite
+    выполняет по уникальному индексу на `users.login`, в отличие от `LIKE 'prefix%'`. Поиск чувствителен к регистру.
+
+    Аргументы:
+        prefix (str): Начало логина; пустая строка — все логины.
+        page (int): Номер страницы, начиная с 1.
+        page_size (int): Количество логинов на странице.
+
+    Возвращает:
+        tuple: Логины страницы и признак наличия следующей страницы.
+    """
+    queryset = User.objects.using(read_db('blogs_db')).order_by('login')
+    if prefix:
+        queryset = queryset.filter(login__gte=prefix, login__lt=prefix + '\U0010ffff')
+    offset = (page - 1) * page_size
+    logins = list(queryset.values_list('login', flat=True)[offset:offset + page_size + 1])
+    return logins[:page_size], len(logins) > page_size
+
+
+def filter_period(queryset: QuerySet, date_from: datetime.datetime | None,
+                  date_to: datetime.datetime | None) -> QuerySet:
+    """
+    Ограничивает запрос к `Log` периодом [date_from, date_to).
+
+    Аргументы:
+        queryset (QuerySet): Запрос к `Log`.
+        date_from (datetime | None): Начало периода, включительно.
+        date_to (datetime | None): Конец периода, не включительно.
+
+    Возвращает:
+        QuerySet: Запрос с условиями на `datetime`.
+    """
+    if date_from is not None:
+        queryset = queryset.filter(datetime__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(datetime__lt=date_to)
+    return queryset
+
+
+def comments_queryset(user_id: int, filters: DatasetFilters = NO_FILTERS, alias: str | None = None) -> QuerySet:
+    """
+    Формирует запрос, агрегирующий комментарии пользователя по постам.
+
+    Строки упорядочены по id поста. При пагинации они начинаются после `filters.after`
+    и ограничиваются `filters.limit + 1` строками, чтобы определить наличие следующей страницы.
+    Если период не задан и в базе установлены счётчики комментариев (см. `counters`), строки
+    читаются из них, и стоимость запроса зависит от количества постов, а не комментариев.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+        alias (str, optional): База данных с логами; по умолчанию шард пользователя или его реплика.
+
+    Возвращает:
+        QuerySet: Строки вида {'space_id': ..., 'comments_count': ...}.
+
+    Исключения:
+        InvalidDatasetParams: Если курсор не содержит id поста.
+    """
+    alias = alias or read_db(shard_map.shard_for(user_id))
+    if filters.after is not None and not isinstance(filters.after, int):
+        raise InvalidDatasetParams("Invalid cursor")
+
+    if filters.date_from is None and filters.date_to is None and counters_available(alias):
+        queryset = CommentCounter.objects.using(alias).filter(user_id=user_id)
+        if filters.after is not None:
+            queryset = queryset.filter(post_id__gt=filters.after)
+        queryset = queryset.values(space_id=F('post_id'), comments_count=F('comment_count')).order_by('post_id')
+    else:
+        queryset = Log.objects.using(alias).filter(event_type_id=dimensions.event_type_id("comment"), user_id=user_id)
+        queryset = filter_period(queryset, filters.date_from, filters.date_to)
+        if filters.after is not None:
+            queryset = queryset.filter(space_id__gt=filters.after)
+        queryset = queryset.values('space_id').annotate(comments_count=Count('id')).order_by('space_id')
+    if filters.paginated:
+        queryset = queryset[:filters.limit + 1]
+    return queryset
+
+
+def iter_comment_counts(user_id: int, filters: DatasetFilters = NO_FILTERS, chunk_size: int = 2000) -> Iterator[dict]:
+    """
+    Построчно возвращает количество комментариев пользователя по постам из его шарда и партиций периода.
+
+    Частичные агрегаты каждой базы упорядочены по id поста и сливаются с суммированием
+    (см. `merge_sorted_rows`).
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+        chunk_size (int): Количество строк, читаемых из базы данных за раз.
+
+    Возвращает:
+        Iterator: Строки вида {'space_id': ..., 'comments_count': ...}, упорядоченные по id поста;
+        при пагинации — не больше `filters.limit + 1` строк.
+
+    Исключения:
+        InvalidDatasetParams: Если курсор не содержит id поста.
+    """
+    streams = [
+        comments_queryset(user_id, filters, alias).iterator(chunk_size=chunk_size)
+        for alias in log_read_aliases(filters.date_from, filters.date_to, shard_map.shard_for(user_id))
+    ]
+    if len(streams) == 1:
+        return streams[0]
+    rows = merge_sorted_rows(streams, ('space_id',), ('comments_count',))
+    return islice(rows, filters.limit + 1) if filters.paginated else rows
+
+
+def merge_sorted_rows(streams: list[Iterable[dict]], key: tuple[str, ...], sums: tuple[str, ...]) -> Iterator[dict]:
+    """
+    Сливает потоки частичных агрегатов, упорядоченные по ключу, суммируя строки с одинаковым ключом.
+
+    Аргументы:
+        streams (list): Потоки строк, каждый упорядочен по `key`.
+        key (tuple): Колонки ключа группировки.
+        sums (tuple): Колонки, значения которых суммируются.
+
+    Возвращает:
+        Iterator: Строки, упорядоченные по `key`, по одной на каждый ключ.
+    """
+    current = None
+    for row in heapq.merge(*streams, key=itemgetter(*key)):
+        if current is not None and all(current[name] == row[name] for name in key):
+            for name in sums:
+                current[name] += row[name]
+            continue
+        if current is not None:
+            yield current
+        current = dict(row)
+    if current is not None:
+        yield current
+
+
+def batch_comments_queryset(user_ids: list[int], alias: str | None = None) -> QuerySet:
+    """
+    Формирует запрос, агрегирующий комментарии нескольких пользователей по постам.
+
+    Если в базе установлены счётчики комментариев, строки читаются из них (см. `comments_queryset`).
+
+    Аргументы:
+        user_ids (list): Идентификаторы пользователей.
+        alias (str, optional): База данных с логами; по умолчанию 'logs_db' или её реплика.
+
+    Возвращает:
+        QuerySet: Строки вида {'user_id': ..., 'space_id': ..., 'comments_count': ...}.
+    """
+    alias = alias or read_db('logs_db')
+    if counters_available(alias):
+        return (
+            CommentCounter.objects.using(alias)
+            .filter(user_id__in=user_ids)
+            .values('user_id', space_id=F('post_id'), comments_count=F('comment_count'))
+            .order_by('user_id', 'post_id')
+        )
+    return (
+        Log.objects.using(alias)
+        .filter(event_type_id=dimensions.event_type_id("comment"), user_id__in=user_ids)
+        .values('user_id', 'space_id')
+        .annotate(comments_count=Count('id'))
+        .order_by('user_id', 'space_id')
+    )
+
+
+# Счётчики датасета general, которые суммируются при слиянии частичных агрегатов.
+GENERAL_COUNTERS = ("logins", "logouts", "blog_actions")
+
+
+def general_aggregates() -> dict[str, Count]:
+    """
+    Возвращает агрегаты датасета general: количество входов, выходов и действий в блоге.
+
+    Возвращает:
+        dict: Выражения `Count` для аннотации запроса к `Log`.
+    """
+    return {
+        "logins": Count('id', filter=Q(event_type_id=dimensions.event_type_id("login"))),
+        "logouts": Count('id', filter=Q(event_type_id=dimensions.event_type_id("logout"))),
+        "blog_actions": Count('id', filter=Q(space_type_id=dimensions.space_type_id("blog"))),
+    }
+
+
+def log_bounds(queryset: QuerySet, zone: datetime.tzinfo) -> tuple[datetime.datetime, datetime.datetime] | None:
+    """
+    Возвращает самое раннее и самое позднее время логов запроса для группировки в часовом поясе `zone`.
+
+    Для UTC границы не нужны (см. `buckets.local_datetime`), и запрос не выполняется.
+
+    Аргументы:
+        queryset (QuerySet): Запрос к `Log` с условиями на пользователя и период.
+        zone (tzinfo): Часовой пояс интервалов.
+
+    Возвращает:
+        tuple | None: Границы времени логов или None.
+    """
+    if is_utc(zone):
+        return None
+    bounds = queryset.aggregate(low=Min('datetime'), high=Max('datetime'))
+    return (bounds['low'], bounds['high']) if bounds['low'] is not None else None
+
+
+def general_queryset(user_id: int, date_from: datetime.datetime | None = None,
+                     date_to: datetime.datetime | None = None, granularity: str = 'day',
+                     zone: datetime.tzinfo | None = None, alias: str | None = None) -> QuerySet:
+    """
+    Формирует запрос к шарду пользователя, агрегирующий входы, выходы и действия в блоге по интервалам.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        date_from (datetime, optional): Начало периода, включительно.
+        date_to (datetime, optional): Конец периода, не включительно.
+        granularity (str): Интервал группировки: 'hour', 'day', 'week' или 'month'.
+        zone (tzinfo, optional): Часовой пояс интервалов; по умолчанию текущий.
+        alias (str, optional): База данных с логами; по умолчанию шард пользователя или его реплика.
+
+    Возвращает:
+        QuerySet: Строки вида {'date': ..., 'logins': ..., 'logouts': ..., 'blog_actions': ...};
+        для 'hour' дата — начало часа в UTC текстом 'YYYY-MM-DD HH:MM:SS' (см. `buckets.parse_bucket`).
+    """
+    zone = zone or timezone.get_current_timezone()
+    logs = filter_period(Log.objects.using(alias or read_db(shard_map.shard_for(user_id))), date_from, date_to)
+    logs = logs.filter(user_id=user_id)
+    return (
+        logs.annotate(date=bucket_expression(granularity, zone, log_bounds(logs, zone)))
+        .values('date')
+        .annotate(**general_aggregates())
+    )
+
+
+def batch_general_queryset(user_ids: list[int], alias: str | None = None) -> QuerySet:
+    """
+    Формирует запрос, агрегирующий входы, выходы и действия в блоге нескольких пользователей по датам.
+
+    Аргументы:
+        user_ids (list): Идентификаторы пользователей.
+        alias (str, optional): База данных с логами; по умолчанию 'logs_db' или её реплика.
+
+    Возвращает:
+        QuerySet: Строки вида {'user_id': ..., 'date': ..., 'logins': ..., 'logouts': ..., 'blog_actions': ...}.
+    """
+    zone = timezone.get_current_timezone()
+    logs = Log.objects.using(alias or read_db('logs_db')).filter(user_id__in=user_ids)
+    return (
+        logs.annotate(date=bucket_expression('day', zone, log_bounds(logs, zone)))
+        .values('user_id', 'date')
+        .annotate(**general_aggregates())
+        .order_by('user_id', 'date')
+    )
+
+
+def use_rollups(alias: str = 'logs_db') -> bool:
+    """
+    Проверяет, можно ли читать датасет general из дневной сводки.
+
+    Сводка хранится в UTC, поэтому при другом текущем часовом поясе, как и при отсутствии
+    таблиц сводки, агрегируются все логи пользователя.
+
+    Аргументы:
+        alias (str): Псевдоним базы данных (или реплики) с таблицей 'logs'.
+
+    Возвращает:
+        bool: True, если сводка построена и текущий часовой пояс — UTC.
+    """
+    return timezone.get_current_timezone_name() == 'UTC' and rollups_available(alias)
+
+
+def rollups_cover(shard: str, alias: str, date_from: datetime.datetime | None = None,
+                  date_to: datetime.datetime | None = None) -> bool:
+    """
+    Проверяет, можно ли читать датасет general за период из дневной сводки шарда.
+
+    Агрегаты партиций добавляются только в сводку 'logs_db' (см. `rollups.rebuild_rollups`),
+    поэтому сводка другого шарда подходит, только если период не пересекается с партициями.
+
+    Аргументы:
+        shard (str): Шард пользователей.
+        alias (str): Шард или его реплика, из которой выполняется чтение.
+        date_from (datetime | None): Начало периода, включительно.
+        date_to (datetime | None): Конец периода, не включительно.
+
+    Возвращает:
+        bool: True, если сводку можно использовать.
+    """
+    return use_rollups(alias) and (shard == 'logs_db' or not partitions_for_period(date_from, date_to))
+
+
+def general_period(filters: DatasetFilters) -> tuple[datetime.datetime | None, datetime.datetime | None]:
+    """
+    Возвращает период датасета general с учётом курсора.
+
+    Курсор содержит начало последнего интервала предыдущей страницы, поэтому следующая страница
+    начинается с начала следующего интервала — условие ложится на `datetime` и не требует фильтрации
+    по агрегату.
+
+    Аргументы:
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        tuple: Начало (включительно) и конец (не включительно) периода.
+
+    Исключения:
+        InvalidDatasetParams: Если курсор не содержит дату или время начала интервала.
+    """
+    date_from = filters.date_from
+    if filters.after is not None:
+        try:
+            after = parse_bucket(filters.after, filters.granularity, filters.zone)
+        except (TypeError, ValueError) as error:
+            raise InvalidDatasetParams("Invalid cursor") from error
+        next_start = next_bucket_start(after, filters.granularity, filters.zone)
+        date_from = max(date_from, next_start) if date_from else next_start
+    return date_from, filters.date_to
+
+
+def utc_midnight_date(moment: datetime.datetime | None) -> datetime.date | None:
+    """
+    Возвращает дату, если момент приходится ровно на полночь UTC, иначе вызывает ValueError.
+
+    Аргументы:
+        moment (datetime | None): Граница периода.
+
+    Возвращает:
+        date | None: Дата границы в UTC.
+    """
+    if moment is None:
+        return None
+    moment = moment.astimezone(datetime.UTC)
+    if moment.time() != datetime.time.min:
+        raise ValueError("Period bound is not aligned to a UTC day")
+    return moment.date()
+
+
+def iter_general_rows(user_id: int, chunk_size: int = 2000, filters: DatasetFilters = NO_FILTERS) -> Iterator[dict]:
+    """
+    Построчно возвращает агрегаты датасета general, используя дневную сводку, если она построена.
+
+    Из `daily_activity` берутся уже посчитанные дни, а логи после отметки сводки агрегируются
+    и добавляются к ним (см. `rollups.iter_general_rows`). Сводку можно использовать, только если
+    группировка дневная в UTC, границы периода совпадают с границами суток UTC, а партиции периода учтены в сводке шарда
+    (см. `rollups_cover`); иначе агрегируются логи шарда пользователя и партиций периода,
+    а частичные агрегаты сливаются по дате.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        chunk_size (int): Количество строк, читаемых из базы данных за раз.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        Iterator: Строки вида {'date': ..., 'logins': ..., 'logouts': ..., 'blog_actions': ...}, упорядоченные по дате;
+        для часовых интервалов дата — время начала часа. При пагинации — не больше `filters.limit + 1` строк.
+    """
+    date_from, date_to = general_period(filters)
+    granularity, zone = filters.granularity, filters.zone
+    shard = shard_map.shard_for(user_id)
+    alias = read_db(shard)
+    rows = None
+    if granularity == 'day' and is_utc(zone) and rollups_cover(shard, alias, date_from, date_to):
+        try:
+            day_from, day_to = utc_midnight_date(date_from), utc_midnight_date(date_to)
+        except ValueError:
+            pass
+        else:
+            rows = (
+                row for _, row in
+                rollups.iter_general_rows([user_id], alias, chunk_size, date_from=day_from, date_to=day_to)
+            )
+    if rows is None:
+        streams = [
+            general_queryset(user_id, date_from, date_to, granularity, zone, db)
+            .order_by('date').iterator(chunk_size=chunk_size)
+            for db in [alias, *partitions_for_period(date_from, date_to)]
+        ]
+        rows = streams[0] if len(streams) == 1 else merge_sorted_rows(streams, ('date',), GENERAL_COUNTERS)
+        if granularity == 'hour':
+            rows = ({**row, 'date': parse_bucket(row['date'], granularity, zone)} for row in rows)
+    if filters.paginated:
+        rows = islice(rows, filters.limit + 1)
+    return rows
+
+
+def general_rows(user_id: int, filters: DatasetFilters = NO_FILTERS) -> list[dict]:
+    """
+    Возвращает агрегаты датасета general списком (см. `iter_general_rows`).
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        list: Строки агрегатов, упорядоченные по дате.
+    """
+    return list(iter_general_rows(user_id, filters=filters))
+
+
+def user_log_version(user_id: int) -> tuple[int, int, int]:
+    """
+    Возвращает версию логов пользователя для кэша датасетов и условных запросов (ETag).
+
+    Версия — наибольший id и количество логов пользователя в его шарде и партициях, а также сумма
+    счётчиков изменений его логов в базах, где установлены версии логов (см. `log_versions`).
+    Запрос на каждую базу читает только индекс логов пользователя и строку версии и не агрегирует
+    датасет, поэтому проверка актуальности намного дешевле построения ответа. Новые и удалённые логи
+    меняют версию всегда; изменения строк на месте — в базах с установленными версиями логов.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        tuple: Наибольший id лога, количество логов и количество изменений логов.
+    """
+    last_id, total, changes = 0, 0, 0
+    for alias in log_read_aliases(primary=shard_map.shard_for(user_id)):
+        row = Log.objects.using(alias).filter(user_id=user_id).aggregate(last_id=Max('id'), total=Count('id'))
+        last_id = max(last_id, row['last_id'] or 0)
+        total += row['total']
+        if log_versions_available(alias):
+            changes += get_log_version(user_id, alias)
+    return last_id, total, changes
+
+
+def comments_dataset_version(user_id: int) -> tuple:
+    """
+    Возвращает версию датасета comments пользователя: версию его логов и поколение метаданных постов.
+
+    Датасет comments содержит заголовки постов и логины их авторов, поэтому устаревает не только
+    при изменении логов пользователя, но и при изменении постов и авторов (см. `posts.post_cache`).
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        tuple: Версия логов (см. `user_log_version`) и поколение `post_cache`.
+    """
+    return user_log_version(user_id), post_cache.generation
+
+
+@traced('services.post_metadata')
+def post_metadata(post_ids: Iterable[int]) -> dict[int, dict[str, str]]:
+    """
+    Возвращает заголовки постов и логины их авторов из кэша метаданных постов (см. `posts.post_cache`).
+
+    Аргументы:
+        post_ids (Iterable): Идентификаторы постов.
+
+    Возвращает:
+        dict: id поста → {'header': ..., 'author_login': ...}; для несуществующего поста или автора — "Unknown".
+    """
+    return post_cache.get_many(post_ids)
+
+
+def comment_row(login: str, log: dict, post: dict[str, str]) -> dict:
+    """Формирует строку датасета comments из агрегата комментариев и метаданных поста."""
+    return {
+        "login": login,
+        "header": post.get("header", "Unknown"),
+        "author_login": post.get("author_login", "Unknown"),
+        "comments_count": log["comments_count"],
+    }
+
+
+def comment_rows(login: str, logs: list[dict], posts: dict[int, dict[str, str]] | None = None) -> list[dict]:
+    """
+    Дополняет агрегаты комментариев заголовком поста и логином его автора.
+
+    Аргументы:
+        login (str): Логин пользователя.
+        logs (list): Строки вида {'space_id': ..., 'comments_count': ...}.
+        posts (dict, optional): Уже загруженные метаданные постов (см. `post_metadata`).
+
+    Возвращает:
+        list: Строки датасета comments.
+    """
+    if posts is None:
+        posts = post_metadata(log['space_id'] for log in logs)
+    return [comment_row(login, log, posts.get(log['space_id'], {})) for log in logs]
+
+
+def iter_comment_rows(login: str, user_id: int, chunk_size: int = 2000) -> Iterator[dict]:
+    """
+    Построчно возвращает датасет comments, читая агрегаты и посты пачками.
+
+    Память не зависит от количества постов: на каждую пачку агрегатов метаданные постов
+    берутся из кэша, а отсутствующие запрашиваются по одному запросу к постам и авторам.
+
+    Аргументы:
+        login (str): Логин пользователя.
+        user_id (int): Идентификатор пользователя.
+        chunk_size (int): Количество строк агрегатов в пачке.
+
+    Возвращает:
+        Iterator: Строки датасета comments, упорядоченные по id поста.
+    """
+    logs = iter_comment_counts(user_id, chunk_size=chunk_size)
+    for chunk in chunked(logs, chunk_size):
+        yield from comment_rows(login, chunk)
+
+
+def serialize_general(rows: Iterable[dict], granularity: str = 'day', zone: datetime.tzinfo | None = None) -> list[dict]:
+    """
+    Сериализует агрегаты датасета general в формат ответа `/api/general`.
+
+    Аргументы:
+        rows (Iterable): Строки вида {'date': ..., 'logins': ..., 'logouts': ..., 'blog_actions': ...}.
+        granularity (str): Интервал группировки; для 'hour' дата выводится как время в часовом поясе `zone`.
+        zone (tzinfo, optional): Часовой пояс интервалов.
+
+    Возвращает:
+        list: Сериализованные строки датасета.
+    """
+    data = [
+        {
+            "date": log['date'],
+            "logins": log['logins'],
+            "logouts": log['logouts'],
+            "blog_actions_count": log['blog_actions']
+        }
+        for log in rows
+    ]
+    if granularity == 'hour':
+        with timezone.override(zone):
+            return HourlyActivitySerializer(data, many=True).data
+    return UserActivitySerializer(data, many=True).data
+
+
+@traced('services.build_comments_dataset')
+def build_comments_dataset(login: str, user_id: int, filters: DatasetFilters = NO_FILTERS) -> list[dict] | dict:
+    """
+    Вычисляет датасет comments для пользователя.
+
+    Аргументы:
+        login (str): Логин пользователя.
+        user_id (int): Идентификатор пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        list | dict: Сериализованные строки датасета в том же виде, в котором их отдаёт `/api/comments`;
+        при пагинации — {'results': строки страницы, 'next': id последнего поста или None}.
+    """
+    logs = list(iter_comment_counts(user_id, filters))
+    return comments_page(login, logs, filters)
+
+
+def comments_page(login: str, logs: list[dict], filters: DatasetFilters,
+                  posts: dict[int, dict[str, str]] | None = None) -> list[dict] | dict:
+    """
+    Сериализует агрегаты комментариев в датасет comments или его страницу.
+
+    Аргументы:
+        login (str): Логин пользователя.
+        logs (list): Строки `iter_comment_counts`; при пагинации — не более `filters.limit + 1`.
+        filters (DatasetFilters): Период и параметры пагинации.
+        posts (dict, optional): Уже загруженные метаданные постов (см. `post_metadata`).
+
+    Возвращает:
+        list | dict: Датасет (см. `build_comments_dataset`).
+    """
+    if not filters.paginated:
+        return CommentsSerializer(comment_rows(login, logs, posts), many=True).data
+
+    page = logs[:filters.limit]
+    return {
+        "results": CommentsSerializer(comment_rows(login, page, posts), many=True).data,
+        "next": page[-1]['space_id'] if len(logs) > filters.limit else None,
+    }
+
+
+@traced('services.build_general_dataset')
+def build_general_dataset(user_id: int, filters: DatasetFilters = NO_FILTERS) -> list[dict] | dict:
+    """
+    Вычисляет датасет general для пользователя.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        list | dict: Сериализованные строки датасета в том же виде, в котором их отдаёт `/api/general`;
+        при пагинации — {'results': строки страницы, 'next': последняя дата страницы или None}.
+    """
+    rows = general_rows(user_id, filters)
+    if not filters.paginated:
+        return serialize_general(rows, filters.granularity, filters.zone)
+
+    page = rows[:filters.limit]
+    return {
+        "results": serialize_general(page, filters.granularity, filters.zone),
+        "next": page[-1]['date'].isoformat() if len(rows) > filters.limit else None,
+    }
+
+
+@traced('services.build_batch_datasets')
+def build_batch_datasets(logins: Iterable[str], datasets: Iterable[str]) -> tuple[dict[str, dict], list[str]]:
+    """
+    Вычисляет датасеты comments и/или general сразу для многих пользователей.
+
+    Пользователи разрешаются одним запросом на пачку логинов, а агрегаты считаются сгруппированными
+    запросами по пачкам пользователей, поэтому стоимость определяется количеством прочитанных строк,
+    а не количеством пользователей. Пачки формируются внутри шардов и выполняются параллельно
+    (см. `batch_shard_rows` и `scatter`).
+
+    Аргументы:
+        logins (Iterable): Логины пользователей.
+        datasets (Iterable): Названия датасетов: "comments", "general".
+
+    Возвращает:
+        tuple: Словарь логин → {датасет: строки} и список несуществующих логинов.
+    """
+    logins = list(dict.fromkeys(logins))
+    datasets = list(datasets)
+    user_ids = resolve_user_ids(logins)
+    logins_by_id = {user_id: login for login, user_id in user_ids.items()}
+    rows = {login: {dataset: [] for dataset in datasets} for login in user_ids}
+
+    tasks = [
+        (shard, chunk)
+        for shard, shard_user_ids in shard_map.group_by_shard(sorted(logins_by_id)).items()
+        for chunk in chunked(shard_user_ids, IN_CHUNK_SIZE)
+    ]
+    for logs, general in scatter(lambda task: batch_shard_rows(*task, datasets), tasks):
+        if "comments" in datasets:
+            posts = post_metadata(log['space_id'] for log in logs)
+            for log in logs:
+                login = logins_by_id[log['user_id']]
+                rows[login]["comments"].extend(comment_rows(login, [log], posts))
+
+        for user_id, row in general:
+            rows[logins_by_id[user_id]]["general"].append(row)
+
+    results = {}
+    for login in logins:
+        if login not in rows:
+            continue
+        results[login] = {}
+        if "comments" in datasets:
+            results[login]["comments"] = CommentsSerializer(rows[login]["comments"], many=True).data
+        if "general" in datasets:
+            results[login]["general"] = serialize_general(rows[login]["general"])
+
+    missing = [login for login in logins if login not in user_ids]
+    return results, missing
+
+
+def batch_shard_rows(shard: str, user_ids: list[int], datasets: list[str]) -> tuple[list[dict], list[tuple[int, dict]]]:
+    """
+    Считает агрегаты пачки пользователей одного шарда для `build_batch_datasets`.
+
+    Читаются шард (или его реплика) и партиции логов; частичные агрегаты сливаются по пользователю.
+
+    Аргументы:
+        shard (str): Шард пользователей пачки.
+        user_ids (list): Идентификаторы пользователей.
+        datasets (list): Названия датасетов: "comments", "general".
+
+    Возвращает:
+        tuple: Строки `batch_comments_queryset` и пары (id пользователя, строка general).
+    """
+    alias = read_db(shard)
+    aliases = [alias, *partitions_for_period()]
+    logs, general = [], []
+    if "comments" in datasets:
+        logs = list(merge_sorted_rows(
+            [batch_comments_queryset(user_ids, db) for db in aliases], ('user_id', 'space_id'), ('comments_count',)
+        ))
+    if "general" in datasets:
+        if rollups_cover(shard, alias):
+            general = list(rollups.iter_general_rows(user_ids, alias))
+        else:
+            streams = [batch_general_queryset(user_ids, db) for db in aliases]
+            general = [(row['user_id'], row) for row in merge_sorted_rows(streams, ('user_id', 'date'), GENERAL_COUNTERS)]
+    return logs, general
+
+
+@traced('services.get_comments_dataset')
+def get_comments_dataset(login: str, filters: DatasetFilters = NO_FILTERS) -> list[dict] | dict:
+    """
+    Возвращает датасет comments для пользователя без обращения к HTTP API.
+
+    Результат берётся из `dataset_cache`, если для пользователя и фильтров есть запись
+    с текущей версией логов пользователя и метаданных постов (см. `comments_dataset_version`).
+
+    Аргументы:
+        login (str): Логин пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        list | dict: Датасет (см. `build_comments_dataset`).
+
+    Исключения:
+        ObjectDoesNotExist: Если пользователь или тип события не найдены.
+        InvalidDatasetParams: Если курсор не подходит к датасету.
+    """
+    return dataset_cache.get_or_build(
+        'comments', login, filters.as_params(), get_user_id,
+        lambda user_id: build_comments_dataset(login, user_id, filters), comments_dataset_version,
+    )
+
+
+@traced('services.get_general_dataset')
+def get_general_dataset(login: str, filters: DatasetFilters = NO_FILTERS) -> list[dict] | dict:
+    """
+    Возвращает датасет general для пользователя без обращения к HTTP API.
+
+    Результат берётся из `dataset_cache`, если для пользователя и фильтров есть запись
+    с текущей версией логов пользователя (см. `user_log_version`).
+
+    Аргументы:
+        login (str): Логин пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        list | dict: Датасет (см. `build_general_dataset`).
+
+    Исключения:
+        ObjectDoesNotExist: Если пользователь, тип события или тип пространства не найдены.
+        InvalidDatasetParams: Если курсор не подходит к датасету.
+    """
+    return dataset_cache.get_or_build(
+        'general', login, filters.as_params(), get_user_id,
+        lambda user_id: build_general_dataset(user_id, filters), user_log_version,
+    )
+
+
+# Асинхронные варианты для ASGI. Запросы к SQLite выполняются в отдельном пуле потоков
+# (thread_sensitive=False), поэтому независимые запросы к 'logs_db' и 'blogs_db'
+# разных датасетов и пачек постов выполняются одновременно на отдельных соединениях.
+# Размер пула задаёт настройка ASYNC_DB_WORKERS: пул по умолчанию у цикла событий
+# на машине с одним ядром ограничен пятью потоками.
+DB_EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_DB_WORKERS', 32), thread_name_prefix='async-db'
+)
+
+
+def in_pooled_thread(func: Callable, *args):
+    """
+    Выполняет функцию в потоке пула, закрывая устаревшие и сломанные соединения потока до и после неё.
+
+    Потоки пулов `DB_EXECUTOR` и `SCATTER_EXECUTOR` не обрабатывают сигналы начала и конца запроса,
+    на которые Django закрывает соединения старше `CONN_MAX_AGE`, поэтому без этого соединения
+    потоков жили бы вместе с потоками, в том числе после ошибок.
+
+    Аргументы:
+        func (Callable): Синхронная функция, обращающаяся к базе данных.
+        *args: Аргументы функции.
+
+    Возвращает:
+        Any: Результат функции.
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def run_in_thread(func, *args):
+    """
+    Выполняет синхронную функцию в пуле потоков `DB_EXECUTOR`, не блокируя цикл событий.
+
+    Аргументы:
+        func (Callable): Синхронная функция, обращающаяся к базе данных.
+        *args: Аргументы функции.
+
+    Возвращает:
+        Awaitable: Результат функции.
+    """
+    return sync_to_async(in_pooled_thread, thread_sensitive=False, executor=DB_EXECUTOR)(func, *args)
+
+
+SCATTER_EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SHARD_SCATTER_WORKERS', 8), thread_name_prefix='shard-scatter'
+)
+
+
+def scatter(func: Callable, items: list) -> list:
+    """
+    Выполняет функцию для каждого элемента параллельно в пуле потоков `SCATTER_EXECUTOR`.
+
+    Используется для запросов к нескольким шардам. Единственный элемент обрабатывается
+    в текущем потоке. Потоки получают копию контекста, поэтому выбор реплик запроса
+    (см. `db_routers.routing_context`) сохраняется.
+
+    Аргументы:
+        func (Callable): Синхронная функция, обращающаяся к базе данных.
+        items (list): Аргументы функции.
+
+    Возвращает:
+        list: Результаты в порядке элементов.
+    """
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    futures = [
+        SCATTER_EXECUTOR.submit(contextvars.copy_context().run, in_pooled_thread, func, item) for item in items
+    ]
+    return [future.result() for future in futures]
+
+
+async def apost_metadata(post_ids: Iterable[int]) -> dict[int, dict[str, str]]:
+    """
+    Асинхронный вариант `post_metadata`: пачки постов запрашиваются из 'blogs_db' параллельно.
+
+    Аргументы:
+        post_ids (Iterable): Идентификаторы постов.
+
+    Возвращает:
+        dict: id поста → {'header': ..., 'author_login': ...}.
+    """
+    chunks = chunked(set(post_ids), IN_CHUNK_SIZE)
+    parts = await asyncio.gather(*(run_in_thread(post_metadata, chunk) for chunk in chunks))
+    return {post_id: post for part in parts for post_id, post in part.items()}
+
+
+async def abuild_comments_dataset(login: str, user_id: int, filters: DatasetFilters = NO_FILTERS) -> list[dict] | dict:
+    """
+    Асинхронный вариант `build_comments_dataset`.
+
+    Аргументы:
+        login (str): Логин пользователя.
+        user_id (int): Идентификатор пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        list | dict: Датасет (см. `build_comments_dataset`).
+    """
+    logs = await run_in_thread(lambda: list(iter_comment_counts(user_id, filters)))
+    page = logs[:filters.limit] if filters.paginated else logs
+    posts = await apost_metadata(log['space_id'] for log in page)
+    return comments_page(login, logs, filters, posts)
+
+
+async def aget_comments_dataset(login: str, filters: DatasetFilters = NO_FILTERS) -> list[dict] | dict:
+    """
+    Асинхронный вариант `get_comments_dataset`.
+
+    Аргументы:
+        login (str): Логин пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        list | dict: Датасет (см. `build_comments_dataset`).
+
+    Исключения:
+        ObjectDoesNotExist: Если пользователь или тип события не найдены.
+        InvalidDatasetParams: Если курсор не подходит к датасету.
+    """
+    return await dataset_cache.aget_or_build(
+        'comments', login, filters.as_params(),
+        lambda login: run_in_thread(get_user_id, login),
+        lambda user_id: abuild_comments_dataset(login, user_id, filters),
+        lambda user_id: run_in_thread(comments_dataset_version, user_id),
+    )
+
+
+async def aget_general_dataset(login: str, filters: DatasetFilters = NO_FILTERS) -> list[dict] | dict:
+    """
+    Асинхронный вариант `get_general_dataset`.
+
+    Аргументы:
+        login (str): Логин пользователя.
+        filters (DatasetFilters): Период и параметры пагинации.
+
+    Возвращает:
+        list | dict: Датасет (см. `build_general_dataset`).
+
+    Исключения:
+        ObjectDoesNotExist: Если пользователь, тип события или тип пространства не найдены.
+        InvalidDatasetParams: Если курсор не подходит к датасету.
+    """
+    return await dataset_cache.aget_or_build(
+        'general', login, filters.as_params(),
+        lambda login: run_in_thread(get_user_id, login),
+        lambda user_id: run_in_thread(build_general_dataset, user_id, filters),
+        lambda user_id: run_in_thread(user_log_version, user_id),
+    )
@@ -0,0 +1,323 @@
+import dataclasses
+import threading
+import time
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .indexes import INDEXES, create_indexes
+from .models import LogShardOverride
+from .rollups import rebuild_user_rollups, rollups_available
+
+# Каждый шард выдаёт id логов из своего диапазона [индекс * ID_BLOCK, (индекс + 1) * ID_BLOCK),
+# поэтому id уникальны между шардами, и строки переносятся между шардами и в партиции без перенумерации.
+ID_BLOCK = 2 ** 40
+
+# Справочники, которые копируются из 'logs_db' в каждый шард (на них ссылаются внешние ключи логов).
+DIMENSION_TABLES = ('event_type', 'space_type')
+
+LOG_COLUMNS = '"id", "datetime", "user_id", "space_type_id", "event_type_id", "space_id"'
+
+
+def get_shards() -> list[str]:
+    """
+    Возвращает псевдонимы баз данных шардов логов из настройки `LOG_SHARDS`.
+
+    Возвращает:
+        list: Шарды в порядке настройки; по умолчанию единственный шард 'logs_db'.
+    """
+    return list(getattr(settings, 'LOG_SHARDS', ['logs_db']))
+
+
+def hash_shard(user_id: int, shards: list[str] | None = None) -> str:
+    """
+    Возвращает шард пользователя по умолчанию — по остатку от деления `user_id` на количество шардов.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        shards (list, optional): Шарды; по умолчанию из настройки `LOG_SHARDS`.
+
+    Возвращает:
+        str: Псевдоним базы данных шарда.
+    """
+    shards = shards or get_shards()
+    return shards[user_id % len(shards)]
+
+
+class ShardMap:
+    """
+    Карта шардов логов процесса: шард по `user_id` и явные назначения из `LogShardOverride`.
+
+    Назначения загружаются из базы 'default' целиком и перечитываются не реже чем раз в `ttl` секунд,
+    поэтому перенос пользователя командой `reshard_logs` становится виден всем процессам
+    не позже чем через `ttl`. В текущем процессе изменения назначений сбрасывают карту сразу
+    (см. `UserActions.signals`). При единственном шарде таблица назначений не читается.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._overrides: dict[int, str] | None = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'ShardMap':
+        """Создаёт карту по настройке `SHARD_MAP_TTL`."""
+        return cls(ttl=getattr(settings, 'SHARD_MAP_TTL', 5))
+
+    def overrides(self) -> dict[int, str]:
+        """
+        Возвращает явные назначения шардов, перечитывая их после истечения `ttl`.
+
+        Возвращает:
+            dict: Идентификатор пользователя → псевдоним шарда.
+        """
+        with self._lock:
+            if self._overrides is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._overrides = dict(
+                    LogShardOverride.objects.using('default').values_list('user_id', 'shard')
+                )
+                self._loaded_at = time.monotonic()
+            return self._overrides
+
+    def invalidate(self) -> None:
+        """Сбрасывает загруженные назначения; они будут перечитаны при следующем обращении."""
+        with self._lock:
+            self._overrides = None
+
+    def shard_for(self, user_id: int) -> str:
+        """
+        Возвращает шард, в котором хранятся логи пользователя.
+
+        Аргументы:
+            user_id (int): Идентификатор пользователя.
+
+        Возвращает:
+            str: Псевдоним базы данных шарда.
+        """
+        shards = get_shards()
+        if len(shards) == 1:
+            return shards[0]
+        shard = self.overrides().get(user_id)
+        return shard if shard in shards else hash_shard(user_id, shards)
+
+    def group_by_shard(self, user_ids: Iterable[int]) -> dict[str, list[int]]:
+        """
+        Группирует пользователей по шардам.
+
+        Аргументы:
+            user_ids (Iterable): Идентификаторы пользователей.
+
+        Возвращает:
+            dict: Псевдоним шарда → идентификаторы его пользователей (в исходном порядке).
+        """
+        groups: dict[str, list[int]] = {}
+        for user_id in user_ids:
+            groups.setdefault(self.shard_for(user_id), []).append(user_id)
+        return groups
+
+
+shard_map = ShardMap.from_settings()
+
+
+def prepare_shard(alias: str) -> None:
+    """
+    Готовит базу данных шарда: таблицы логов и справочников, индексы и диапазон id логов.
+
+    Схема таблиц и строки справочников копируются из 'logs_db'; повторный вызов обновляет справочники.
+    Счётчик AUTOINCREMENT таблицы логов сдвигается к началу диапазона шарда (см. `ID_BLOCK`).
+
+    Аргументы:
+        alias (str): Псевдоним шарда из настройки `LOG_SHARDS`.
+    """
+    index = get_shards().index(alias)
+    with connections['logs_db'].cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN (%s, %s, %s)",
+            ['logs', *DIMENSION_TABLES],
+        )
+        schema = dict(cursor.fetchall())
+        dimension_rows = {}
+        for table in DIMENSION_TABLES:
+            cursor.execute(f'SELECT "id", "name" FROM "{table}"')
+            dimension_rows[table] = cursor.fetchall()
+
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        for table in (*DIMENSION_TABLES, 'logs'):
+            cursor.execute(schema[table].replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+        for table in DIMENSION_TABLES:
+            cursor.executemany(
+                f'INSERT INTO "{table}" ("id", "name") VALUES (%s, %s) '
+                f'ON CONFLICT ("id") DO UPDATE SET "name" = excluded."name"',
+                dimension_rows[table],
+            )
+        cursor.execute('SELECT "seq" FROM "sqlite_sequence" WHERE "name" = %s', ['logs'])
+        row = cursor.fetchone()
+        start = index * ID_BLOCK
+        if row is None:
+            cursor.execute('INSERT INTO "sqlite_sequence" ("name", "seq") VALUES (%s, %s)', ['logs', start])
+        elif row[0] < start:
+            cursor.execute('UPDATE "sqlite_sequence" SET "seq" = %s WHERE "name" = %s', [start, 'logs'])
+    create_indexes(tuple(
+        dataclasses.replace(spec, alias=alias)
+        for spec in INDEXES if spec.alias == 'logs_db' and spec.table == 'logs'
+    ))
+
+
+def shard_user_ids(alias: str) -> list[int]:
+    """Возвращает идентификаторы пользователей, логи которых есть в шарде."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT DISTINCT "user_id" FROM "logs" ORDER BY "user_id"')
+        return [row[0] for row in cursor.fetchall()]
+
+
+def set_override(user_id: int, shard: str) -> None:
+    """
+    Закрепляет пользователя за шардом; назначение, совпадающее с шардом по умолчанию, удаляется.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        shard (str): Псевдоним шарда.
+    """
+    if shard == hash_shard(user_id):
+        LogShardOverride.objects.using('default').filter(user_id=user_id).delete()
+    else:
+        LogShardOverride.objects.using('default').update_or_create(user_id=user_id, defaults={'shard': shard})
+    shard_map.invalidate()
+
+
+def pin_users() -> int:
+    """
+    Закрепляет каждого пользователя за шардом, в котором сейчас лежат его логи.
+
+    Выполняется перед изменением `LOG_SHARDS`: после изменения шард по умолчанию у части
+    пользователей меняется, а назначения сохраняют чтение и запись в прежних шардах
+    до переноса командой `reshard_logs rebalance`.
+
+    Возвращает:
+        int: Количество закреплённых пользователей.
+    """
+    pinned = 0
+    for alias in get_shards():
+        for user_id in shard_user_ids(alias):
+            LogShardOverride.objects.using('default').update_or_create(user_id=user_id, defaults={'shard': alias})
+            pinned += 1
+    shard_map.invalidate()
+    return pinned
+
+
+def copy_user_logs(source: str, user_id: int, after_id: int = 0, batch_size: int | None = None,
+                   delete: bool = False) -> tuple[int, int]:
+    """
+    Копирует логи пользователя с id больше `after_id` из шарда `source` в подключённый шард "target".
+
+    Выполняется одной транзакцией на соединении `source`, к которому через ATTACH подключён целевой шард.
+
+    Аргументы:
+        source (str): Псевдоним исходного шарда.
+        user_id (int): Идентификатор пользователя.
+        after_id (int): Копировать логи с id больше этого значения.
+        batch_size (int, optional): Наибольшее количество логов за вызов.
+        delete (bool): Удалить все логи пользователя из исходного шарда после копирования.
+
+    Возвращает:
+        tuple: Количество скопированных логов и наибольший скопированный id.
+    """
+    limit = f'LIMIT {int(batch_size)}' if batch_size else ''
+    with transaction.atomic(using=source), connections[source].cursor() as cursor:
+        cursor.execute(
+            f'SELECT MAX("id"), COUNT(*) FROM (SELECT "id" FROM "main"."logs" '
+            f'WHERE "user_id" = %s AND "id" > %s ORDER BY "id" {limit})',
+            [user_id, after_id],
+        )
+        last_id, copied = cursor.fetchone()
+        if copied:
+            cursor.execute(
+                f'INSERT OR IGNORE INTO "target"."logs" ({LOG_COLUMNS}) '
+                f'SELECT {LOG_COLUMNS} FROM "main"."logs" WHERE "user_id" = %s AND "id" > %s AND "id" <= %s',
+                [user_id, after_id, last_id],
+            )
+        if delete:
+            cursor.execute('DELETE FROM "main"."logs" WHERE "user_id" = %s', [user_id])
+    return copied, last_id or after_id
+
+
+def move_user(user_id: int, target: str, batch_size: int = 5000, settle: float | None = None) -> int:
+    """
+    Переносит логи пользователя в шард `target`, не останавливая запись и чтение.
+
+    1. Логи копируются пачками; пользователь продолжает читать и писать в исходный шард.
+    2. Остаток копируется под блокировкой записи исходного шарда, и пользователь назначается `target`.
+    3. Через `settle` секунд (время жизни карты шардов в других процессах) логи, записанные
+       процессами с устаревшей картой, докопируются, и все логи пользователя удаляются из исходного шарда.
+
+    Дневные сводки обоих шардов пересчитываются для пользователя.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        target (str): Псевдоним целевого шарда из `LOG_SHARDS`.
+        batch_size (int): Количество логов в одной транзакции копирования.
+        settle (float, optional): Пауза перед удалением из исходного шарда; по умолчанию `shard_map.ttl`.
+
+    Возвращает:
+        int: Количество перенесённых логов.
+    """
+    shard_map.invalidate()
+    source = shard_map.shard_for(user_id)
+    if source == target:
+        return 0
+    prepare_shard(target)
+    connections[target].close()
+
+    connection = connections[source]
+    with connection.cursor() as cursor:
+        cursor.execute('ATTACH DATABASE %s AS "target"', [str(connections.settings[target]['NAME'])])
+        try:
+            moved, last_id = 0, 0
+            while True:
+                copied, last_id = copy_user_logs(source, user_id, last_id, batch_size)
+                moved += copied
+                if copied < batch_size:
+                    break
+            with transaction.atomic(using=source):
+                copied, last_id = copy_user_logs(source, user_id, last_id)
+                set_override(user_id, target)
+            moved += copied
+            rebuild_shard_rollups(user_id, target)
+
+            time.sleep(shard_map.ttl if settle is None else settle)
+            copied, last_id = copy_user_logs(source, user_id, last_id, delete=True)
+            moved += copied
+        finally:
+            cursor.execute('DETACH DATABASE "target"')
+    rebuild_shard_rollups(user_id, source, target)
+    return moved
+
+
+def rebuild_shard_rollups(user_id: int, *aliases: str) -> None:
+    """Пересчитывает дневную сводку пользователя в шардах, где она построена."""
+    for alias in aliases:
+        if rollups_available(alias):
+            rebuild_user_rollups(alias, user_id)
+
+
+def rebalance(limit: int | None = None, batch_size: int = 5000, settle: float | None = None) -> list[tuple[int, str, int]]:
+    """
+    Переносит закреплённых пользователей в их шарды по умолчанию и снимает назначения.
+
+    Аргументы:
+        limit (int, optional): Наибольшее количество переносимых пользователей.
+        batch_size (int): Количество логов в одной транзакции копирования.
+        settle (float, optional): Пауза перед удалением из исходного шарда (см. `move_user`).
+
+    Возвращает:
+        list: Кортежи (id пользователя, целевой шард, количество перенесённых логов).
+    """
+    shards = get_shards()
+    moves = [
+        (user_id, hash_shard(user_id, shards))
+        for user_id, shard in LogShardOverride.objects.using('default').order_by('user_id').values_list('user_id', 'shard')
+        if shard != hash_shard(user_id, shards)
+    ][:limit]
+    return [(user_id, target, move_user(user_id, target, batch_size, settle)) for user_id, target in moves]
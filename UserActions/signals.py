@@ -0,0 +1,105 @@
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blogs.models import Post, User
+from logs.models import EventType, SpaceType
+
+from .db_routers import pin_primary
+from .dimensions import dimensions
+from .metrics import install_query_timer
+from .models import LogShardOverride
+from .posts import post_cache
+from .sharding import shard_map
+from .slow_queries import install_slow_query_recorder
+from .tracing import install_span_recorder
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_login_on_user_change(sender: type[User], instance: User, **kwargs) -> None:
+    """
+    Удаляет из кэша справочников логин пользователя, в том числе прежний логин и закэшированный промах.
+
+    Аргументы:
+        sender (type[User]): Модель, отправившая сигнал.
+        instance (User): Изменённый или удалённый пользователь.
+    """
+    dimensions.invalidate_user(user_id=instance.id, login=instance.login)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_metadata_on_post_change(sender: type[Post], instance: Post, **kwargs) -> None:
+    """
+    Удаляет из кэша метаданных постов заголовок и автора изменённого или удалённого поста.
+
+    Аргументы:
+        sender (type[Post]): Модель, отправившая сигнал.
+        instance (Post): Изменённый или удалённый пост.
+    """
+    post_cache.invalidate_post(instance.id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_post_metadata_on_user_change(sender: type[User], instance: User, **kwargs) -> None:
+    """
+    Удаляет из кэша метаданных постов посты пользователя, чтобы они не отдавались с прежним логином автора.
+
+    Аргументы:
+        sender (type[User]): Модель, отправившая сигнал.
+        instance (User): Изменённый или удалённый пользователь.
+    """
+    post_cache.invalidate_author(instance.id)
+
+
+@receiver([post_save, post_delete], sender=EventType)
+@receiver([post_save, post_delete], sender=SpaceType)
+def invalidate_type_dimensions(sender: type[EventType] | type[SpaceType], **kwargs) -> None:
+    """
+    Сбрасывает справочники типов событий и пространств при их изменении.
+
+    Аргументы:
+        sender (type): Модель, отправившая сигнал.
+    """
+    dimensions.invalidate_types()
+
+
+@receiver([post_save, post_delete], sender=LogShardOverride)
+def invalidate_shard_map(sender: type[LogShardOverride], **kwargs) -> None:
+    """
+    Сбрасывает карту шардов процесса при изменении назначения шарда пользователю.
+
+    Аргументы:
+        sender (type[LogShardOverride]): Модель, отправившая сигнал.
+    """
+    shard_map.invalidate()
+
+
+@receiver([post_save, post_delete])
+def pin_reads_to_primary_after_write(sender: type, using: str, **kwargs) -> None:
+    """
+    Закрепляет чтения текущего запроса за базой, в которую записана модель (read-your-writes).
+
+    Нужен для записей с явным `.using(...)`, которые не проходят через `db_for_write` маршрутизатора.
+
+    Аргументы:
+        sender (type): Модель, отправившая сигнал.
+        using (str): Псевдоним базы данных, в которую выполнена запись.
+    """
+    pin_primary(using)
+
+
+@receiver(connection_created)
+def instrument_connection(sender: type, connection: BaseDatabaseWrapper, **kwargs) -> None:
+    """
+    Подключает к новому соединению учёт времени SQL-запросов для метрик `/metrics`
+    и, если они включены, журнал медленных запросов (`UserActions.slow_queries`)
+    и спаны SQL-запросов трассировки (`UserActions.tracing`).
+
+    Аргументы:
+        sender (type): Класс обёртки соединения.
+        connection (BaseDatabaseWrapper): Открытое соединение.
+    """
+    install_query_timer(connection)
+    install_slow_query_recorder(connection)
+    install_span_recorder(connection)
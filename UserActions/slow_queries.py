@@ -0,0 +1,305 @@
+import datetime
+import json
+import re
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from .db_routers import get_replicas
+from .indexes import INDEXES, IndexSpec
+from .metrics import current_scope
+from .partitions import is_partition
+from .sharding import get_shards
+
+# Полный просмотр таблицы в EXPLAIN QUERY PLAN: "SCAN logs" (SQLite 3.36+) или "SCAN TABLE logs";
+# просмотр по индексу ("SCAN logs USING INDEX ...") сюда не входит.
+FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?$')
+
+# Колонка таблицы в SQL, сформированном Django ("logs"."user_id"), и условие на неё: = %s, >= %s, IN (...).
+COLUMN_RE = r'"{table}"\."(\w+)"'
+CONDITION_RE = COLUMN_RE + r'\s*(=|IN\b|>=|<=|>|<|BETWEEN\b)'
+
+# Списки параметров `IN (%s, %s, ...)` разной длины сводятся к одному виду запроса.
+PARAMS_LIST_RE = re.compile(r'IN \(%s(?:\s*,\s*%s)+\)')
+
+
+class SlowQueryLog:
+    """
+    Журнал медленных SQL-запросов в формате JSON Lines.
+
+    Запрос, выполнявшийся не меньше `threshold_ms`, записывается с параметрами, временем выполнения,
+    базой данных, id и представлением HTTP-запроса и планом `EXPLAIN QUERY PLAN`. План получается
+    отдельным курсором того же соединения сразу после запроса, поэтому отражает те же индексы.
+    Сводку по журналу выводит команда `slow_queries`.
+
+    Атрибуты:
+        path (Path): Файл журнала.
+        threshold_ms (float): Порог времени выполнения в миллисекундах.
+        databases (tuple): Основные базы данных, запросы к которым записываются; запросы к их репликам,
+            а для 'logs_db' — также к партициям и шардам логов, тоже записываются.
+        explain (bool): Записывать ли план запроса.
+        enabled (bool): Включена ли запись.
+    """
+
+    def __init__(self, path: str | Path, threshold_ms: float, databases: Iterable[str] = ('blogs_db', 'logs_db'),
+                 explain: bool = True, enabled: bool = True) -> None:
+        self.path = Path(path)
+        self.threshold_ms = threshold_ms
+        self.databases = tuple(databases)
+        self.explain = explain
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'SlowQueryLog':
+        """Создаёт журнал по настройке `SLOW_QUERY_LOG`."""
+        options = getattr(settings, 'SLOW_QUERY_LOG', {})
+        return cls(
+            path=options.get('PATH', Path(settings.BASE_DIR) / 'slow_queries.jsonl'),
+            threshold_ms=options.get('THRESHOLD_MS', 100),
+            databases=options.get('DATABASES', ('blogs_db', 'logs_db')),
+            explain=options.get('EXPLAIN', True),
+            enabled=options.get('ENABLED', False),
+        )
+
+    def watches(self, alias: str) -> bool:
+        """
+        Проверяет, записываются ли медленные запросы к базе данных.
+
+        Аргументы:
+            alias (str): Псевдоним базы данных соединения.
+
+        Возвращает:
+            bool: True для баз из `databases`, их реплик, а при 'logs_db' — и для партиций и шардов логов.
+        """
+        if alias in self.databases or any(alias in get_replicas(db) for db in self.databases):
+            return True
+        return 'logs_db' in self.databases and (is_partition(alias) or alias in get_shards())
+
+    def record(self, connection: BaseDatabaseWrapper, sql: str, params: Any, many: bool, seconds: float,
+               error: BaseException | None = None) -> dict | None:
+        """
+        Записывает запрос в журнал, если он выполнялся не меньше порога.
+
+        Аргументы:
+            connection (BaseDatabaseWrapper): Соединение, выполнившее запрос.
+            sql (str): Текст запроса с плейсхолдерами.
+            params (Any): Параметры запроса; для `executemany` — список наборов параметров, из которых
+                записывается и объясняется первый.
+            many (bool): Запрос выполнен через `executemany`.
+            seconds (float): Время выполнения.
+            error (BaseException | None): Исключение, которым завершился запрос.
+
+        Возвращает:
+            dict | None: Записанная строка журнала или None, если запрос быстрее порога или файл недоступен.
+        """
+        duration_ms = seconds * 1000
+        if duration_ms < self.threshold_ms:
+            return None
+        scope = current_scope()
+        if many:
+            params = params[0] if isinstance(params, (list, tuple)) and params else None
+        entry = {
+            "time": datetime.datetime.now(datetime.UTC).isoformat(timespec='milliseconds'),
+            "alias": connection.alias,
+            "request_id": scope.request_id if scope is not None else None,
+            "view": scope.view if scope is not None else None,
+            "path": scope.request.path if scope is not None else None,
+            "duration_ms": round(duration_ms, 3),
+            "sql": sql,
+            "params": params,
+            "many": many,
+            "plan": self.query_plan(connection, sql, params) if self.explain else None,
+            "error": f"{type(error).__name__}: {error}" if error is not None else None,
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        try:
+            with self._lock, self.path.open('a', encoding='utf-8') as file:
+                file.write(line + '\n')
+        except OSError:
+            # Недоступный файл журнала не должен ломать запрос к базе данных.
+            return None
+        return entry
+
+    @staticmethod
+    def query_plan(connection: BaseDatabaseWrapper, sql: str, params: Any) -> list[list] | None:
+        """
+        Возвращает план запроса: строки [id, parent, detail] `EXPLAIN QUERY PLAN`.
+
+        Курсор создаётся без обёрток выполнения соединения, поэтому план не попадает ни в журнал, ни в метрики
+        и не сбрасывает результат исходного запроса.
+
+        Возвращает:
+            list | None: Строки плана или None, если план получить не удалось.
+        """
+        errors = (DatabaseError, connection.Database.Error, ValueError, TypeError)
+        try:
+            cursor = connection.create_cursor()
+        except errors:
+            return None
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [[row[0], row[1], row[3]] for row in cursor.fetchall()]
+        except errors:
+            return None
+        finally:
+            cursor.close()
+
+    def read(self) -> Iterator[dict]:
+        """Возвращает записи журнала; повреждённые строки (например, оборванные при остановке) пропускаются."""
+        if not self.path.exists():
+            return
+        with self.path.open(encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def clear(self) -> None:
+        """Очищает журнал."""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+
+
+def record_slow_queries(execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:
+    """Обёртка выполнения SQL (`connection.execute_wrappers`), записывающая медленные запросы в `slow_query_log`."""
+    started = time.perf_counter()
+    error = None
+    try:
+        return execute(sql, params, many, context)
+    except Exception as exception:
+        error = exception
+        raise
+    finally:
+        slow_query_log.record(context['connection'], sql, params, many, time.perf_counter() - started, error)
+
+
+def install_slow_query_recorder(connection: BaseDatabaseWrapper) -> None:
+    """
+    Добавляет `record_slow_queries` в обёртки выполнения SQL соединения с отслеживаемой базой.
+
+    Вызывается из обработчика сигнала `connection_created` (см. `UserActions.signals`).
+    """
+    if (slow_query_log.enabled and slow_query_log.watches(connection.alias)
+            and record_slow_queries not in connection.execute_wrappers):
+        connection.execute_wrappers.append(record_slow_queries)
+
+
+def query_fingerprint(sql: str) -> str:
+    """Приводит запросы, различающиеся только длиной списков `IN (...)` и пробелами, к одному виду."""
+    return ' '.join(PARAMS_LIST_RE.sub('IN (%s, ...)', sql).split())
+
+
+def full_scans(plan: list[list] | None) -> list[str]:
+    """Возвращает таблицы, которые план просматривает полностью, без индекса."""
+    tables = []
+    for _, _, detail in plan or ():
+        match = FULL_SCAN_RE.match(detail)
+        if match:
+            tables.append(match.group(1))
+    return tables
+
+
+def condition_columns(sql: str, table: str) -> tuple[list[str], list[str]]:
+    """
+    Находит колонки таблицы, на которые в запросе наложены условия.
+
+    Аргументы:
+        sql (str): Текст запроса.
+        table (str): Имя таблицы.
+
+    Возвращает:
+        tuple: Колонки с условием равенства (`=`, `IN`) и с условием диапазона, в порядке появления в запросе.
+    """
+    where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+    equal, ranged = [], []
+    for column, operator in re.findall(CONDITION_RE.format(table=re.escape(table)), where, re.IGNORECASE):
+        target = equal if operator in ('=', 'IN') else ranged
+        if column not in equal and column not in ranged:
+            target.append(column)
+    return equal, ranged
+
+
+def advise_index(sql: str, table: str, alias: str) -> IndexSpec | None:
+    """
+    Подбирает индекс, который избавил бы запрос от полного просмотра таблицы.
+
+    Сначала ищется объявленный индекс из `indexes.INDEXES`, начало которого покрывает условия равенства
+    запроса (и затем одно условие диапазона); из равных выбирается индекс, содержащий больше колонок запроса.
+    Если такого нет — предлагается новый индекс по колонкам условий.
+
+    Аргументы:
+        sql (str): Текст запроса.
+        table (str): Полностью просматриваемая таблица.
+        alias (str): База данных, в которой выполнялся запрос (для нового индекса).
+
+    Возвращает:
+        IndexSpec | None: Индекс или None, если у запроса нет условий на колонки таблицы.
+    """
+    equal, ranged = condition_columns(sql, table)
+    used = set(re.findall(COLUMN_RE.format(table=re.escape(table)), sql, re.IGNORECASE))
+    specs = [spec for spec in INDEXES if spec.table.lower() == table.lower()]
+    best, best_score = None, (0, 0)
+    for spec in specs:
+        prefix = 0
+        while prefix < len(spec.columns) and spec.columns[prefix] in equal:
+            prefix += 1
+        if prefix < len(spec.columns) and spec.columns[prefix] in ranged:
+            prefix += 1
+        score = (prefix, len(used.intersection(spec.columns)))
+        if prefix and score > best_score:
+            best, best_score = spec, score
+    if best is not None:
+        return best
+    columns = tuple(equal + ranged[:1])
+    if not columns:
+        return None
+    name = table.lower()
+    return IndexSpec(specs[0].alias if specs else alias, f"{name}_{'_'.join(columns)}_idx", name, columns)
+
+
+def summarize(entries: Iterable[dict], tables: Iterable[str] | None = None) -> list[dict]:
+    """
+    Группирует записи журнала по виду запроса и находит полные просмотры таблиц с подходящими индексами.
+
+    Аргументы:
+        entries (Iterable): Записи журнала (см. `SlowQueryLog.read`).
+        tables (Iterable, optional): Таблицы, полные просмотры которых отмечаются; по умолчанию — таблицы
+            `indexes.INDEXES` (logs, post).
+
+    Возвращает:
+        list: Группы по убыванию суммарного времени: {'fingerprint', 'count', 'total_ms', 'max_ms', 'views',
+        'aliases', 'errors', 'slowest', 'scans': [(таблица, IndexSpec | None), ...]}.
+    """
+    tables = {table.lower() for table in (tables if tables is not None else (spec.table for spec in INDEXES))}
+    groups = {}
+    for entry in entries:
+        key = query_fingerprint(entry["sql"])
+        group = groups.setdefault(key, {
+            "fingerprint": key, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "views": set(), "aliases": set(), "errors": 0, "slowest": entry,
+        })
+        group["count"] += 1
+        group["total_ms"] += entry["duration_ms"]
+        if entry["duration_ms"] >= group["max_ms"]:
+            group["max_ms"], group["slowest"] = entry["duration_ms"], entry
+        group["views"].add(entry.get("view") or "-")
+        group["aliases"].add(entry["alias"])
+        group["errors"] += entry.get("error") is not None
+    for group in groups.values():
+        slowest = group["slowest"]
+        group["scans"] = [
+            (table, advise_index(slowest["sql"], table, slowest["alias"]))
+            for table in dict.fromkeys(full_scans(slowest.get("plan"))) if table.lower() in tables
+        ]
+    return sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True)
+
+
+slow_query_log = SlowQueryLog.from_settings()
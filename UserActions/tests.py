@@ -1,14 +1,94 @@
+import copy
+import datetime
+import json
+import pstats
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Callable
+from io import StringIO
+from pathlib import Path
 from unittest.mock import Mock, patch
 
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, connections
+from django.db.models.functions import TruncDate
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.timezone import now, timedelta
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from blogs.models import Blog, Post, User
-from logs.models import EventType, Log, SpaceType
-
+from logs.models import CommentCounter, DailyActivity, EventType, Log, SpaceType
+
+from .cache import LRUCache, dataset_cache
+from .counters import (
+    counters_available,
+    install_comment_counters,
+    verify_comment_counters,
+)
+from .db_routers import BlogsDBRouter, LogsDBRouter, read_db, routing_context
+from .dimensions import dimensions
+from .forms import InputUserLogin
+from .indexes import verify_indexes
+from .ingest import BatchReport
+from .joins import join_foreign
+from .log_versions import get_log_version, install_log_versions
+from .log_writer import BufferedLogWriter, LogWriterFull
+from .metrics import MetricsRegistry, registry as metrics_registry
+from .middleware import ProfilingMiddleware
+from .models import LogShardOverride
+from .pagination import DatasetFilters
+from .partitions import (
+    PARTITION_TABLE_SQL,
+    create_partition,
+    discover_partitions,
+    is_partition,
+    move_month,
+    partitions_for_period,
+    register_partition,
+)
+from .posts import POST_LOOKUPS, post_cache
+from .profiling import ProfileStore
+from .rollups import (
+    create_rollup_tables,
+    get_high_water_mark,
+    refresh_rollups,
+    rollups_available,
+)
+from .services import (
+    build_batch_datasets,
+    comments_queryset,
+    general_aggregates,
+    general_queryset,
+    general_rows,
+    iter_comment_counts,
+    run_in_thread,
+    scatter,
+    search_logins,
+)
+from .sharding import (
+    ID_BLOCK,
+    hash_shard,
+    move_user,
+    pin_users,
+    prepare_shard,
+    set_override,
+    shard_map,
+)
+from .slow_queries import (
+    SlowQueryLog,
+    advise_index,
+    install_slow_query_recorder,
+    record_slow_queries,
+)
+from .tracing import Trace, TraceExporter, span, trace_queries, trace_request
 from .views import comments, download_csv, general, get_data_from_api
 
 
@@ -27,6 +107,7 @@ class CommentsAPITestCase(APITestCase):
 
     def setUp(self) -> None:
         """Настройка тестовых данных для проверки работы API комментариев."""
+        dataset_cache.clear()
         self.event_type = EventType.objects.using('logs_db').get(name="comment")
         self.space_type = SpaceType.objects.using('logs_db').get(name="post")
         self.user = User.objects.create(login="ChillGuy", email="ChillGuy@example.com")
@@ -104,6 +185,7 @@ class GeneralAPITestCase(APITestCase):
 
     def setUp(self) -> None:
         """Настройка тестовых данных для проверки работы API общей активности пользователя."""
+        dataset_cache.clear()
         self.login_event = EventType.objects.using('logs_db').get(name="login")
         self.global_space_type = SpaceType.objects.using('logs_db').get(name="global")
         self.create_post_event = EventType.objects.using('logs_db').get(name="create_post")
@@ -227,27 +309,27 @@ class GetDataFromAPITest(TestCase):
     """
     Тесты для функции get_data_from_api.
 
-    Этот класс тестирует функцию get_data_from_api, которая выполняет запросы к внешнему API для получения данных
-    о комментариях и общей активности пользователя.
+    Этот класс тестирует функцию get_data_from_api, которая получает датасеты о комментариях
+    и общей активности пользователя через сервисный слой, без HTTP-запросов к собственному API.
 
     Тесты охватывают следующие случаи:
-    - успешный возврат данных с кодом ответа 200;
-    - обработка ошибок API с кодом 400 (неудачные запросы);
-    - частичный сбой, когда один из запросов успешен, а другой — нет.
+    - успешный возврат обоих датасетов;
+    - обработка несуществующего пользователя;
+    - частичный сбой, когда один из датасетов сформирован, а другой — нет.
     """
 
-    @patch("requests.get")
-    def test_successful_api_responses(self, mock_get: Mock) -> None:
+    @patch("UserActions.views.get_general_dataset")
+    @patch("UserActions.views.get_comments_dataset")
+    def test_successful_api_responses(self, mock_comments: Mock, mock_general: Mock) -> None:
         """
-        Проверяет корректную обработку успешных ответов API.
+        Проверяет корректную обработку успешно сформированных датасетов.
 
-        Тестирует успешный возврат данных для комментариев и общей активности пользователя.
-        Проверяется правильность обработки успешных ответов с кодом 200.
+        Тестирует возврат данных для комментариев и общей активности пользователя.
         """
-        mock_get.side_effect = (self.mock_response(200,
-                [{"login": "ChillGuy", "header": "Python 3.12", "author_login": "user1", "comments_count": 1}]),
-                self.mock_response(200,
-                [{"date": "2025-03-05", "logins": 2, "logouts": 0, "blog_actions_count": 2}]))
+        mock_comments.return_value = [
+            {"login": "ChillGuy", "header": "Python 3.12", "author_login": "user1", "comments_count": 1}]
+        mock_general.return_value = [
+            {"date": "2025-03-05", "logins": 2, "logouts": 0, "blog_actions_count": 2}]
 
         comments, general = get_data_from_api("ChillGuy")
         self.assertEqual(comments, [
@@ -255,36 +337,34 @@ class GetDataFromAPITest(TestCase):
         self.assertEqual(general, [
             {"date": "2025-03-05", "logins": 2, "logouts": 0, "blog_actions_count": 2},
         ])
+        mock_comments.assert_called_once_with("ChillGuy")
+        mock_general.assert_called_once_with("ChillGuy")
 
-    @patch("requests.get")
-    def test_api_failure(self, mock_get: Mock) -> None:
+    @patch("UserActions.views.get_general_dataset", side_effect=User.DoesNotExist)
+    @patch("UserActions.views.get_comments_dataset", side_effect=User.DoesNotExist)
+    def test_api_failure(self, mock_comments: Mock, mock_general: Mock) -> None:
         """
-        Проверяет обработку ошибок API.
+        Проверяет обработку несуществующего пользователя.
 
-        Тестирует случай, когда API возвращает ошибку с кодом 400.
-        Проверяется, что возвращаются пустые данные.
+        Проверяется, что для обоих датасетов возвращаются пустые данные.
         """
-        mock_get.side_effect = (self.mock_response(400, []), self.mock_response(400, []))
-
         comments, general = get_data_from_api("ChillGuy")
 
         self.assertEqual(comments, [])
         self.assertEqual(general, [])
 
-    @patch("requests.get")
-    def test_api_partial_failure(self, mock_get: Mock) -> None:
+    @patch("UserActions.views.get_general_dataset", side_effect=SpaceType.DoesNotExist)
+    @patch("UserActions.views.get_comments_dataset")
+    def test_api_partial_failure(self, mock_comments: Mock, mock_general: Mock) -> None:
         """
-        Проверяет обработку частичного сбоя API.
+        Проверяет обработку частичного сбоя.
 
-        Тестирует случай, когда один из API-запросов успешен, а другой — нет.
-        Проверяется, что возвращаются корректные данные для успешного запроса.
+        Тестирует случай, когда один из датасетов сформирован, а другой — нет.
+        Проверяется, что возвращаются корректные данные для успешного датасета.
         """
-        mock_get.side_effect = (
-            self.mock_response(200, [
-                {"login": "ChillGuy", "header": "Python 3.12", "author_login": "user1", "comments_count": 1}
-            ]),
-            self.mock_response(400, [])
-        )
+        mock_comments.return_value = [
+            {"login": "ChillGuy", "header": "Python 3.12", "author_login": "user1", "comments_count": 1}
+        ]
 
         comments, general = get_data_from_api("ChillGuy")
 
@@ -293,65 +373,1622 @@ class GetDataFromAPITest(TestCase):
         ])
         self.assertEqual(general, [])
 
-    def mock_response(self, status_code: int, json_data: list[dict]) -> Mock:
-        """
-        Мокирует ответ API.
-
-        Создает мок-объект с заданным статусом и данными.
-        """
-        mock_resp = Mock()
-        mock_resp.status_code = status_code
-        mock_resp.json.return_value = json_data
-        return mock_resp
-
 class DownloadCSVTestCase(APITestCase):
     """
     Тесты для функции скачивания CSV-файлов.
 
-    Этот класс тестирует функциональность скачивания CSV-файлов с данными о комментариях и общей активности пользователя.
+    Этот класс тестирует функциональность потокового скачивания CSV-файлов с данными о комментариях и общей активности пользователя.
     Он проверяет успешные случаи скачивания данных, а также обработку ошибок, например, неправильного типа данных.
     """
+    databases = ['logs_db', 'blogs_db']
 
-    @patch("UserActions.views.get_data_from_api")
-    def test_download_csv_successful(self, mock_get_data_from_api: Mock) -> None:
+    def setUp(self) -> None:
+        """Создаёт пользователя с одним комментарием к посту другого автора."""
+        self.user = User.objects.create(login="ChillGuy", email="ChillGuy@example.com")
+        author = User.objects.create(login="Author", email="Author@example.com")
+        blog = Blog.objects.using('blogs_db').create(owner=author, name="Rich Blog", description="")
+        post = Post.objects.using('blogs_db').create(header="Python 3.12", text="", author=author, blog=blog)
+        self.log = Log.objects.using('logs_db').create(
+            datetime=now(),
+            user_id=self.user.id,
+            space_type=SpaceType.objects.using('logs_db').get(name="post"),
+            event_type=EventType.objects.using('logs_db').get(name="comment"),
+            space_id=post.id
+        )
+
+    def test_download_csv_successful(self) -> None:
         """
         Проверяет корректную обработку успешных запросов для скачивания CSV-файла.
 
-        Тестирует успешный возврат данных для скачивания CSV-файла, если данные для комментариев предоставляются API.
-        Проверяется, что CSV-файл правильно формируется с ожидаемым содержимым.
+        Проверяется, что ответ потоковый и CSV-файл формируется с ожидаемыми заголовками и строками.
         """
-        mock_get_data_from_api.side_effect = (
-            ([
-                 {"login": "ChillGuy", "header": "Python 3.12", "author_login": "user1", "comments_count": 1}
-             ], [
-                 {"date": "2025-03-05", "logins": 2, "logouts": 0, "blog_actions_count": 2}
-             ]),)
-
         url = reverse("download_csv", args=["ChillGuy", "comments"])
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+
+        expected_csv = "user_login,post_header,post_author,comment count\r\nChillGuy,Python 3.12,Author,1\r\n"
+        self.assertEqual(b"".join(response.streaming_content).decode(), expected_csv)
+
+    def test_download_general_csv(self) -> None:
+        """Проверяет формат строк CSV-файла с общей активностью пользователя."""
+        url = reverse("download_csv", args=["ChillGuy", "general"])
+        response = self.client.get(url)
+
+        expected_csv = f"date,login_count,logout_count,blog_actions_count\r\n{self.log.datetime.date().isoformat()},0,0,0\r\n"
+        self.assertEqual(b"".join(response.streaming_content).decode(), expected_csv)
 
-        expected_csv = "user_login,post_header,post_author,comment count\r\nChillGuy,Python 3.12,user1,1\r\n"
-        self.assertEqual(response.content.decode(), expected_csv)
+    def test_download_csv_unknown_user(self) -> None:
+        """Проверяет, что для несуществующего пользователя отдаётся только заголовок."""
+        url = reverse("download_csv", args=["NotUser", "comments"])
+        response = self.client.get(url)
 
-    @patch("UserActions.views.get_data_from_api")
-    def test_download_csv_invalid_dataset_type(self, mock_get_data_from_api: Mock) -> None:
+        self.assertEqual(b"".join(response.streaming_content).decode(), "user_login,post_header,post_author,comment count\r\n")
+
+    def test_download_csv_invalid_dataset_type(self) -> None:
         """
         Тестирует ошибку, если тип данных для скачивания неверен.
 
-        Тестирует обработку ошибки при запросе неправильного типа данных для скачивания.
-        Ожидается ошибка 400 с соответствующим сообщением о неверном типе данных.
+        Ожидается ошибка 400 при запросе неправильного типа данных для скачивания.
         """
-        mock_get_data_from_api.side_effect = (
-            ([
-                 {"login": "ChillGuy", "header": "Python 3.12", "author_login": "user1", "comments_count": 1}
-             ], [
-                 {"date": "2025-03-05", "logins": 2, "logouts": 0, "blog_actions_count": 2}
-             ]),)
-
         url = reverse("download_csv", args=["ChillGuy", "comms"])
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class DBIndexesCommandTestCase(TestCase):
+    """
+    Тесты для команды управления индексами `db_indexes`.
+
+    Проверяет создание, проверку и удаление индексов неуправляемых таблиц,
+    а также то, что после создания индексов запросы эндпоинтов их используют.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def test_create_verify_drop(self) -> None:
+        """Проверяет полный цикл: создание, проверку и удаление индексов."""
+        out = StringIO()
+        call_command('db_indexes', 'create', stdout=out)
+
+        self.assertTrue(all(state == 'ok' for state in verify_indexes().values()))
+        self.assertIn("USING COVERING INDEX logs_user_event_space_idx", out.getvalue())
+        self.assertIn("USING COVERING INDEX logs_user_datetime_idx", out.getvalue())
+
+        call_command('db_indexes', 'drop', stdout=StringIO())
+        self.assertTrue(all(state == 'missing' for state in verify_indexes().values()))
+
+
+class CommentCountersTestCase(TestCase):
+    """
+    Тесты для счётчиков комментариев, поддерживаемых триггерами.
+
+    Проверяет, что после установки comments читает счётчики и отдаёт те же строки,
+    что и агрегирование логов, и что триггеры учитывают вставку, изменение и удаление логов.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        self.user_id = dimensions.user_id('user1')
+        self.comment = EventType.objects.using('logs_db').get(name='comment')
+        self.post = SpaceType.objects.using('logs_db').get(name='post')
+
+    def test_install_and_read(self) -> None:
+        """Проверяет заполнение счётчиков и совпадение датасета и страниц с агрегированием логов."""
+        expected = list(iter_comment_counts(self.user_id))
+        page = DatasetFilters(limit=2, after=expected[0]['space_id'])
+        expected_page = list(iter_comment_counts(self.user_id, page))
+        expected_batch = list(build_batch_datasets(['user1', 'user2'], ['comments'])[0].items())
+        call_command('comment_counters', 'install', '--database', 'logs_db', stdout=StringIO())
+
+        self.assertIn('"comment_counters"', str(comments_queryset(self.user_id).query))
+        self.assertEqual(list(iter_comment_counts(self.user_id)), expected)
+        self.assertEqual(list(iter_comment_counts(self.user_id, page)), expected_page)
+        self.assertEqual(list(build_batch_datasets(['user1', 'user2'], ['comments'])[0].items()), expected_batch)
+        march = DatasetFilters(date_from=datetime.datetime(2025, 3, 1, tzinfo=datetime.UTC))
+        self.assertIn('"logs"', str(comments_queryset(self.user_id, march).query))
+
+    def test_triggers_keep_counters_in_sync(self) -> None:
+        """Проверяет счётчики после вставки, изменения и удаления комментариев."""
+        install_comment_counters('logs_db')
+        counters = CommentCounter.objects.using('logs_db').filter(user_id=self.user_id)
+        log = Log.objects.using('logs_db').create(
+            datetime=now(), user_id=self.user_id, space_type=self.post, event_type=self.comment, space_id=999999,
+        )
+        Log.objects.using('logs_db').create(
+            datetime=now(), user_id=self.user_id, space_type=self.post, event_type=self.comment, space_id=999999,
+        )
+        self.assertEqual(counters.get(post_id=999999).comment_count, 2)
+
+        Log.objects.using('logs_db').filter(pk=log.pk).update(space_id=999998)
+        self.assertEqual(counters.get(post_id=999998).comment_count, 1)
+        self.assertEqual(counters.get(post_id=999999).comment_count, 1)
+
+        Log.objects.using('logs_db').filter(space_id__in=[999998, 999999]).delete()
+        self.assertFalse(counters.filter(post_id__in=[999998, 999999]).exists())
+        self.assertEqual(verify_comment_counters('logs_db'), 0)
+
+        call_command('comment_counters', 'drop', '--database', 'logs_db', stdout=StringIO())
+        self.assertFalse(counters_available('logs_db'))
+
+
+class ForeignJoinTestCase(TestCase):
+    """
+    Тесты для соединения строк логов с таблицами 'blogs_db'.
+
+    Проверяет порядок и значения по умолчанию соединённых строк и то, что каждая таблица
+    запрашивается один раз на пачку строк, а условие `IN (...)` разбивается на части.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def test_join_posts_and_authors(self) -> None:
+        """Проверяет заголовки и авторов постов, значения для несуществующего поста и количество запросов."""
+        post = Post.objects.using('blogs_db').select_related('author').first()
+        rows = [{"space_id": post.id, "n": 1}, {"space_id": 10 ** 9, "n": 2}, {"space_id": post.id, "n": 3}]
+
+        with self.assertNumQueries(2, using='blogs_db'):
+            joined = list(join_foreign(rows, POST_LOOKUPS))
+        self.assertEqual([row["n"] for row in joined], [1, 2, 3])
+        self.assertEqual((joined[0]["header"], joined[0]["author_login"]), (post.header, post.author.login))
+        self.assertEqual((joined[1]["header"], joined[1]["author_login"]), ("Unknown", "Unknown"))
+        self.assertNotIn("header", rows[0])
+
+        post_ids = list(Post.objects.using('blogs_db').values_list('id', flat=True)[:3])
+        with self.assertNumQueries(2, using='blogs_db'):
+            joined = list(join_foreign([{"space_id": post_id} for post_id in post_ids], POST_LOOKUPS[:1], 2))
+        self.assertEqual([row["space_id"] for row in joined], post_ids)
+        with self.assertNumQueries(2, using='blogs_db'):
+            self.assertEqual(set(POST_LOOKUPS[0].fetch(post_ids, chunk_size=2)), set(post_ids))
+
+
+class PostMetadataCacheTestCase(TestCase):
+    """
+    Тесты для кэша метаданных постов.
+
+    Проверяет, что повторные запросы метаданных не обращаются к 'blogs_db', что кэш считает
+    долю попаданий и что изменение поста или логина его автора сбрасывает записи.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        post_cache.clear()
+        self.addCleanup(post_cache.clear)
+        self.post = Post.objects.using('blogs_db').select_related('author').first()
+
+    def test_cached_lookups_and_hit_ratio(self) -> None:
+        """Проверяет чтение из кэша при повторном запросе и долю попаданий."""
+        with self.assertNumQueries(2, using='blogs_db'):
+            first = post_cache.get_many([self.post.id, 10 ** 9])
+        with self.assertNumQueries(0, using='blogs_db'):
+            second = post_cache.get_many([self.post.id, 10 ** 9])
+
+        self.assertEqual(first, second)
+        self.assertEqual(first[self.post.id], {"header": self.post.header, "author_login": self.post.author.login})
+        self.assertEqual(first[10 ** 9], {"header": "Unknown", "author_login": "Unknown"})
+        self.assertEqual(post_cache.stats()["hit_ratio"], 0.5)
+
+    def test_invalidation_on_post_and_author_change(self) -> None:
+        """Проверяет, что изменения заголовка поста и логина автора видны в следующем запросе."""
+        post_cache.get_many([self.post.id])
+        self.post.header = "Новый заголовок"
+        self.post.save(using='blogs_db')
+        self.assertEqual(post_cache.get_many([self.post.id])[self.post.id]["header"], "Новый заголовок")
+
+        author = self.post.author
+        author.login = "renamed_author"
+        author.save(using='blogs_db')
+        self.assertEqual(post_cache.get_many([self.post.id])[self.post.id]["author_login"], "renamed_author")
+
+
+class DatasetCacheTestCase(APITestCase):
+    """
+    Тесты для кэша датасетов.
+
+    Проверяет попадания и промахи для эндпоинтов, инвалидацию по версии пользователя
+    при записи нового лога, а также вытеснение по LRU, размеру и TTL.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        """Создаёт пользователя с одним комментарием и очищает кэш."""
+        dataset_cache.clear()
+        self.user = User.objects.create(login="ChillGuy", email="ChillGuy@example.com")
+        self.blog = Blog.objects.using('blogs_db').create(owner=self.user, name="Rich Blog", description="")
+        self.post = Post.objects.using('blogs_db').create(header="First Post", text="", author=self.user, blog=self.blog)
+        self.comment_log = {
+            "user_id": self.user.id,
+            "space_type": SpaceType.objects.using('logs_db').get(name="post"),
+            "event_type": EventType.objects.using('logs_db').get(name="comment"),
+            "space_id": self.post.id,
+        }
+        Log.objects.using('logs_db').create(datetime=now(), **self.comment_log)
+
+    def test_second_request_is_cache_hit(self) -> None:
+        """Проверяет, что повторный запрос отдаётся из кэша."""
+        url = reverse('comments-api')
+        first = self.client.get(url, {'login': 'ChillGuy'})
+        second = self.client.get(url, {'login': 'ChillGuy'})
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(dataset_cache.stats()["misses"], 1)
+        self.assertEqual(dataset_cache.stats()["hits"], 1)
+
+    def test_new_log_invalidates_cached_dataset(self) -> None:
+        """Проверяет, что новый лог пользователя делает закэшированный датасет устаревшим."""
+        url = reverse('comments-api')
+        self.client.get(url, {'login': 'ChillGuy'})
+        Log.objects.using('logs_db').create(datetime=now(), **self.comment_log)
+        response = self.client.get(url, {'login': 'ChillGuy'})
+
+        self.assertEqual(response.data[0]["comments_count"], 2)
+        self.assertEqual(dataset_cache.stats()["invalidations"], 1)
+
+    def test_post_and_author_changes_invalidate_cached_comments(self) -> None:
+        """Проверяет, что изменение заголовка поста и логина автора видно в закэшированном датасете comments."""
+        url = reverse('comments-api')
+        self.client.get(url, {'login': 'ChillGuy'})
+        self.post.header = "Edited Post"
+        self.post.save(using='blogs_db')
+        response = self.client.get(url, {'login': 'ChillGuy'})
+        self.assertEqual(response.data[0]["header"], "Edited Post")
+
+        self.user.login = "ColdGuy"
+        self.user.save()
+        response = self.client.get(url, {'login': 'ColdGuy'})
+        self.assertEqual(response.data[0]["author_login"], "ColdGuy")
+
+    def test_log_written_without_signals_invalidates_cached_dataset(self) -> None:
+        """Проверяет, что лог, записанный в обход сигналов моделей (сырым SQL или другим процессом), инвалидирует кэш."""
+        url = reverse('comments-api')
+        self.client.get(url, {'login': 'ChillGuy'})
+        with connections['logs_db'].cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO "logs" ("datetime", "user_id", "space_type_id", "event_type_id", "space_id") '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [connections['logs_db'].ops.adapt_datetimefield_value(now()), self.user.id,
+                 self.comment_log["space_type"].id,
+                 self.comment_log["event_type"].id, self.post.id],
+            )
+        response = self.client.get(url, {'login': 'ChillGuy'})
+
+        self.assertEqual(response.data[0]["comments_count"], 2)
+
+    def test_lru_eviction(self) -> None:
+        """Проверяет вытеснение давно не использованных записей по количеству и по размеру."""
+        cache = LRUCache(max_entries=2, max_bytes=10)
+        cache.set("a", 1, size=4)
+        cache.set("b", 2, size=4)
+        cache.get("a")
+        cache.set("c", 3, size=4)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        cache.set("d", 4, size=8)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()["bytes"], 8)
+
+    def test_ttl_expiration(self) -> None:
+        """Проверяет, что запись перестаёт отдаваться после истечения TTL."""
+        cache = LRUCache(max_entries=10, ttl=60)
+        with patch("UserActions.cache.time.monotonic", return_value=1000):
+            cache.set("a", 1)
+        with patch("UserActions.cache.time.monotonic", return_value=1061):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+
+class ConditionalDatasetRequestsTestCase(APITestCase):
+    """
+    Тесты для условных GET-запросов к датасетам.
+
+    Проверяет заголовок ETag, ответ 304 без построения датасета и смену ETag после записи
+    нового лога, изменения лога на месте и изменения поста пользователя.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        dataset_cache.clear()
+        self.url = reverse('comments-api')
+
+    def test_not_modified_skips_dataset(self) -> None:
+        """Проверяет 304 по If-None-Match без вызова построения датасета и отсутствие Last-Modified."""
+        response = self.client.get(self.url, {'login': 'user1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+
+        with patch('UserActions.views.get_comments_dataset') as build:
+            response = self.client.get(self.url, {'login': 'user1'}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            build.assert_not_called()
+
+        other = self.client.get(self.url, {'login': 'user1', 'limit': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(other['ETag'], etag)
+
+    def test_new_log_changes_etag(self) -> None:
+        """Проверяет, что после записи лога пользователя прежний ETag не даёт 304, в том числе для CSV."""
+        csv_url = reverse("download_csv", args=["user1", "general"])
+        etag = self.client.get(self.url, {'login': 'user1'})['ETag']
+        csv_etag = self.client.get(csv_url)['ETag']
+        self.assertEqual(self.client.get(csv_url, HTTP_IF_NONE_MATCH=csv_etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Log.objects.using('logs_db').create(
+            datetime=now(), user_id=dimensions.user_id('user1'),
+            space_type=SpaceType.objects.using('logs_db').get(name="global"),
+            event_type=EventType.objects.using('logs_db').get(name="login"),
+        )
+        self.assertEqual(self.client.get(self.url, {'login': 'user1'}, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_200_OK)
+        self.assertEqual(self.client.get(csv_url, HTTP_IF_NONE_MATCH=csv_etag).status_code, status.HTTP_200_OK)
+
+
+    def test_in_place_log_update_changes_etag(self) -> None:
+        """Проверяет, что с установленными версиями логов изменение лога на месте меняет ETag и версию кэша."""
+        install_log_versions('logs_db')
+        user_id = dimensions.user_id('user1')
+        etag = self.client.get(self.url, {'login': 'user1'})['ETag']
+        comments = self.client.get(self.url, {'login': 'user1'}).data
+
+        log = Log.objects.using('logs_db').filter(user_id=user_id, event_type__name='comment').first()
+        Log.objects.using('logs_db').filter(pk=log.pk).update(space_id=999999)
+
+        response = self.client.get(self.url, {'login': 'user1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data, comments)
+        self.assertEqual(get_log_version(user_id), 1)
+
+    def test_post_change_changes_etag(self) -> None:
+        """Проверяет, что изменение заголовка поста из датасета делает прежний ETag недействительным."""
+        etag = self.client.get(self.url, {'login': 'user1'})['ETag']
+        post_id = next(iter_comment_counts(dimensions.user_id('user1')))['space_id']
+        post = Post.objects.using('blogs_db').get(id=post_id)
+        post.header = "Edited header"
+        post.save(using='blogs_db')
+
+        response = self.client.get(self.url, {'login': 'user1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Edited header", [row['header'] for row in response.data])
+
+
+class DailyActivityRollupTestCase(APITestCase):
+    """
+    Тесты для дневной сводки активности.
+
+    Проверяет, что датасет general, собранный из сводки и хвоста необработанных логов,
+    совпадает с агрегацией по всем логам.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        """Строит сводку по логам и очищает кэш датасетов."""
+        dataset_cache.clear()
+        self.user = User.objects.create(login="ChillGuy", email="ChillGuy@example.com")
+        self.log_kwargs = {
+            "user_id": self.user.id,
+            "event_type": EventType.objects.using('logs_db').get(name="login"),
+            "space_type": SpaceType.objects.using('logs_db').get(name="global"),
+            "space_id": None,
+        }
+        Log.objects.using('logs_db').create(datetime=now() - timedelta(days=1), **self.log_kwargs)
+        call_command('rollup_activity', stdout=StringIO())
+
+    def test_rollup_matches_raw_aggregation(self) -> None:
+        """Проверяет совпадение сводки с агрегацией по сырым логам для всех пользователей."""
+        self.assertTrue(rollups_available())
+        self.assertEqual(get_high_water_mark(), Log.objects.using('logs_db').order_by('-id').first().id)
+        for user_id in User.objects.values_list('id', flat=True):
+            self.assertEqual(general_rows(user_id), list(general_queryset(user_id)))
+
+    def test_unrolled_tail_is_merged(self) -> None:
+        """Проверяет, что логи после отметки сводки учитываются в ответе эндпоинта."""
+        Log.objects.using('logs_db').create(datetime=now() - timedelta(days=1), **self.log_kwargs)
+        Log.objects.using('logs_db').create(datetime=now(), **self.log_kwargs)
+
+        response = self.client.get(reverse('general-api'), {'login': 'ChillGuy'})
+
+        self.assertEqual([row["logins"] for row in response.data], [2, 1])
+        self.assertEqual(general_rows(self.user.id), list(general_queryset(self.user.id)))
+
+    def test_deleted_and_updated_logs_stay_in_sync(self) -> None:
+        """Проверяет, что удаление и изменение уже учтённых логов сразу отражаются в сводке."""
+        logout = EventType.objects.using('logs_db').get(name="logout")
+        rolled = [
+            Log.objects.using('logs_db').create(datetime=now() - timedelta(days=2), **self.log_kwargs)
+            for _ in range(3)
+        ]
+        call_command('rollup_activity', stdout=StringIO())
+        self.assertEqual(get_high_water_mark(), rolled[-1].id)
+
+        rolled[0].delete()
+        rolled[1].event_type = logout
+        rolled[1].save()
+        Log.objects.using('logs_db').filter(pk=rolled[2].pk).update(datetime=now() - timedelta(days=5))
+        self.assertEqual(general_rows(self.user.id), list(general_queryset(self.user.id)))
+
+        Log.objects.using('logs_db').filter(user_id=self.user.id).delete()
+        self.assertEqual(general_rows(self.user.id), [])
+        self.assertFalse(DailyActivity.objects.using('logs_db').filter(user_id=self.user.id).exists())
+
+
+class BatchDatasetsAPITestCase(APITestCase):
+    """
+    Тесты для API пакетного получения датасетов.
+
+    Проверяет, что результаты для каждого логина совпадают с ответами одиночных эндпоинтов,
+    а несуществующие логины возвращаются отдельным списком.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        """Очищает кэш датасетов и собирает логины всех пользователей."""
+        dataset_cache.clear()
+        self.logins = list(User.objects.values_list('login', flat=True))
+
+    def assert_matches_single_endpoints(self, results: dict) -> None:
+        """Сравнивает результаты пакетного API с ответами api/comments и api/general."""
+        for login in self.logins:
+            comments_response = self.client.get(reverse('comments-api'), {'login': login})
+            general_response = self.client.get(reverse('general-api'), {'login': login})
+            self.assertEqual(results[login]["comments"], comments_response.data)
+            self.assertEqual(results[login]["general"], general_response.data)
+
+    def test_batch_get_matches_single_endpoints(self) -> None:
+        """Проверяет GET-запрос со списком логинов через запятую."""
+        response = self.client.get(reverse('batch-api'), {'login': ",".join(self.logins + ["NotUser"])})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["missing"], ["NotUser"])
+        self.assert_matches_single_endpoints(response.data["results"])
+
+    def test_batch_post_with_rollups(self) -> None:
+        """Проверяет POST-запрос при построенной дневной сводке."""
+        call_command('rollup_activity', stdout=StringIO())
+        response = self.client.post(reverse('batch-api'), {'logins': self.logins}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assert_matches_single_endpoints(response.data["results"])
+
+    def test_batch_selected_dataset(self) -> None:
+        """Проверяет выбор одного датасета."""
+        response = self.client.post(
+            reverse('batch-api'), {'logins': self.logins[:1], 'datasets': ['general']}, format='json'
+        )
+
+        self.assertEqual(list(response.data["results"][self.logins[0]]), ["general"])
+
+    def test_batch_invalid_request(self) -> None:
+        """Проверяет ошибку 400 без логинов или с неизвестным датасетом."""
+        self.assertEqual(self.client.get(reverse('batch-api')).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('batch-api'), {'login': 'user1', 'datasets': 'logs'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DatasetPaginationTestCase(APITestCase):
+    """
+    Тесты для фильтров по периоду и keyset-пагинации эндпоинтов comments и general.
+
+    Проверяет, что страницы, полученные по ссылкам `next`, в сумме дают полный датасет,
+    а параметры `from`/`to` ограничивают период логов.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        """Создаёт пользователя с комментариями к трём постам в три разных дня."""
+        dataset_cache.clear()
+        self.user = User.objects.create(login="ChillGuy", email="ChillGuy@example.com")
+        blog = Blog.objects.using('blogs_db').create(owner=self.user, name="Rich Blog", description="")
+        self.start = now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=3)
+        for day in range(3):
+            post = Post.objects.using('blogs_db').create(header=f"Post {day}", text="", author=self.user, blog=blog)
+            Log.objects.using('logs_db').create(
+                datetime=self.start + timedelta(days=day),
+                user_id=self.user.id,
+                space_type=SpaceType.objects.using('logs_db').get(name="post"),
+                event_type=EventType.objects.using('logs_db').get(name="comment"),
+                space_id=post.id
+            )
+
+    def collect_pages(self, url_name: str, params: dict) -> list[dict]:
+        """Проходит по всем страницам эндпоинта и возвращает объединённые строки."""
+        response = self.client.get(reverse(url_name), params)
+        rows = list(response.data["results"])
+        while response.data["next"]:
+            self.assertLessEqual(len(response.data["results"]), params["limit"])
+            response = self.client.get(response.data["next"])
+            rows.extend(response.data["results"])
+        return rows
+
+    def test_comments_pages_cover_dataset(self) -> None:
+        """Проверяет, что страницы comments в сумме совпадают с полным датасетом."""
+        full = self.client.get(reverse('comments-api'), {'login': 'ChillGuy'}).data
+        pages = self.collect_pages('comments-api', {'login': 'ChillGuy', 'limit': 2})
+
+        self.assertEqual(pages, full)
+
+    def test_general_pages_cover_dataset(self) -> None:
+        """Проверяет, что страницы general совпадают с полным датасетом со сводкой и без неё."""
+        full = self.client.get(reverse('general-api'), {'login': 'ChillGuy'}).data
+        self.assertEqual(self.collect_pages('general-api', {'login': 'ChillGuy', 'limit': 1}), full)
+
+        call_command('rollup_activity', stdout=StringIO())
+        dataset_cache.clear()
+        self.assertEqual(self.collect_pages('general-api', {'login': 'ChillGuy', 'limit': 2}), full)
+
+    def test_period_filters(self) -> None:
+        """Проверяет, что `from` включает границу, а `to` — нет."""
+        day_from = (self.start + timedelta(days=1)).date()
+        day_to = (self.start + timedelta(days=2)).date()
+        response = self.client.get(reverse('general-api'), {
+            'login': 'ChillGuy', 'from': day_from.isoformat(), 'to': day_to.isoformat(),
+        })
+        self.assertEqual([row["date"] for row in response.data], [day_from.isoformat()])
+
+        response = self.client.get(reverse('comments-api'), {
+            'login': 'ChillGuy', 'from': (self.start + timedelta(hours=1)).isoformat(),
+        })
+        self.assertEqual([row["header"] for row in response.data], ["Post 1", "Post 2"])
+
+    def test_invalid_params(self) -> None:
+        """Проверяет ошибку 400 для неверных курсора, лимита и даты."""
+        for params in ({'cursor': 'garbage'}, {'limit': '0'}, {'from': 'yesterday'}):
+            response = self.client.get(reverse('general-api'), {'login': 'ChillGuy', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GeneralGranularityTestCase(APITestCase):
+    """
+    Тесты для интервалов группировки (`granularity`) и часового пояса (`tz`) эндпоинта general.
+
+    Логи пользователя охватывают переход на летнее время в America/New_York (2025-03-09 07:00 UTC),
+    чтобы проверить смену смещения внутри выборки.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        """Создаёт пользователя со входами и выходом до и после перехода на летнее время."""
+        dataset_cache.clear()
+        self.user = User.objects.create(login="ChillGuy", email="ChillGuy@example.com")
+        utc = datetime.UTC
+        events = (
+            (datetime.datetime(2025, 3, 8, 23, 30, tzinfo=utc), "login"),
+            (datetime.datetime(2025, 3, 9, 6, 30, tzinfo=utc), "logout"),
+            (datetime.datetime(2025, 3, 9, 7, 30, tzinfo=utc), "login"),
+            (datetime.datetime(2025, 3, 10, 12, 0, tzinfo=utc), "login"),
+            (datetime.datetime(2025, 4, 1, 0, 30, tzinfo=utc), "login"),
+        )
+        for moment, event in events:
+            Log.objects.using('logs_db').create(
+                datetime=moment,
+                user_id=self.user.id,
+                space_type=SpaceType.objects.using('logs_db').get(name="global"),
+                event_type=EventType.objects.using('logs_db').get(name=event),
+            )
+
+    def get_general(self, **params) -> list[dict]:
+        """Запрашивает general пользователя и возвращает пары (интервал, входы, выходы)."""
+        response = self.client.get(reverse('general-api'), {'login': 'ChillGuy', **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(row["date"], row["logins"], row["logouts"]) for row in response.data]
+
+    def test_day_matches_trunc_date(self) -> None:
+        """Проверяет, что дневные интервалы в UTC совпадают с группировкой по TruncDate."""
+        expected = list(
+            Log.objects.using('logs_db').filter(user_id=self.user.id)
+            .annotate(date=TruncDate('datetime')).values('date')
+            .annotate(**general_aggregates()).order_by('date')
+        )
+        self.assertEqual(list(general_queryset(self.user.id).order_by('date')), expected)
+
+    def test_week_and_month(self) -> None:
+        """Проверяет недели с понедельника и месяцы в UTC."""
+        self.assertEqual(self.get_general(granularity='week'), [
+            ("2025-03-03", 2, 1), ("2025-03-10", 1, 0), ("2025-03-31", 1, 0),
+        ])
+        self.assertEqual(self.get_general(granularity='month'), [("2025-03-01", 3, 1), ("2025-04-01", 1, 0)])
+
+    def test_timezone_across_dst(self) -> None:
+        """Проверяет, что смещение часового пояса учитывается до и после перехода на летнее время."""
+        self.assertEqual(self.get_general(granularity='hour', tz='America/New_York'), [
+            ("2025-03-08T18:00:00-05:00", 1, 0),
+            ("2025-03-09T01:00:00-05:00", 0, 1),
+            ("2025-03-09T03:00:00-04:00", 1, 0),
+            ("2025-03-10T08:00:00-04:00", 1, 0),
+            ("2025-03-31T20:00:00-04:00", 1, 0),
+        ])
+        self.assertEqual(self.get_general(tz='America/New_York'), [
+            ("2025-03-08", 1, 0), ("2025-03-09", 1, 1), ("2025-03-10", 1, 0), ("2025-03-31", 1, 0),
+        ])
+        self.assertEqual(self.get_general(granularity='month', tz='Europe/Moscow'), [
+            ("2025-03-01", 3, 1), ("2025-04-01", 1, 0),
+        ])
+
+    def test_repeated_hour_after_dst_ends(self) -> None:
+        """Проверяет, что час, повторяющийся при переходе на зимнее время, даёт два интервала и две страницы."""
+        for hour in (5, 6):  # 01:30 EDT и 01:30 EST 2025-11-02
+            Log.objects.using('logs_db').create(
+                datetime=datetime.datetime(2025, 11, 2, hour, 30, tzinfo=datetime.UTC), user_id=self.user.id,
+                space_type=SpaceType.objects.using('logs_db').get(name="global"),
+                event_type=EventType.objects.using('logs_db').get(name="login"),
+            )
+        params = {'granularity': 'hour', 'tz': 'America/New_York', 'from': '2025-11-01'}
+        self.assertEqual(self.get_general(**params), [
+            ("2025-11-02T01:00:00-04:00", 1, 0), ("2025-11-02T01:00:00-05:00", 1, 0),
+        ])
+
+        response = self.client.get(reverse('general-api'), {'login': 'ChillGuy', **params, 'limit': 1})
+        second = self.client.get(response.data["next"])
+        self.assertEqual(second.data["results"][0]["date"], "2025-11-02T01:00:00-05:00")
+        self.assertIsNone(second.data["next"])
+
+    def test_hour_pages_cover_dataset(self) -> None:
+        """Проверяет, что страницы почасового general совпадают с полным датасетом."""
+        params = {'login': 'ChillGuy', 'granularity': 'hour', 'tz': 'America/New_York'}
+        full = self.client.get(reverse('general-api'), params).data
+        response = self.client.get(reverse('general-api'), {**params, 'limit': 2})
+        pages = list(response.data["results"])
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            pages.extend(response.data["results"])
+
+        self.assertEqual(pages, full)
+
+    def test_invalid_params(self) -> None:
+        """Проверяет ошибку 400 для неизвестных интервала и часового пояса."""
+        for params in ({'granularity': 'year'}, {'tz': 'Mars/Olympus'}):
+            response = self.client.get(reverse('general-api'), {'login': 'ChillGuy', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DimensionCacheTestCase(TestCase):
+    """
+    Тесты для кэша справочников.
+
+    Проверяет, что повторные запросы к датасетам не обращаются к справочникам типов и пользователей,
+    кэширование промахов по логину и сброс записей при изменении пользователя.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        """Сбрасывает кэши и создаёт пользователя."""
+        dataset_cache.clear()
+        dimensions.refresh()
+        self.user = User.objects.create(login="ChillGuy", email="ChillGuy@example.com")
+
+    def test_lookups_are_served_from_cache(self) -> None:
+        """Проверяет, что после первого запроса справочники и логин не запрашиваются из базы."""
+        dimensions.preload()
+        dimensions.user_id("ChillGuy")
+        dataset_cache.clear()
+
+        with self.assertNumQueries(0, using='blogs_db'), CaptureQueriesContext(connections['logs_db']) as queries:
+            response = self.client.get(reverse('general-api'), {'login': 'ChillGuy'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if 'FROM "event_type"' in query['sql']
+                          or 'FROM "space_type"' in query['sql']])
+        self.assertEqual(dimensions.event_type_id("comment"), EventType.objects.using('logs_db').get(name="comment").id)
+
+    def test_types_invalidated_during_lookup(self) -> None:
+        """Проверяет, что сброс справочников сразу после их загрузки не ломает текущее обращение."""
+        preload = dimensions.preload
+
+        def preload_then_invalidate():
+            types = preload()
+            dimensions.invalidate_types()
+            return types
+
+        with patch.object(dimensions, 'preload', side_effect=preload_then_invalidate):
+            event_type_id = dimensions.event_type_id("comment")
+            space_type_id = dimensions.space_type_id("post")
+
+        self.assertEqual(event_type_id, EventType.objects.using('logs_db').get(name="comment").id)
+        self.assertEqual(space_type_id, SpaceType.objects.using('logs_db').get(name="post").id)
+
+    def test_unknown_login_is_negatively_cached(self) -> None:
+        """Проверяет, что промах по логину кэшируется и сбрасывается при создании пользователя."""
+        with self.assertRaises(User.DoesNotExist):
+            dimensions.user_id("NewGuy")
+        with self.assertNumQueries(0, using='blogs_db'), self.assertRaises(User.DoesNotExist):
+            dimensions.user_id("NewGuy")
+
+        user = User.objects.create(login="NewGuy", email="NewGuy@example.com")
+        self.assertEqual(dimensions.user_id("NewGuy"), user.id)
+
+    def test_renamed_user_drops_old_login(self) -> None:
+        """Проверяет, что после смены логина прежний логин больше не разрешается."""
+        self.assertEqual(dimensions.user_id("ChillGuy"), self.user.id)
+        self.user.login = "CoolGuy"
+        self.user.save()
+
+        self.assertEqual(dimensions.user_id("CoolGuy"), self.user.id)
+        with self.assertRaises(User.DoesNotExist):
+            dimensions.user_id("ChillGuy")
+
+
+class LoginAutocompleteTestCase(APITestCase):
+    """
+    Тесты для автодополнения логина и формы на главной странице.
+
+    Проверяет поиск по началу логина, постраничную выдачу, отсутствие списка всех логинов
+    в разметке страницы и проверку введённого логина.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        """Создаёт пользователей с общим началом логина."""
+        for index in range(3):
+            User.objects.create(login=f"ChillGuy{index}", email=f"ChillGuy{index}@example.com")
+
+    def test_prefix_search(self) -> None:
+        """Проверяет, что возвращаются только логины с заданным началом в формате Select2."""
+        response = self.client.get(reverse('login-autocomplete'), {'term': 'ChillGuy'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            "results": [{"id": f"ChillGuy{index}", "text": f"ChillGuy{index}"} for index in range(3)],
+            "more": False,
+        })
+
+    def test_pagination(self) -> None:
+        """Проверяет, что выдача ограничена размером страницы и следующая страница продолжает список."""
+        self.assertEqual(search_logins("Chill", page=1, page_size=2), (["ChillGuy0", "ChillGuy1"], True))
+        self.assertEqual(search_logins("Chill", page=2, page_size=2), (["ChillGuy2"], False))
+
+    def test_index_page_does_not_render_all_logins(self) -> None:
+        """Проверяет, что страница не содержит вариантов для всех пользователей."""
+        response = self.client.get('/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotContains(response, "ChillGuy0")
+        self.assertContains(response, reverse('login-autocomplete'))
+
+    def test_form_validates_login(self) -> None:
+        """Проверяет, что существующий логин принимается, а несуществующий — нет."""
+        self.assertTrue(InputUserLogin({"input_login": "ChillGuy1"}).is_valid())
+        self.assertFalse(InputUserLogin({"input_login": "NotUser"}).is_valid())
+
+
+class AsyncDatasetViewsTestCase(TestCase):
+    """
+    Тесты для асинхронных вариантов эндпоинтов и главной страницы.
+
+    Асинхронные представления читают базы данных из отдельных потоков, которые не видят
+    незафиксированные данные тестовой транзакции, поэтому тесты используют пользователя `user1`
+    из поставляемых баз данных и сравнивают ответы с синхронными эндпоинтами.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        """Очищает кэш датасетов, чтобы ответы вычислялись заново."""
+        dataset_cache.clear()
+
+    async def test_async_endpoints_match_sync(self) -> None:
+        """Проверяет, что асинхронные comments и general возвращают те же данные, что и синхронные."""
+        for sync_name, async_name in (('comments-api', 'comments-async-api'), ('general-api', 'general-async-api')):
+            expected = await sync_to_async(self.client.get)(reverse(sync_name), {'login': 'user1'})
+            dataset_cache.clear()
+            response = await self.async_client.get(reverse(async_name), {'login': 'user1'})
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.json())
+            self.assertEqual(response.json(), expected.json())
+
+            page = await self.async_client.get(reverse(async_name), {'login': 'user1', 'limit': 1})
+            self.assertEqual(page.json()["results"], expected.json()[:1])
+            self.assertIn(reverse(async_name), page.json()["next"])
+
+    async def test_async_endpoint_errors(self) -> None:
+        """Проверяет ответы асинхронного эндпоинта без логина и с неверным курсором."""
+        response = await self.async_client.get(reverse('comments-async-api'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'error': 'Login is required'})
+
+        response = await self.async_client.get(reverse('general-async-api'), {'login': 'user1', 'cursor': '!'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    async def test_pooled_work_closes_old_connections(self) -> None:
+        """Проверяет, что работа в пулах потоков закрывает устаревшие соединения потока до и после себя."""
+        with patch('UserActions.services.close_old_connections') as close_old:
+            self.assertEqual(await run_in_thread(abs, -1), 1)
+            self.assertEqual(close_old.call_count, 2)
+            self.assertEqual(await sync_to_async(scatter)(abs, [-1, -2]), [1, 2])
+            self.assertEqual(close_old.call_count, 6)
+
+    async def test_async_index_renders_both_datasets(self) -> None:
+        """Проверяет, что асинхронная главная страница отображает оба датасета."""
+        response = await self.async_client.post(reverse('index-async'), {'input_login': 'user1'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.context["comment_data"])
+        self.assertTrue(response.context["general_data"])
+
+
+class SQLiteProfileTestCase(TestCase):
+    """Тесты для профиля SQLite, применяемого к соединениям с базами данных."""
+    databases = ['default', 'logs_db', 'blogs_db']
+
+    def test_profile_pragmas_are_applied(self) -> None:
+        """Проверяет, что PRAGMA из `SQLITE_PROFILES` действуют на соединениях каждой базы."""
+        for alias, profile in settings.SQLITE_PROFILES.items():
+            with connections[alias].cursor() as cursor:
+                for name in ('journal_mode', 'cache_size', 'mmap_size'):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(str(cursor.fetchone()[0]).lower(), str(profile[name]).lower(), (alias, name))
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], {'NORMAL': 1, 'FULL': 2}[profile['synchronous']])
+                cursor.execute('PRAGMA temp_store')
+                self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def test_tracked_databases_keep_rollback_journal(self) -> None:
+        """Проверяет, что без SQLITE_WAL=1 соединения не переводят файлы баз из репозитория в режим WAL."""
+        if settings.SQLITE_WAL:
+            self.skipTest("SQLITE_WAL=1")
+        for alias in ('blogs_db', 'logs_db'):
+            with open(settings.DATABASES[alias]['NAME'], 'rb') as file:
+                header = file.read(20)
+            self.assertEqual(header[18:20], bytes([1, 1]), alias)  # версии записи и чтения файла: 1 — журнал отката
+
+
+@override_settings(DATABASE_REPLICAS={'logs_db': ['logs_db_replica1', 'logs_db_replica2'], 'blogs_db': []})
+class ReadReplicaRoutingTestCase(TestCase):
+    """
+    Тесты для маршрутизации чтения по репликам.
+
+    Проверяет выбор одной реплики на запрос, возврат чтений на основную базу после записи,
+    запрет миграций для реплик и работу без настроенных реплик.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def test_reads_stick_to_one_replica_within_request(self) -> None:
+        """Проверяет, что в пределах контекста все чтения идут в одну реплику."""
+        with routing_context():
+            chosen = {LogsDBRouter().db_for_read(Log) for _ in range(20)}
+        self.assertEqual(len(chosen), 1)
+        self.assertIn(chosen.pop(), ['logs_db_replica1', 'logs_db_replica2'])
+        self.assertEqual(BlogsDBRouter().db_for_read(Post), 'blogs_db')
+
+    def test_write_pins_reads_to_primary(self) -> None:
+        """Проверяет, что после записи (в том числе с явным using) чтения идут в основную базу."""
+        with routing_context():
+            self.assertNotEqual(read_db('logs_db'), 'logs_db')
+            Log.objects.using('logs_db').create(
+                datetime=now(), user_id=0,
+                event_type=EventType.objects.using('logs_db').get(name="login"),
+                space_type=SpaceType.objects.using('logs_db').get(name="global"),
+            )
+            self.assertEqual(read_db('logs_db'), 'logs_db')
+            self.assertEqual(LogsDBRouter().db_for_write(Log), 'logs_db')
+        with routing_context():
+            self.assertNotEqual(read_db('logs_db'), 'logs_db')
+
+    def test_replicas_refuse_migrations(self) -> None:
+        """Проверяет, что миграции в реплики запрещены для любых приложений."""
+        self.assertFalse(LogsDBRouter().allow_migrate('logs_db_replica1', 'auth'))
+        self.assertIsNone(LogsDBRouter().allow_migrate('default', 'auth'))
+
+    @override_settings(DATABASE_REPLICAS={})
+    def test_without_replicas_reads_primary(self) -> None:
+        """Проверяет, что без настроенных реплик чтения идут в основную базу."""
+        with routing_context():
+            self.assertEqual(read_db('logs_db'), 'logs_db')
+
+
+class LogPartitionTestCase(SimpleTestCase):
+    """
+    Тесты для помесячных партиций логов.
+
+    Проверяет слияние агрегатов 'logs_db' и партиций, отбор партиций по периоду
+    и перенос месяца из копии базы логов в партицию. Партиции и копия базы логов
+    создаются во временном каталоге и регистрируются на время работы класса;
+    перенос подключает файл партиции через ATTACH, что невозможно внутри транзакции
+    `TestCase`, поэтому 'logs_db' и 'blogs_db' здесь только читаются.
+    """
+    databases = ['logs_db', 'blogs_db']
+    temp_aliases = ['partition_source', 'logs_2024_01', 'logs_2025_03']
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.directory = Path(cls.temp_dir.name)
+        connections.settings['partition_source'] = {
+            **copy.deepcopy(connections.settings['logs_db']),
+            'NAME': cls.directory / 'source.sqlite3',
+        }
+        connections.settings['partition_source']['TEST']['MIRROR'] = 'partition_source'
+        for alias in ('logs_2024_01', 'logs_2025_03'):
+            register_partition(alias, cls.directory / f"{alias}.sqlite3")
+        cls.databases = [*cls.databases, *cls.temp_aliases]
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        for alias in cls.temp_aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.temp_dir.cleanup()
+
+    def setUp(self) -> None:
+        self.user_id = dimensions.user_id('user1')
+        self.comment_id = dimensions.event_type_id('comment')
+        self.post_type_id = dimensions.space_type_id('post')
+        for month in (datetime.date(2024, 1, 1), datetime.date(2025, 3, 1)):
+            alias = create_partition(month, self.directory)
+            self.addCleanup(lambda alias=alias: connections[alias].cursor().execute('DELETE FROM "logs"'))
+
+    def test_comment_counts_merge_partitions(self) -> None:
+        """Проверяет, что комментарии из партиции суммируются с 'logs_db' по id поста."""
+        current = list(comments_queryset(self.user_id))
+        space_id = current[0]['space_id']
+        with connections['logs_2024_01'].cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO "logs" ("datetime", "user_id", "space_type_id", "event_type_id", "space_id") '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [('2024-01-10 12:00:00', self.user_id, self.post_type_id, self.comment_id, space_id),
+                 ('2024-01-11 12:00:00', self.user_id, self.post_type_id, self.comment_id, 999999)],
+            )
+
+        merged = list(iter_comment_counts(self.user_id))
+        self.assertEqual(merged[0], {'space_id': space_id, 'comments_count': current[0]['comments_count'] + 1})
+        self.assertEqual(merged[1:-1], current[1:])
+        self.assertEqual(merged[-1], {'space_id': 999999, 'comments_count': 1})
+
+        march = DatasetFilters(date_from=datetime.datetime(2025, 3, 1, tzinfo=datetime.UTC))
+        self.assertEqual(partitions_for_period(march.date_from), ['logs_2025_03'])
+        self.assertEqual(list(iter_comment_counts(self.user_id, march)), list(comments_queryset(self.user_id, march)))
+
+    def test_partition_created_by_another_process_is_discovered(self) -> None:
+        """Проверяет, что файл партиции, созданный в обход процесса, находится при чтении без перезапуска."""
+        directory = self.directory / 'discovered'
+        directory.mkdir()
+        self.assertEqual(discover_partitions(directory), [])
+        self.addCleanup(lambda: connections.settings.pop('logs_2023_05', None))
+
+        partition = sqlite3.connect(directory / 'logs_2023_05.sqlite3')
+        try:
+            partition.execute(PARTITION_TABLE_SQL)
+        finally:
+            partition.close()
+
+        with override_settings(LOG_PARTITIONS_DIR=directory):
+            may = datetime.datetime(2023, 5, 1, tzinfo=datetime.UTC)
+            self.assertEqual(partitions_for_period(may, may + datetime.timedelta(days=31)), ['logs_2023_05'])
+        self.assertEqual(connections.settings['logs_2023_05']['NAME'], directory / 'logs_2023_05.sqlite3')
+        self.assertEqual(discover_partitions(directory), [])
+
+    def test_move_month(self) -> None:
+        """Проверяет перенос логов месяца из копии базы логов в партицию."""
+        connections['partition_source'].close()
+        source = sqlite3.connect(settings.DATABASES['logs_db']['NAME'])
+        target = sqlite3.connect(self.directory / 'source.sqlite3')
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        march = Log.objects.using('partition_source').filter(datetime__startswith='2025-03')
+        expected = march.count()
+        create_rollup_tables('partition_source')
+        refresh_rollups('partition_source')
+        rollup = list(DailyActivity.objects.using('partition_source').order_by('user_id', 'date').values())
+
+        moved = move_month(datetime.date(2025, 3, 1), 'partition_source', directory=self.directory)
+
+        self.assertGreater(moved, 0)
+        self.assertEqual(moved, expected)
+        self.assertFalse(march.exists())
+        self.assertEqual(Log.objects.using('logs_2025_03').count(), expected)
+        self.assertTrue(is_partition('logs_2025_03'))
+        self.assertEqual(list(DailyActivity.objects.using('partition_source').order_by('user_id', 'date').values()), rollup)
+        self.assertTrue(rollups_available('partition_source'))
+
+
+@override_settings(LOG_SHARDS=['shard_source', 'shard_target'])
+class LogShardingTestCase(SimpleTestCase):
+    """
+    Тесты для шардирования логов по пользователям.
+
+    Шард 'shard_source' — копия базы логов, 'shard_target' — пустой шард; оба создаются во временном
+    каталоге. Перед каждым тестом все пользователи закрепляются за 'shard_source'. Перенос подключает
+    шард через ATTACH, поэтому, как и в `LogPartitionTestCase`, транзакции `TestCase` не используются.
+    """
+    databases = ['default', 'logs_db', 'blogs_db']
+    temp_aliases = ['shard_source', 'shard_target']
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.directory = Path(cls.temp_dir.name)
+        for alias in cls.temp_aliases:
+            connections.settings[alias] = {
+                **copy.deepcopy(connections.settings['logs_db']),
+                'NAME': cls.directory / f"{alias}.sqlite3",
+            }
+            connections.settings[alias]['TEST']['MIRROR'] = alias
+        cls.databases = [*cls.databases, *cls.temp_aliases]
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        for alias in cls.temp_aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.temp_dir.cleanup()
+
+    def setUp(self) -> None:
+        for alias in self.temp_aliases:
+            connections[alias].close()
+            (self.directory / f"{alias}.sqlite3").unlink(missing_ok=True)
+        source = sqlite3.connect(settings.DATABASES['logs_db']['NAME'])
+        target = sqlite3.connect(self.directory / 'shard_source.sqlite3')
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        prepare_shard('shard_target')
+        self.assertEqual(pin_users(), 5)
+        self.addCleanup(LogShardOverride.objects.using('default').all().delete)
+        self.user_id = dimensions.user_id('user1')
+
+    def test_shard_for_uses_overrides_and_hash(self) -> None:
+        """Проверяет, что назначение имеет приоритет над шардом по остатку от деления id."""
+        self.assertEqual(shard_map.shard_for(self.user_id), 'shard_source')
+        LogShardOverride.objects.using('default').filter(user_id=self.user_id).delete()
+        self.assertEqual(shard_map.shard_for(self.user_id), hash_shard(self.user_id))
+        self.assertEqual(
+            shard_map.group_by_shard([2, 4]), {'shard_source': [2, 4]},
+        )
+
+    def test_new_log_is_written_to_user_shard(self) -> None:
+        """Проверяет, что новый лог записывается в шард пользователя с id из диапазона шарда."""
+        set_override(self.user_id, 'shard_target')
+        log = Log(
+            datetime=now(), user_id=self.user_id,
+            event_type_id=dimensions.event_type_id('login'), space_type_id=dimensions.space_type_id('global'),
+        )
+        self.assertEqual(LogsDBRouter().db_for_write(Log, instance=log), 'shard_target')
+        log.save()
+        self.assertEqual(log._state.db, 'shard_target')
+        self.assertGreater(log.id, ID_BLOCK)
+        self.assertEqual(LogsDBRouter().db_for_write(Log, instance=log), 'shard_target')
+
+    def test_orm_queries_without_using_are_routed_to_user_shard(self) -> None:
+        """Проверяет, что чтение по user_id, create и bulk_create без `.using()` обращаются к шарду пользователя."""
+        set_override(self.user_id, 'shard_target')
+        other_id = dimensions.user_id('user2')
+        fields = {'event_type_id': dimensions.event_type_id('login'), 'space_type_id': dimensions.space_type_id('global'),
+                  'space_id': 0}
+
+        created = Log.objects.create(datetime=now(), user_id=self.user_id, **fields)
+        logs = Log.objects.bulk_create([
+            Log(datetime=now(), user_id=self.user_id, **fields), Log(datetime=now(), user_id=other_id, **fields),
+        ])
+
+        self.assertEqual(created._state.db, 'shard_target')
+        self.assertEqual([log._state.db for log in logs], ['shard_target', 'shard_source'])
+        self.assertEqual(Log.objects.filter(user_id=self.user_id).db, 'shard_target')
+        self.assertEqual(Log.objects.filter(user_id=self.user_id).count(), 2)
+        self.assertEqual(Log.objects.filter(user_id=self.user_id).delete()[0], 2)
+        self.assertEqual(Log.objects.using('shard_target').count(), 0)
+        self.assertEqual(Log.objects.filter(user_id=other_id).db, 'shard_source')
+
+    def test_move_user_keeps_datasets(self) -> None:
+        """Проверяет, что после переноса пользователя датасеты, в том числе пакетный, не меняются."""
+        logins = ['user1', 'user2', 'user3', 'user4', 'user5']
+        comments = list(iter_comment_counts(self.user_id))
+        general = general_rows(self.user_id)
+        batch = build_batch_datasets(logins, ['comments', 'general'])
+        expected = Log.objects.using('shard_source').filter(user_id=self.user_id).count()
+
+        moved = move_user(self.user_id, 'shard_target', batch_size=5, settle=0)
+
+        self.assertEqual(moved, expected)
+        self.assertFalse(Log.objects.using('shard_source').filter(user_id=self.user_id).exists())
+        self.assertEqual(Log.objects.using('shard_target').filter(user_id=self.user_id).count(), expected)
+        self.assertEqual(shard_map.shard_for(self.user_id), 'shard_target')
+        self.assertEqual(list(iter_comment_counts(self.user_id)), comments)
+        self.assertEqual(general_rows(self.user_id), general)
+        self.assertEqual(build_batch_datasets(logins, ['comments', 'general']), batch)
+
+
+class IngestLogsAPITestCase(APITestCase):
+    """
+    Тесты для эндпоинта пакетной записи логов.
+
+    Проверяет запись JSON-массива и NDJSON, отчёт о принятых и отклонённых событиях
+    и запрет записи без права `logs.add_log`.
+    """
+    databases = ['default', 'logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        self.url = reverse('ingest-logs')
+        self.client.force_authenticate(get_user_model().objects.create_superuser('ingest', 'ingest@example.com', 'x'))
+        self.user_id = dimensions.user_id('user1')
+        self.logs = Log.objects.using('logs_db').filter(user_id=self.user_id)
+        self.initial = self.logs.count()
+
+    def test_ingest_json_array(self) -> None:
+        """Проверяет запись массива событий и отклонение неверных событий с их номерами."""
+        events = [
+            {"datetime": "2025-04-01T10:00:00Z", "login": "user1", "event_type": "login", "space_type": "global"},
+            {"datetime": "2025-04-01T10:05:00", "user_id": self.user_id, "event_type": "comment",
+             "space_type": "post", "space_id": 1},
+            {"datetime": "2025-04-01T10:06:00", "login": "no_such_user", "event_type": "login", "space_type": "global"},
+            {"datetime": "yesterday", "user_id": self.user_id, "event_type": "login", "space_type": "global"},
+            {"datetime": "2025-04-01T10:07:00", "user_id": self.user_id, "event_type": "dance", "space_type": "global"},
+        ]
+        response = self.client.post(f"{self.url}?batch_size=2", events, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["accepted"], 2)
+        self.assertEqual(response.data["rejected"], 3)
+        self.assertEqual(len(response.data["batches"]), 3)
+        self.assertEqual(response.data["batches"][1]["errors"], [
+            {"index": 2, "error": "Unknown login"}, {"index": 3, "error": "Invalid datetime"},
+        ])
+        self.assertEqual(self.logs.count(), self.initial + 2)
+        self.assertTrue(self.logs.filter(
+            datetime=datetime.datetime(2025, 4, 1, 10, tzinfo=datetime.UTC), event_type__name='login'
+        ).exists())
+
+    def test_ingest_ndjson(self) -> None:
+        """Проверяет запись NDJSON: пустые строки пропускаются, строка с неверным JSON отклоняется."""
+        body = (
+            '{"datetime": "2025-04-02T08:00:00Z", "login": "user1", "event_type": "logout", "space_type": "global"}\n'
+            '\n'
+            '{"datetime": "2025-04-02T08:01:00Z", "login": \n'
+        )
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["accepted"], response.data["rejected"]), (1, 1))
+        self.assertEqual(response.data["batches"][0]["errors"], [{"index": 1, "error": "Invalid JSON"}])
+        self.assertEqual(self.logs.count(), self.initial + 1)
+
+    def test_ingest_requires_permission(self) -> None:
+        """Проверяет, что без права logs.add_log запись запрещена, а тело-объект отклоняется."""
+        response = self.client.post(self.url, {"events": []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(None)
+        response = self.client.post(self.url, [], format='json')
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_ingest_buffered(self) -> None:
+        """Проверяет постановку событий в очередь фоновой записи и ответ 503 при заполненной очереди."""
+        events = [{"datetime": "2025-04-03T09:00:00Z", "login": "user1", "event_type": "login", "space_type": "global"}] * 3
+        with patch('UserActions.views.log_writer') as writer:
+            response = self.client.post(f"{self.url}?buffered=1", events, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data, {"queued": 3})
+            self.assertEqual(writer.write.call_count, 3)
+
+            writer.write.side_effect = [None, LogWriterFull("Log writer queue is full")]
+            response = self.client.post(f"{self.url}?buffered=1", events, format='json')
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response.data["queued"], 1)
+            self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(self.logs.count(), self.initial)
+
+
+class BufferedLogWriterTestCase(SimpleTestCase):
+    """
+    Тесты для буферизованной записи логов.
+
+    Запись в базу подменяется функцией, запоминающей пачки, поэтому проверяются условия
+    отправки пачек, ограничение очереди и запись остатка при остановке.
+    """
+
+    def make_writer(self, flush_batch=None, **options) -> BufferedLogWriter:
+        self.batches = []
+
+        def record(batch: list) -> BatchReport:
+            self.batches.append(batch)
+            return BatchReport(accepted=len(batch))
+
+        options = {"max_queue": 100, "batch_size": 100, "flush_interval": 10, "put_timeout": 0.01, **options}
+        writer = BufferedLogWriter(flush_batch=flush_batch or record, **options)
+        self.addCleanup(writer.close, 5)
+        return writer
+
+    def test_flush_by_size_and_time(self) -> None:
+        """Проверяет, что пачка уходит при наборе batch_size событий и по истечении flush_interval."""
+        writer = self.make_writer(batch_size=3)
+        for number in range(3):
+            writer.write({"number": number})
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(self.batches, [[{"number": 0}, {"number": 1}, {"number": 2}]])
+
+        writer.flush_interval = 0.05
+        writer.write({"number": 3})
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(self.batches[-1], [{"number": 3}])
+        self.assertEqual(writer.stats()["written"], 4)
+
+    def test_backpressure_when_queue_is_full(self) -> None:
+        """Проверяет отказ в записи при заполненной очереди и учёт не принятых событий."""
+        started, release = threading.Event(), threading.Event()
+
+        def slow_flush(batch: list) -> BatchReport:
+            started.set()
+            release.wait(5)
+            return BatchReport(accepted=len(batch))
+
+        writer = self.make_writer(slow_flush, max_queue=1, batch_size=1)
+        writer.write({"number": 0})
+        self.assertTrue(started.wait(5))
+        writer.write({"number": 1})
+        with self.assertRaises(LogWriterFull):
+            writer.write({"number": 2})
+        self.assertEqual(writer.stats()["queue_depth"], 1)
+
+        release.set()
+        self.assertTrue(writer.close(5))
+        stats = writer.stats()
+        self.assertEqual((stats["written"], stats["dropped"], stats["queue_depth"]), (2, 1, 0))
+        with self.assertRaises(LogWriterFull):
+            writer.write({"number": 3})
+
+    def test_close_writes_remaining_events(self) -> None:
+        """Проверяет, что остановка записывает события, не дожидаясь flush_interval, а ошибка записи учитывается."""
+        def failing_flush(batch: list) -> BatchReport:
+            raise DatabaseError("disk I/O error")
+
+        writer = self.make_writer()
+        writer.write({"number": 0})
+        writer.write({"number": 1})
+        self.assertTrue(writer.close(5))
+        self.assertEqual(self.batches, [[{"number": 0}, {"number": 1}]])
+
+        writer = self.make_writer(failing_flush)
+        writer.write({"number": 0})
+        self.assertTrue(writer.close(5))
+        stats = writer.stats()
+        self.assertEqual((stats["rejected"], stats["failed_flushes"]), (1, 1))
+        self.assertEqual(stats["last_error"], "DatabaseError: disk I/O error")
+
+
+class MetricsTestCase(APITestCase):
+    """
+    Тесты для метрик процесса и эндпоинта `/metrics`.
+
+    Проверяет текстовый формат гистограмм, потокобезопасность счётчиков и учёт времени,
+    размера ответов и SQL-запросов по представлениям и базам данных, в том числе для CSV.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        dataset_cache.clear()
+        metrics_registry.clear()
+
+    def test_histogram_format(self) -> None:
+        """Проверяет накопительные корзины, сумму, количество и экранирование меток."""
+        registry = MetricsRegistry(latency_buckets=(0.1, 1), size_buckets=(10,))
+        for seconds in (0.05, 0.5, 2):
+            registry.record_request('view"1', 'GET', 200, seconds, None, {})
+        text = registry.render()
+
+        self.assertIn('http_request_duration_seconds_bucket{view="view\\"1",method="GET",status="200",le="0.1"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="view\\"1",method="GET",status="200",le="1.0"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="view\\"1",method="GET",status="200",le="+Inf"} 3', text)
+        self.assertIn('http_request_duration_seconds_count{view="view\\"1",method="GET",status="200"} 3', text)
+        self.assertIn("# TYPE db_queries_total counter", text)
+
+    def test_concurrent_updates(self) -> None:
+        """Проверяет, что обновления из нескольких потоков не теряются."""
+        registry = MetricsRegistry()
+
+        def record() -> None:
+            for _ in range(1000):
+                registry.record_query('logs_db', 0.001)
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIn('db_queries_total{alias="logs_db"} 8000\n', registry.render())
+
+    def test_endpoint_reports_views_and_aliases(self) -> None:
+        """Проверяет время, размер ответа и SQL-запросы представления в ответе `/metrics`."""
+        response = self.client.get(reverse('comments-api'), {'login': 'user1'})
+        csv_response = self.client.get(reverse("download_csv", args=["user1", "comments"]))
+        csv_size = len(b"".join(csv_response.streaming_content))
+
+        response = self.client.get(reverse('metrics'))
+        text = response.content.decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('http_request_duration_seconds_count{view="comments-api",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_db_queries_total{view="comments-api",alias="logs_db"}', text)
+        self.assertIn('http_request_db_queries_total{view="download_csv",alias="logs_db"}', text)
+        self.assertIn(f'http_response_size_bytes_sum{{view="download_csv"}} {float(csv_size)!r}', text)
+        self.assertIn('db_queries_total{alias="logs_db"}', text)
+
+    @override_settings(METRICS={'ENABLED': False})
+    def test_disabled(self) -> None:
+        """Проверяет, что при отключённых метриках эндпоинт возвращает 404, а запросы не учитываются."""
+        self.client.get(reverse('comments-api'), {'login': 'user1'})
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('view="comments-api"', metrics_registry.render())
+
+
+class SlowQueryLogTestCase(APITestCase):
+    """
+    Тесты для журнала медленных SQL-запросов и команды `slow_queries`.
+
+    Проверяет запись запроса с параметрами, представлением и планом, порог времени,
+    подключение записи только к отслеживаемым базам и рекомендации индексов для полных просмотров.
+    """
+    databases = ['logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        dataset_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = SlowQueryLog(Path(directory.name) / 'slow.jsonl', threshold_ms=0)
+        patcher = patch('UserActions.slow_queries.slow_query_log', self.log)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, func: Callable) -> list[dict]:
+        """Выполняет функцию с записью всех запросов к 'logs_db' и 'blogs_db' и возвращает записи журнала."""
+        with connections['logs_db'].execute_wrapper(record_slow_queries), \
+                connections['blogs_db'].execute_wrapper(record_slow_queries):
+            func()
+        return list(self.log.read())
+
+    def test_records_view_params_and_plan(self) -> None:
+        """Проверяет, что запрос записывается с параметрами, представлением и планом EXPLAIN QUERY PLAN."""
+        user_id = dimensions.user_id('user1')
+        entries = self.record(lambda: self.client.get(reverse('comments-api'), {'login': 'user1'}))
+        entry = next(entry for entry in entries if 'GROUP BY "logs"."space_id"' in entry["sql"])
+
+        self.assertEqual((entry["alias"], entry["view"]), ('logs_db', 'comments-api'))
+        self.assertIn(user_id, entry["params"])
+        self.assertTrue(entry["plan"])
+        self.assertIsNone(entry["error"])
+
+    def test_threshold_and_watched_databases(self) -> None:
+        """Проверяет, что быстрые запросы не записываются, а запись подключается только к отслеживаемым базам."""
+        self.log.threshold_ms = 60_000
+        self.assertEqual(self.record(lambda: Log.objects.using('logs_db').count()), [])
+
+        for alias, enabled, installed in (('logs_db', True, True), ('default', True, False), ('logs_db', False, False)):
+            self.log.enabled = enabled
+            connection = Mock(alias=alias, execute_wrappers=[])
+            install_slow_query_recorder(connection)
+            self.assertEqual(record_slow_queries in connection.execute_wrappers, installed)
+
+    def test_index_advice(self) -> None:
+        """Проверяет выбор объявленного индекса по условиям запроса и предложение нового индекса."""
+        comments_sql = comments_queryset(1).query.sql_with_params()[0]
+        general_sql = general_queryset(1).query.sql_with_params()[0]
+
+        self.assertEqual(advise_index(comments_sql, 'logs', 'logs_db').name, 'logs_user_event_space_idx')
+        self.assertEqual(advise_index(general_sql, 'logs', 'logs_db').name, 'logs_user_datetime_idx')
+        self.assertEqual(
+            advise_index('SELECT * FROM "Post" WHERE "Post"."header" = %s', 'Post', 'blogs_db').columns, ('header',),
+        )
+
+    def test_report_flags_full_scans(self) -> None:
+        """Проверяет, что сводка отмечает полный просмотр logs и предлагает индекс."""
+        self.record(lambda: Log.objects.using('logs_db').filter(space_id=1).count())
+        self.record(lambda: Log.objects.using('logs_db').filter(space_id=2).count())
+        out = StringIO()
+        call_command('slow_queries', path=str(self.log.path), stdout=out)
+
+        self.assertIn('2 ×', out.getvalue())
+        self.assertIn('Полный просмотр таблицы logs', out.getvalue())
+        self.assertIn('"logs_space_id_idx" ON "logs" ("space_id")', out.getvalue())
+
+
+class ProfilingTestCase(APITestCase):
+    """
+    Тесты для профилирования запросов сотрудников и эндпоинтов `/api/profiles/`.
+
+    Проверяет, что профилируются только запросы сотрудников с заголовком `X-Profile` или параметром `profile`,
+    что профиль cProfile читается `pstats`, а сэмплирующий профиль — свёрнутые стеки, и что профили
+    доступны по id запроса (X-Request-ID) в индексе и по ссылке на скачивание.
+    """
+    databases = ['default', 'logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        dataset_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = ProfileStore(directory.name, max_profiles=2)
+        for target in ('UserActions.middleware.profile_store', 'UserActions.views.profile_store'):
+            patcher = patch(target, self.store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.staff = get_user_model().objects.create_superuser('profiler', 'profiler@example.com', 'x')
+
+    def test_only_staff_requests_are_profiled(self) -> None:
+        """Проверяет, что без флага и для пользователей без is_staff профиль не снимается."""
+        self.client.get(reverse('comments-api'), {'login': 'user1'}, HTTP_X_PROFILE='cprofile')
+        self.client.force_login(get_user_model().objects.create_user('viewer', 'viewer@example.com', 'x'))
+        response = self.client.get(reverse('comments-api'), {'login': 'user1', 'profile': 'cprofile'})
+        self.client.force_login(self.staff)
+        unflagged = self.client.get(reverse('comments-api'), {'login': 'user1'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-URL', response)
+        self.assertNotIn('X-Profile-URL', unflagged)
+        self.assertEqual(self.store.entries(), [])
+
+    def test_cprofile_saved_under_request_id(self) -> None:
+        """Проверяет, что профиль cProfile сохраняется под X-Request-ID запроса и читается pstats."""
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('general-api'), {'login': 'user1'}, HTTP_X_PROFILE='cprofile', HTTP_X_REQUEST_ID='req-42',
+        )
+
+        self.assertEqual(response['X-Request-ID'], 'req-42')
+        self.assertEqual(response['X-Profile-URL'], reverse('profile-download', args=['req-42']))
+        entry, path = self.store.get('req-42')
+        self.assertEqual((entry["mode"], entry["view"], entry["status"]), ('cprofile', 'general-api', 200))
+        functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+        self.assertIn('get_general_dataset', functions)
+
+    def test_sampling_profile_of_streamed_csv(self) -> None:
+        """Проверяет, что сэмплирующий профиль потокового CSV сохраняется после отдачи ответа свёрнутыми стеками."""
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('download_csv', args=['user1', 'comments']), {'profile': 'sample'}, HTTP_X_REQUEST_ID='csv-1',
+        )
+        self.assertIsNone(self.store.get('csv-1'))
+        b''.join(response.streaming_content)
+
+        entry, path = self.store.get('csv-1')
+        self.assertEqual(entry["mode"], 'sample')
+        for line in path.read_text().splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack)
+            self.assertGreater(int(count), 0)
+
+    def test_index_download_and_retention(self) -> None:
+        """Проверяет индекс профилей, скачивание файла, удаление старых профилей и доступ только для администраторов."""
+        self.client.force_login(self.staff)
+        for request_id in ('first', 'second', 'third'):
+            self.client.get(reverse('comments-api'), {'login': 'user1', 'profile': '1'}, HTTP_X_REQUEST_ID=request_id)
+
+        index = self.client.get(reverse('profiles')).json()["profiles"]
+        self.assertEqual([entry["request_id"] for entry in index], ['third', 'second'])
+        self.assertTrue(index[0]["url"].endswith(reverse('profile-download', args=['third'])))
+        self.assertFalse((Path(self.store.directory) / 'first.prof').exists())
+
+        download = self.client.get(reverse('profile-download', args=['third']))
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment; filename="third.prof"', download['Content-Disposition'])
+        self.assertEqual(b''.join(download.streaming_content), (Path(self.store.directory) / 'third.prof').read_bytes())
+        self.assertEqual(self.client.get(reverse('profile-download', args=['first'])).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('profile-download', args=['..'])).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_overlapping_cprofile_requests(self) -> None:
+        """Проверяет, что одновременные запросы с cprofile не падают: второй профилируется в режиме sample."""
+        barrier = threading.Barrier(2, timeout=10)
+
+        def view(request: HttpRequest) -> HttpResponse:
+            barrier.wait()
+            return HttpResponse('ok')
+
+        middleware = ProfilingMiddleware(view)
+        responses = []
+
+        def profiled_request() -> None:
+            request = RequestFactory().get('/', {'profile': 'cprofile'})
+            request.user = self.staff
+            responses.append(middleware(request))
+
+        threads = [threading.Thread(target=profiled_request) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(sorted(entry["mode"] for entry in self.store.entries()), ['cprofile', 'sample'])
+
+
+@override_settings(TRACING={'ENABLED': True, 'SAMPLE_RATE': 1.0})
+class TracingTestCase(APITestCase):
+    """
+    Тесты для трассировки запросов и команды `traces`.
+
+    Проверяет вложенность спанов представления, сервисного слоя, сериализаторов, шаблона и SQL-запросов,
+    id трассы, совпадающий с X-Request-ID, сэмплирование, потоковые ответы и выгрузку для просмотрщиков трасс.
+    """
+    databases = ['default', 'logs_db', 'blogs_db']
+
+    def setUp(self) -> None:
+        dataset_cache.clear()
+        post_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.exporter = TraceExporter(Path(directory.name) / 'traces.jsonl')
+        patcher = patch('UserActions.middleware.exporter', self.exporter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def traced_request(self, func: Callable) -> list[dict]:
+        """Выполняет запрос со спанами SQL-запросов к 'logs_db' и 'blogs_db' и возвращает записанные спаны."""
+        with connections['logs_db'].execute_wrapper(trace_queries), \
+                connections['blogs_db'].execute_wrapper(trace_queries):
+            func()
+        return list(self.exporter.read())
+
+    def test_span_without_trace(self) -> None:
+        """Проверяет, что вне трассируемого запроса спан ничего не записывает."""
+        with span('outside') as args:
+            self.assertIsNone(args)
+
+        trace = Trace('manual')
+        with trace_request(trace), span('outer'), span('inner', 'db', alias='logs_db'):
+            pass
+        inner, outer = trace.events
+        self.assertEqual((inner["name"], inner["args"]["parent_id"]), ('inner', outer["args"]["span_id"]))
+        self.assertIsNone(outer["args"]["parent_id"])
+        self.assertGreaterEqual(outer["dur"], inner["dur"])
+
+    def test_user_data_view_spans(self) -> None:
+        """Проверяет спаны формы, датасетов, сериализаторов, шаблона и SQL-запросов под спаном запроса."""
+        response = None
+
+        def post() -> None:
+            nonlocal response
+            response = self.client.post('/', {'input_login': 'user1'}, HTTP_X_REQUEST_ID='trace-1')
+        events = self.traced_request(post)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({event["args"]["trace_id"] for event in events}, {'trace-1'})
+        by_name = {event["name"]: event for event in events}
+        root = by_name['POST UserActions.views.user_data_view']
+        self.assertEqual((root["cat"], root["args"]["status"]), ('http', 200))
+        for name in ('InputUserLogin', 'services.get_comments_dataset', 'services.get_general_dataset', 'render index.html'):
+            self.assertEqual(by_name[name]["args"]["parent_id"], root["args"]["span_id"])
+        serializer = by_name['CommentsSerializer(many=True)']
+        self.assertEqual(serializer["cat"], 'serializer')
+        self.assertEqual(serializer["args"]["rows"], len(response.context["comment_data"]))
+
+        span_ids = {event["args"]["span_id"] for event in events}
+        queries = [event for event in events if event["cat"] == 'db']
+        self.assertEqual({event["args"]["alias"] for event in queries}, {'logs_db', 'blogs_db'})
+        self.assertTrue(all(event["args"]["parent_id"] in span_ids for event in queries))
+
+    @override_settings(TRACING={'ENABLED': True, 'SAMPLE_RATE': 0})
+    def test_unsampled_requests_are_not_traced(self) -> None:
+        """Проверяет, что при нулевой доле сэмплирования трассы не записываются."""
+        self.assertEqual(self.traced_request(lambda: self.client.get(reverse('comments-api'), {'login': 'user1'})), [])
+
+    def test_streamed_csv_and_export(self) -> None:
+        """Проверяет, что трасса CSV записывается после отдачи ответа и выгружается командой `traces`."""
+        def download() -> None:
+            response = self.client.get(reverse('download_csv', args=['user1', 'general']), HTTP_X_REQUEST_ID='csv-1')
+            self.assertEqual(list(self.exporter.read()), [])
+            b''.join(response.streaming_content)
+        self.traced_request(download)
+        self.client.get(reverse('general-api'), {'login': 'user1'}, HTTP_X_REQUEST_ID='other')
+
+        output = Path(self.exporter.path).with_name('chrome.json')
+        call_command('traces', path=str(self.exporter.path), trace_ids=['csv-1'], output=str(output), stderr=StringIO())
+        document = json.loads(output.read_text(encoding='utf-8'))
+
+        self.assertEqual({event["args"]["trace_id"] for event in document["traceEvents"]}, {'csv-1'})
+        root = next(event for event in document["traceEvents"] if event["cat"] == 'http')
+        self.assertEqual(root["ph"], 'X')
+        self.assertTrue(any(event["cat"] == 'db' for event in document["traceEvents"]))
@@ -0,0 +1,270 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+# Текст SQL-запроса в аргументах спана обрезается до этой длины.
+MAX_SQL_LENGTH = 2000
+
+
+def tracing_enabled() -> bool:
+    """Проверяет, включена ли трассировка запросов настройкой `TRACING['ENABLED']`."""
+    return getattr(settings, 'TRACING', {}).get('ENABLED', False)
+
+
+class Trace:
+    """
+    Трасса одного HTTP-запроса: завершённые спаны в формате Trace Event (события `"ph": "X"`).
+
+    Такие события читают chrome://tracing, Perfetto и speedscope. Вложенность спанов видна по времени
+    в пределах потока (`tid`), а также по `span_id`/`parent_id` в `args`. Спаны добавляются из потока
+    запроса и из потоков пулов (`services.scatter`, `run_in_thread`), которые получают копию контекста.
+
+    Атрибуты:
+        trace_id (str): Id трассы — id HTTP-запроса (X-Request-ID, см. `metrics.RequestScope`).
+        events (list): Завершённые спаны.
+    """
+
+    def __init__(self, trace_id: str) -> None:
+        self.trace_id = trace_id
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # Время начала спанов — по монотонным часам, смещённым к времени UNIX в микросекундах.
+        self._origin_us = time.time_ns() // 1000 - time.perf_counter_ns() // 1000
+
+    def new_span_id(self) -> str:
+        """Возвращает id спана, уникальный в пределах трассы."""
+        with self._lock:
+            self._next_id += 1
+            return f"{self._next_id:x}"
+
+    def now_us(self) -> int:
+        """Возвращает текущее время в микросекундах для поля `ts` события."""
+        return self._origin_us + time.perf_counter_ns() // 1000
+
+    def add(self, name: str, category: str, started_us: int, args: dict) -> None:
+        """
+        Добавляет завершившийся спан.
+
+        Аргументы:
+            name (str): Название спана.
+            category (str): Категория: 'http', 'view', 'service', 'serializer', 'template', 'db'.
+            started_us (int): Время начала (см. `now_us`).
+            args (dict): Атрибуты спана, в том числе `span_id` и `parent_id`.
+        """
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": started_us,
+            "dur": self.now_us() - started_us,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {"trace_id": self.trace_id, **args},
+        }
+        with self._lock:
+            self.events.append(event)
+
+
+# Трасса и открытый спан, в контексте которых выполняется код (см. `trace_request` и `span`).
+_trace: ContextVar[Trace | None] = ContextVar('tracing_trace', default=None)
+_parent_span: ContextVar[str | None] = ContextVar('tracing_parent_span', default=None)
+
+
+def current_trace() -> Trace | None:
+    """Возвращает трассу текущего запроса или None, если запрос не трассируется."""
+    return _trace.get()
+
+
+@contextmanager
+def trace_request(trace: Trace, parent_id: str | None = None) -> Iterator[Trace]:
+    """
+    Делает `trace` текущей трассой в пределах блока `with`.
+
+    Аргументы:
+        trace (Trace): Трасса.
+        parent_id (str | None): Id спана, которому подчиняются спаны блока, — обычно спана HTTP-запроса.
+    """
+    token = _trace.set(trace)
+    parent_token = _parent_span.set(parent_id)
+    try:
+        yield trace
+    finally:
+        _parent_span.reset(parent_token)
+        _trace.reset(token)
+
+
+@contextmanager
+def span(name: str, category: str = 'service', **args: Any) -> Iterator[dict | None]:
+    """
+    Записывает спан вокруг блока `with`, если текущий запрос трассируется.
+
+    Без трассы блок выполняется без замеров, поэтому спаны можно оставлять в коде при любой доле сэмплирования.
+
+    Аргументы:
+        name (str): Название спана.
+        category (str): Категория спана.
+        **args: Атрибуты спана.
+
+    Возвращает:
+        dict | None: Атрибуты спана, которые можно дополнить внутри блока, или None без трассы.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    args = {"span_id": trace.new_span_id(), "parent_id": _parent_span.get(), **args}
+    token = _parent_span.set(args["span_id"])
+    started = trace.now_us()
+    try:
+        yield args
+    except BaseException as exception:
+        args["error"] = type(exception).__name__
+        raise
+    finally:
+        _parent_span.reset(token)
+        trace.add(name, category, started, args)
+
+
+def traced(name: str, category: str = 'service') -> Callable[[Callable], Callable]:
+    """
+    Декоратор, записывающий спан вокруг каждого вызова функции (см. `span`).
+
+    Аргументы:
+        name (str): Название спана.
+        category (str): Категория спана.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def sampled() -> bool:
+    """Решает, трассировать ли очередной запрос, с вероятностью `TRACING['SAMPLE_RATE']`."""
+    rate = getattr(settings, 'TRACING', {}).get('SAMPLE_RATE', 0.01)
+    return rate >= 1 or random.random() < rate
+
+
+def trace_queries(execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:
+    """
+    Обёртка выполнения SQL (`connection.execute_wrappers`), записывающая спан каждого запроса трассируемого HTTP-запроса.
+
+    Спан называется по команде и базе данных (`SELECT logs_db`); текст запроса без параметров — в `args`.
+    """
+    if _trace.get() is None:
+        return execute(sql, params, many, context)
+    alias = context['connection'].alias
+    command = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'SQL'
+    with span(f"{command} {alias}", 'db', alias=alias, sql=sql[:MAX_SQL_LENGTH], many=many):
+        return execute(sql, params, many, context)
+
+
+def install_span_recorder(connection: BaseDatabaseWrapper) -> None:
+    """
+    Добавляет `trace_queries` в обёртки выполнения SQL соединения, если трассировка включена.
+
+    Вызывается из обработчика сигнала `connection_created` (см. `UserActions.signals`).
+    """
+    if tracing_enabled() and trace_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_queries)
+
+
+class TraceExporter:
+    """
+    Файл трасс в формате JSON Lines: по строке на спан (событие Trace Event).
+
+    Команда `traces export` собирает из строк файл `{"traceEvents": [...]}` для chrome://tracing и Perfetto.
+
+    Атрибуты:
+        path (Path): Файл трасс.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'TraceExporter':
+        """Создаёт файл трасс по настройке `TRACING`."""
+        return cls(getattr(settings, 'TRACING', {}).get('PATH', Path(settings.BASE_DIR) / 'traces.jsonl'))
+
+    def export(self, trace: Trace) -> bool:
+        """
+        Дописывает спаны трассы в файл одной записью.
+
+        Возвращает:
+            bool: False, если файл недоступен.
+        """
+        lines = ''.join(json.dumps(event, ensure_ascii=False, default=str) + '\n' for event in list(trace.events))
+        try:
+            with self._lock, self.path.open('a', encoding='utf-8') as file:
+                file.write(lines)
+        except OSError:
+            # Недоступный файл трасс не должен ломать ответ на запрос.
+            return False
+        return True
+
+    def read(self, trace_ids: Iterable[str] = ()) -> Iterator[dict]:
+        """
+        Читает спаны из файла; повреждённые строки пропускаются.
+
+        Аргументы:
+            trace_ids (Iterable): Только спаны этих трасс; по умолчанию все.
+        """
+        trace_ids = set(trace_ids)
+        if not self.path.exists():
+            return
+        with self.path.open(encoding='utf-8') as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if not trace_ids or event["args"]["trace_id"] in trace_ids:
+                    yield event
+
+    def clear(self) -> None:
+        """Удаляет файл трасс."""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+
+
+def trace_stream(content: Iterator[bytes], trace: Trace, parent_id: str | None,
+                 on_finish: Callable[[], None]) -> Iterator[bytes]:
+    """
+    Отдаёт части потокового ответа, формируя каждую в контексте трассы, и вызывает `on_finish` по окончании отдачи.
+
+    Аргументы:
+        content (Iterator): Части ответа.
+        trace (Trace): Трасса запроса.
+        parent_id (str | None): Id спана HTTP-запроса.
+        on_finish (Callable): Вызывается без аргументов после последней части или обрыва отдачи.
+    """
+    iterator = iter(content)
+    try:
+        while True:
+            with trace_request(trace, parent_id):
+                chunk = next(iterator, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        on_finish()
+
+
+exporter = TraceExporter.from_settings()
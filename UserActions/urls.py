@@ -1,6 +1,23 @@
 from django.urls import path
 
-from .views import comments, download_csv, general, user_data_view
+from .views import (
+    batch_datasets,
+    comments,
+    comments_async,
+    dataset_cache_stats,
+    download_csv,
+    general,
+    general_async,
+    ingest_logs,
+    log_writer_stats,
+    login_autocomplete,
+    metrics,
+    post_cache_stats,
+    profile_download,
+    profiles,
+    user_data_view,
+    user_data_view_async,
+)
 
 urlpatterns = [
     path('', user_data_view),
@@ -14,6 +31,49 @@ urlpatterns = [
     #API для получения общей информации о действиях пользователя
     #GET http://127.0.0.1:8000/api/general?login=<userloggin>
 
+    path('async/', user_data_view_async, name='index-async'),
+    #Домашняя страница (асинхронный вариант для ASGI)
+
+    path('api/async/comments/', comments_async, name='comments-async-api'),
+    path('api/async/general/', general_async, name='general-async-api'),
+    #Асинхронные варианты API comments и general для ASGI, параметры те же
+    #GET http://127.0.0.1:8000/api/async/comments?login=<userloggin>
+
+    path('api/batch/', batch_datasets, name='batch-api'),
+    #API для получения датасетов сразу для многих пользователей
+    #GET http://127.0.0.1:8000/api/batch?login=<login1>,<login2>
+    #POST http://127.0.0.1:8000/api/batch {"logins": [...], "datasets": ["comments", "general"]}
+
+    path('api/logins/', login_autocomplete, name='login-autocomplete'),
+    #Автодополнение логина для формы на главной странице
+    #GET http://127.0.0.1:8000/api/logins?term=<начало логина>&page=<номер страницы>
+
+    path('api/logs/ingest/', ingest_logs, name='ingest-logs'),
+    #Запись событий пачками (нужно право logs.add_log)
+    #POST http://127.0.0.1:8000/api/logs/ingest?batch_size=5000 [{"datetime": ..., "login": ..., "event_type": ..., "space_type": ..., "space_id": ...}]
+    #Также принимается NDJSON (Content-Type: application/x-ndjson)
+    #С параметром buffered=1 события ставятся в очередь фоновой записи (ответ 202, 503 при заполненной очереди)
+
+    path('api/logs/writer/stats/', log_writer_stats, name='log-writer-stats'),
+    #Метрики очереди фоновой записи логов (только для администраторов)
+
+    path('api/cache/stats/', dataset_cache_stats, name='dataset-cache-stats'),
+    #Счётчики кэша датасетов (только для администраторов)
+
+    path('api/cache/posts/stats/', post_cache_stats, name='post-cache-stats'),
+    #Счётчики и доля попаданий кэша метаданных постов (только для администраторов)
+
+    path('api/profiles/', profiles, name='profiles'),
+    path('api/profiles/<str:request_id>/', profile_download, name='profile-download'),
+    #Профили запросов, выполненных сотрудником с заголовком X-Profile: cprofile|sample
+    #или параметром ?profile=cprofile|sample (только для администраторов)
+    #GET http://127.0.0.1:8000/api/profiles/<request_id>/ — файл pstats или свёрнутые стеки для flamegraph
+
+    path('metrics', metrics, name='metrics'),
+    #Метрики процесса в формате Prometheus: время и размер ответов по представлениям,
+    #количество и время SQL-запросов по базам данных
+    #GET http://127.0.0.1:8000/metrics
+
     path("download_csv", download_csv, name="download_csv"),
     #Ссылка на скачивание csv датасета
 
@@ -1,27 +1,63 @@
+import asyncio
 import csv
-
-import requests
-from django.db.models import Count, Q
-from django.db.models.functions import TruncDate
-from django.http import HttpRequest, HttpResponse
+from collections.abc import Iterator
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render
+from django.urls import reverse
+from django.views.decorators.http import require_GET
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import AllowAny, BasePermission, IsAdminUser
 from rest_framework.response import Response
 
-from blogs.models import Post, User
-from logs.models import EventType, Log, SpaceType
+from blogs.models import User
 
+from .cache import dataset_cache
+from .conditional import dataset_condition
 from .forms import InputUserLogin
-from .serializers import CommentsSerializer, UserActivitySerializer
+from .ingest import INGEST_BATCH_SIZE, INGEST_MAX_BATCH_SIZE, ingest_events
+from .log_writer import LogWriterFull, log_writer
+from .metrics import CONTENT_TYPE, metrics_enabled, registry
+from .pagination import (
+    DatasetFilters,
+    InvalidDatasetParams,
+    encode_cursor,
+    parse_dataset_filters,
+)
+from .parsers import NDJSONParser
+from .posts import post_cache
+from .profiling import profile_store
+from .services import (
+    aget_comments_dataset,
+    aget_general_dataset,
+    build_batch_datasets,
+    get_comments_dataset,
+    get_general_dataset,
+    get_user_id,
+    iter_comment_rows,
+    iter_general_rows,
+    search_logins,
+)
+from .tracing import span
 
-API_COMMENT_URL = "http://127.0.0.1:8000/api/comments"
-API_GENERAL_URL = "http://127.0.0.1:8000/api/general"
 
 def get_data_from_api(login: str) -> tuple[list[dict], list[dict]]:
     """
-    Получает данные из двух API: для комментариев и общей активности пользователя.
+    Получает датасеты комментариев и общей активности пользователя.
+
+    Датасеты формируются сервисным слоем в том же процессе, без HTTP-запросов к собственным
+    эндпоинтам `/api/comments` и `/api/general`. Если пользователь не найден, возвращаются пустые списки.
 
     Args:
         login (str): Логин пользователя, для которого необходимо получить данные.
@@ -31,17 +67,68 @@ def get_data_from_api(login: str) -> tuple[list[dict], list[dict]]:
             - comment_data (list): Список словарей с данными о комментариях пользователя.
             - general_data (list): Список словарей с общей активностью пользователя.
     """
-    comment_response = requests.get(f"{API_COMMENT_URL}?login={login}")
-    general_response = requests.get(f"{API_GENERAL_URL}?login={login}")
+    try:
+        comments = get_comments_dataset(login)
+    except ObjectDoesNotExist:
+        comments = []
 
-    comments = comment_response.json() if comment_response.status_code == 200 else []
-    general = general_response.json() if general_response.status_code == 200 else []
+    try:
+        general = get_general_dataset(login)
+    except ObjectDoesNotExist:
+        general = []
 
     return comments, general
 
+class Echo:
+    """
+    Псевдобуфер для `csv.writer`: вместо записи возвращает переданную строку.
+
+    Позволяет получать очередную CSV-строку из `writer.writerow` и сразу отдавать её клиенту.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+CSV_DATASETS = {
+    "comments": ["user_login", "post_header", "post_author", "comment count"],
+    "general": ["date", "login_count", "logout_count", "blog_actions_count"],
+}
+
+
+def iter_csv_rows(login: str, dataset_type: str) -> Iterator[list]:
+    """
+    Построчно формирует строки CSV-файла с датасетом пользователя, включая заголовок.
+
+    Аргументы:
+        login (str): Логин пользователя.
+        dataset_type (str): Тип датасета — "comments" или "general".
+
+    Возвращает:
+        Iterator: Списки значений колонок; для несуществующего пользователя — только заголовок.
+    """
+    yield CSV_DATASETS[dataset_type]
+    try:
+        user_id = get_user_id(login)
+    except User.DoesNotExist:
+        return
+
+    if dataset_type == "comments":
+        for comment in iter_comment_rows(login, user_id):
+            yield [comment["login"], comment["header"], comment["author_login"], comment["comments_count"]]
+    else:
+        for activity in iter_general_rows(user_id):
+            yield [activity["date"], activity["logins"], activity["logouts"], activity["blog_actions"]]
+
+
+@dataset_condition
 def download_csv(request: HttpRequest, login: str, dataset_type: str) -> HttpResponse:
     """
-    Формирует и отправляет CSV-файл с данными для пользователя.
+    Формирует и потоково отправляет CSV-файл с данными для пользователя.
+
+    Строки читаются из базы данных пачками и сразу записываются в ответ, поэтому
+    потребление памяти не зависит от размера датасета. Ответ на GET содержит ETag
+    (см. `conditional.dataset_condition`); повторный запрос с ним получает 304 без чтения датасета.
 
     Args:
         request (HttpRequest): Запрос, который инициирует скачивание файла.
@@ -51,33 +138,23 @@ def download_csv(request: HttpRequest, login: str, dataset_type: str) -> HttpRes
             - "general" — для скачивания общей активности пользователя.
 
     Returns:
-        HttpResponse: Ответ с CSV-файлом, который будет отправлен пользователю для скачивания.
+        HttpResponse: Потоковый ответ с CSV-файлом или ответ с кодом 400 для неизвестного типа данных.
     """
-
-    comment_data, general_data = get_data_from_api(login)
-
-    response = HttpResponse(content_type="text/csv")
+    if dataset_type not in CSV_DATASETS:
+        return HttpResponse(content_type="text/csv", status=status.HTTP_400_BAD_REQUEST)
+
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in iter_csv_rows(login, dataset_type)),
+        content_type="text/csv",
+    )
     response["Content-Disposition"] = f'attachment; filename="{login}_{dataset_type}.csv"'
-
-    writer = csv.writer(response)
-
-    if dataset_type == "comments":
-        writer.writerow(["user_login", "post_header", "post_author", "comment count"])
-        for comment in comment_data:
-            writer.writerow([comment["login"], comment["header"], comment["author_login"], comment["comments_count"]])
-
-    elif dataset_type == "general":
-        writer.writerow(["date", "login_count", "logout_count", "blog_actions_count"])
-        for activity in general_data:
-            writer.writerow([activity["date"], activity["logins"], activity["logouts"], activity["blog_actions_count"]])
-    else:
-        response.status_code = status.HTTP_400_BAD_REQUEST
     return response
 
 def user_data_view(request: HttpRequest) -> HttpResponse:
     """
     Обрабатывает запросы на страницу с данными пользователя. Получает данные о комментариях и общей активности
-    пользователя из API и отображает их на странице. Также обрабатывает запросы на скачивание CSV-файлов.
+    пользователя через сервисный слой и отображает их на странице. Также обрабатывает запросы на скачивание CSV-файлов.
 
     Args:
         request (HttpRequest): Запрос от клиента. Может содержать данные формы для ввода логина пользователя.
@@ -87,32 +164,66 @@ def user_data_view(request: HttpRequest) -> HttpResponse:
     """
 
     if request.method == "POST":
-        form = InputUserLogin(request.POST)
-        if form.is_valid():
+        with span("InputUserLogin", 'view'):
+            form = InputUserLogin(request.POST)
+            valid = form.is_valid()
+        if valid:
             login = form.cleaned_data.get("custom_login") or form.cleaned_data.get("input_login")
-            comment_data, general_data = get_data_from_api(login)
 
             if "download_csv" in request.POST:
                 dataset_type = request.POST["dataset_type"]
-                return download_csv(login, dataset_type)
+                return download_csv(request, login, dataset_type)
 
-            return render(request, "index.html", {
-                "form": form,
-                "comment_data": comment_data,
-                "general_data": general_data
-            })
+            comment_data, general_data = get_data_from_api(login)
+
+            with span("render index.html", 'template'):
+                return render(request, "index.html", {
+                    "form": form,
+                    "comment_data": comment_data,
+                    "general_data": general_data
+                })
     else:
         form = InputUserLogin()
 
-    return render(request, "index.html", {"form": form})
+    with span("render index.html", 'template'):
+        return render(request, "index.html", {"form": form})
 
 
+def paginated(request: HttpRequest, data: list[dict] | dict, filters: DatasetFilters) -> list[dict] | dict:
+    """
+    Формирует тело ответа датасета, заменяя ключ следующей страницы ссылкой с курсором.
+
+    Аргументы:
+        request (HttpRequest): Исходный запрос.
+        data (list | dict): Датасет или страница датасета из сервисного слоя.
+        filters (DatasetFilters): Фильтры запроса.
+
+    Возвращает:
+        list | dict: Датасет без изменений или {"results": [...], "next": url | None}.
+    """
+    if not filters.paginated:
+        return data
+    next_url = None
+    if data["next"] is not None:
+        query = request.GET.copy()
+        query["cursor"] = encode_cursor(data["next"])
+        query["limit"] = str(filters.limit)
+        next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+    return {"results": data["results"], "next": next_url}
+
+
+@dataset_condition
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def comments(request: HttpRequest) -> HttpResponse:
     """
     Получает данные о комментариях пользователя из базы данных и возвращает их в формате JSON.
 
+    Параметры `from` и `to` ограничивают период логов (`to` не включительно). Параметры `limit`
+    и `cursor` включают постраничную выдачу по id поста: ответ имеет вид {"results": [...], "next": url}.
+    Ответ содержит ETag по версии данных пользователя; запрос с совпадающим
+    If-None-Match получает 304 до построения датасета.
+
     Аргументы:
         request (HttpRequest): Запрос, содержащий логин пользователя.
 
@@ -121,46 +232,25 @@ def comments(request: HttpRequest) -> HttpResponse:
     """
     try:
         login = request.GET.get('login')
-
-        comment_event = EventType.objects.using('logs_db').get(name="comment")
-        user_id = User.objects.using('blogs_db').get(login=login).id
-
-        logs = (
-            Log.objects.using('logs_db')
-            .filter(event_type=comment_event, user_id=user_id)
-            .values('space_id')
-            .annotate(comments_count=Count('id'))
-        )
-
-        post_ids = {log['space_id'] for log in logs}
-        posts = {
-            post.id: {"header": post.header, "author_id": post.author_id}
-            for post in Post.objects.using('blogs_db').filter(id__in=post_ids)
-        }
-
-        author_ids = {post.author_id for post in Post.objects.using('blogs_db').filter(id__in=post_ids)}
-        authors = {user.id: user.login for user in User.objects.using('blogs_db').filter(id__in=author_ids)}
-
-        data = [
-            {
-                "login": login,
-                "header": posts.get(log['space_id'], {}).get("header", "Unknown"),
-                "author_login": authors.get(posts.get(log['space_id'], {}).get("author_id"), "Unknown"),
-                "comments_count": log["comments_count"],
-            }
-            for log in logs
-        ]
-
-        serializer = CommentsSerializer(data, many=True)
-        return Response(serializer.data, status=200)
+        filters = parse_dataset_filters(request.GET)
+        return Response(paginated(request, get_comments_dataset(login, filters), filters), status=200)
+    except InvalidDatasetParams as error:
+        return Response({'error': str(error)}, status=400)
     except:
         return Response({'error': 'Login is required'}, status=400)
+@dataset_condition
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def general(request: HttpRequest) -> HttpResponse:
     """
     Получает данные о входах, выходах и действиях пользователя в блоге из базы данных и возвращает их в формате JSON.
 
+    Параметры `from` и `to` ограничивают период логов (`to` не включительно). Параметры `limit`
+    и `cursor` включают постраничную выдачу по дате: ответ имеет вид {"results": [...], "next": url}.
+    Параметр `granularity` (hour, day, week или month; по умолчанию day) задаёт интервал группировки,
+    `tz` — часовой пояс интервалов и значений `from`/`to` без смещения (по умолчанию TIME_ZONE).
+    Ответ содержит ETag (см. `comments`).
+
     Аргументы:
         request (HttpRequest): Запрос, содержащий логин пользователя.
 
@@ -169,35 +259,336 @@ def general(request: HttpRequest) -> HttpResponse:
     """
     try:
         login = request.GET.get('login')
+        filters = parse_dataset_filters(request.GET)
+        return Response(paginated(request, get_general_dataset(login, filters), filters), status=200)
+    except InvalidDatasetParams as error:
+        return Response({'error': str(error)}, status=400)
+    except:
+        return Response({'error': 'Login is required'}, status=400)
 
-        login_event = EventType.objects.using('logs_db').get(name="login")
-        logout_event = EventType.objects.using('logs_db').get(name="logout")
-        blog_space_type = SpaceType.objects.using('logs_db').get(name="blog")
-        user_id = User.objects.using('blogs_db').get(login=login).id
-
-        logs = (
-            Log.objects.using('logs_db')
-            .annotate(date=TruncDate('datetime'))
-            .values('date')
-            .annotate(
-                logins=Count('id', filter=Q(event_type=login_event)),
-                logouts=Count('id', filter=Q(event_type=logout_event)),
-                blog_actions=Count('id', filter=Q(space_type=blog_space_type))
-            )
-            .filter(user_id=user_id)
-        )
-
-        data = [
-            {
-                "date": log['date'],
-                "logins": log['logins'],
-                "logouts": log['logouts'],
-                "blog_actions_count": log['blog_actions']
-            }
-            for log in logs
-        ]
-
-        serializer = UserActivitySerializer(data, many=True)
-        return Response(serializer.data, status=200)
+
+# Асинхронные варианты для запуска под ASGI (например, `uvicorn testtask.asgi:application`).
+# DRF не поддерживает async-представления, поэтому они возвращают `JsonResponse`
+# с тем же телом и кодами ответа, что и синхронные `comments` и `general`.
+
+async def aget_data_from_api(login: str) -> tuple[list[dict], list[dict]]:
+    """
+    Асинхронный вариант `get_data_from_api`: датасеты comments и general вычисляются одновременно.
+
+    Args:
+        login (str): Логин пользователя, для которого необходимо получить данные.
+
+    Returns:
+        tuple: Список комментариев и список общей активности пользователя.
+    """
+    async def or_empty(dataset):
+        try:
+            return await dataset
+        except ObjectDoesNotExist:
+            return []
+
+    comments, general = await asyncio.gather(
+        or_empty(aget_comments_dataset(login)),
+        or_empty(aget_general_dataset(login)),
+    )
+    return comments, general
+
+
+async def user_data_view_async(request: HttpRequest) -> HttpResponse:
+    """
+    Асинхронный вариант `user_data_view`.
+
+    Args:
+        request (HttpRequest): Запрос от клиента. Может содержать данные формы для ввода логина пользователя.
+
+    Returns:
+        HttpResponse: Ответ с рендером страницы, на которой отображаются данные пользователя и форма для ввода логина.
+    """
+    if request.method == "POST":
+        form = InputUserLogin(request.POST)
+        if await sync_to_async(form.is_valid)():
+            login = form.cleaned_data.get("custom_login") or form.cleaned_data.get("input_login")
+
+            if "download_csv" in request.POST:
+                dataset_type = request.POST["dataset_type"]
+                return download_csv(request, login, dataset_type)
+
+            comment_data, general_data = await aget_data_from_api(login)
+
+            return render(request, "index.html", {
+                "form": form,
+                "comment_data": comment_data,
+                "general_data": general_data
+            })
+    else:
+        form = InputUserLogin()
+
+    return render(request, "index.html", {"form": form})
+
+
+@require_GET
+async def comments_async(request: HttpRequest) -> HttpResponse:
+    """
+    Асинхронный вариант эндпоинта `comments` с теми же параметрами и форматом ответа.
+
+    Аргументы:
+        request (HttpRequest): Запрос, содержащий логин пользователя.
+
+    Возвращает:
+        JsonResponse: Датасет comments или ошибка.
+    """
+    try:
+        login = request.GET.get('login')
+        filters = parse_dataset_filters(request.GET)
+        data = await aget_comments_dataset(login, filters)
+        return JsonResponse(paginated(request, data, filters), status=200, safe=False,
+                            json_dumps_params={'ensure_ascii': False})
+    except InvalidDatasetParams as error:
+        return JsonResponse({'error': str(error)}, status=400)
     except:
-        return Response({'error': 'Login is required'}, status=400)
\ No newline at end of file
+        return JsonResponse({'error': 'Login is required'}, status=400)
+
+
+@require_GET
+async def general_async(request: HttpRequest) -> HttpResponse:
+    """
+    Асинхронный вариант эндпоинта `general` с теми же параметрами и форматом ответа.
+
+    Аргументы:
+        request (HttpRequest): Запрос, содержащий логин пользователя.
+
+    Возвращает:
+        JsonResponse: Датасет general или ошибка.
+    """
+    try:
+        login = request.GET.get('login')
+        filters = parse_dataset_filters(request.GET)
+        data = await aget_general_dataset(login, filters)
+        return JsonResponse(paginated(request, data, filters), status=200, safe=False,
+                            json_dumps_params={'ensure_ascii': False})
+    except InvalidDatasetParams as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except:
+        return JsonResponse({'error': 'Login is required'}, status=400)
+
+
+BATCH_DATASETS = ("comments", "general")
+BATCH_MAX_LOGINS = 10000
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+def batch_datasets(request: HttpRequest) -> HttpResponse:
+    """
+    Возвращает датасеты comments и general сразу для многих пользователей.
+
+    Логины передаются через GET-параметр `login=a,b,c` или в теле POST-запроса
+    `{"logins": [...], "datasets": [...]}`. Набор датасетов задаётся параметром `datasets`
+    (по умолчанию — оба).
+
+    Аргументы:
+        request (HttpRequest): Запрос со списком логинов.
+
+    Возвращает:
+        Response: {"results": {логин: {датасет: строки}}, "missing": [несуществующие логины]}
+        или ошибку 400, если логины или датасеты указаны неверно.
+    """
+    if request.method == 'POST':
+        logins = request.data.get('logins')
+        datasets = request.data.get('datasets', list(BATCH_DATASETS))
+    else:
+        logins = [login for login in request.GET.get('login', '').split(',') if login]
+        datasets = request.GET.get('datasets', ','.join(BATCH_DATASETS)).split(',')
+
+    if not isinstance(logins, list) or not logins or not all(isinstance(login, str) for login in logins):
+        return Response({'error': 'Logins are required'}, status=400)
+    if len(logins) > BATCH_MAX_LOGINS:
+        return Response({'error': f'At most {BATCH_MAX_LOGINS} logins per request'}, status=400)
+    if not isinstance(datasets, list) or not datasets or not set(datasets) <= set(BATCH_DATASETS):
+        return Response({'error': f'Datasets must be a subset of {list(BATCH_DATASETS)}'}, status=400)
+
+    results, missing = build_batch_datasets(logins, datasets)
+    return Response({"results": results, "missing": missing}, status=200)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def dataset_cache_stats(request: HttpRequest) -> HttpResponse:
+    """
+    Возвращает счётчики кэша датасетов текущего процесса: попадания, промахи, вытеснения и инвалидации.
+
+    Аргументы:
+        request (HttpRequest): Запрос администратора.
+
+    Возвращает:
+        Response: Счётчики кэша в формате JSON.
+    """
+    return Response(dataset_cache.stats(), status=200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def post_cache_stats(request: HttpRequest) -> HttpResponse:
+    """
+    Возвращает счётчики кэша метаданных постов текущего процесса, включая долю попаданий.
+
+    Аргументы:
+        request (HttpRequest): Запрос администратора.
+
+    Возвращает:
+        Response: Счётчики кэша в формате JSON.
+    """
+    return Response(post_cache.stats(), status=200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def log_writer_stats(request: HttpRequest) -> HttpResponse:
+    """
+    Возвращает метрики буферизованной записи логов текущего процесса: глубину очереди,
+    количество записанных, отклонённых и не принятых событий и время записи пачек.
+
+    Аргументы:
+        request (HttpRequest): Запрос администратора.
+
+    Возвращает:
+        Response: Метрики в формате JSON.
+    """
+    return Response(log_writer.stats(), status=200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profiles(request: HttpRequest) -> HttpResponse:
+    """
+    Возвращает список сохранённых профилей запросов (см. `ProfilingMiddleware`), начиная с последних.
+
+    Аргументы:
+        request (HttpRequest): Запрос администратора.
+
+    Возвращает:
+        Response: {"profiles": [...]} — id запроса, режим, метод, путь, представление, пользователь,
+        код ответа, время обработки и ссылка на скачивание профиля.
+    """
+    entries = [
+        {**entry, "url": request.build_absolute_uri(reverse('profile-download', args=[entry["request_id"]]))}
+        for entry in profile_store.entries()
+    ]
+    return Response({"profiles": entries}, status=200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_download(request: HttpRequest, request_id: str) -> HttpResponse:
+    """
+    Отдаёт файл профиля запроса: pstats (`.prof`) для режима cprofile или свёрнутые стеки (`.folded`) для sample.
+
+    Аргументы:
+        request (HttpRequest): Запрос администратора.
+        request_id (str): Id профилированного запроса.
+
+    Возвращает:
+        FileResponse: Файл профиля.
+
+    Исключения:
+        Http404: Если профиля нет.
+    """
+    found = profile_store.get(request_id)
+    if found is None:
+        raise Http404("Profile not found")
+    entry, path = found
+    content_type = 'application/octet-stream' if entry["mode"] == 'cprofile' else 'text/plain; charset=utf-8'
+    return FileResponse(path.open('rb'), as_attachment=True, filename=entry["file"], content_type=content_type)
+
+
+@require_GET
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Отдаёт метрики процесса в текстовом формате Prometheus (см. `UserActions.metrics`).
+
+    Аргументы:
+        request (HttpRequest): Запрос сборщика метрик.
+
+    Возвращает:
+        HttpResponse: Метрики или 404, если сбор метрик отключён настройкой `METRICS['ENABLED']`.
+    """
+    if not metrics_enabled():
+        raise Http404("Metrics are disabled")
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def login_autocomplete(request: HttpRequest) -> HttpResponse:
+    """
+    Возвращает страницу логинов для автодополнения поля логина в формате Select2.
+
+    Аргументы:
+        request (HttpRequest): Запрос с параметрами `term` (начало логина) и `page` (номер страницы).
+
+    Возвращает:
+        Response: {"results": [{"id": ..., "text": ...}], "more": ...}.
+    """
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    logins, more = search_logins(request.GET.get('term', ''), page)
+    return Response({
+        "results": [{"id": login, "text": login} for login in logins],
+        "more": more,
+    }, status=200)
+
+
+class CanAddLogs(BasePermission):
+    """Разрешает запись логов пользователям с правом `logs.add_log` (например, сервисным учётным записям)."""
+
+    def has_permission(self, request: HttpRequest, view) -> bool:
+        return request.user.has_perm('logs.add_log')
+
+
+@api_view(['POST'])
+@permission_classes([CanAddLogs])
+@parser_classes([JSONParser, NDJSONParser])
+def ingest_logs(request: HttpRequest) -> HttpResponse:
+    """
+    Записывает пачки событий в таблицу логов.
+
+    Тело запроса — JSON-массив событий (`application/json`) или по одному событию в строке
+    (`application/x-ndjson`); формат события описан в `ingest.parse_event`. События записываются
+    пачками по `batch_size` (GET-параметр, по умолчанию `INGEST_BATCH_SIZE`), каждая — одной транзакцией.
+    С параметром `buffered=1` события только ставятся в очередь фоновой записи (`log_writer`),
+    а неверные события отклоняются при записи и учитываются в метриках очереди.
+
+    Аргументы:
+        request (HttpRequest): Запрос с событиями.
+
+    Возвращает:
+        Response: {"accepted": ..., "rejected": ..., "batches": [отчёты по пачкам]};
+        для `buffered=1` — {"queued": ...} со статусом 202 или 503, если очередь заполнена;
+        ошибку 400, если тело не является массивом или потоком событий.
+    """
+    try:
+        batch_size = min(max(int(request.GET.get('batch_size', INGEST_BATCH_SIZE)), 1), INGEST_MAX_BATCH_SIZE)
+    except ValueError:
+        return Response({'error': 'Invalid batch_size'}, status=400)
+    events = request.data
+    if isinstance(events, (dict, str)) or not hasattr(events, '__iter__'):
+        return Response({'error': 'Expected a JSON array or NDJSON'}, status=400)
+
+    if request.GET.get('buffered') == '1':
+        queued = 0
+        for event in events:
+            try:
+                log_writer.write(event)
+            except LogWriterFull:
+                return Response({'error': 'Log writer queue is full', 'queued': queued}, status=503,
+                                headers={'Retry-After': '1'})
+            queued += 1
+        return Response({"queued": queued}, status=202)
+
+    reports = ingest_events(events, batch_size)
+    return Response({
+        "accepted": sum(report.accepted for report in reports),
+        "rejected": sum(report.rejected for report in reports),
+        "batches": [report.as_dict() for report in reports],
+    }, status=200)
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, router
 
 
 # Create your models here.
@@ -46,6 +46,43 @@ class EventType(models.Model):
         managed = False
 
 
+class LogQuerySet(models.QuerySet):
+    """
+    QuerySet логов, маршрутизируемый по шардам пользователей.
+
+    Без явного `.using(...)` фильтр по конкретному `user_id` передаётся маршрутизатору как подсказка
+    `user_id`, поэтому чтение, изменение и удаление логов пользователя выполняются в его шарде.
+    `create` и `bulk_create` записывают каждый лог в базу, выбранную маршрутизатором для этого лога.
+    """
+
+    def _filter_or_exclude(self, negate, args, kwargs):
+        clone = super()._filter_or_exclude(negate, args, kwargs)
+        user_id = kwargs.get('user_id', kwargs.get('user_id__exact'))
+        if not negate and isinstance(user_id, int):
+            clone._hints = {**clone._hints, 'user_id': user_id}
+        return clone
+
+    def create(self, **kwargs):
+        """Создаёт лог в базе, выбранной маршрутизатором для него, если база не указана явно."""
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Записывает логи пачками по базам, выбранным маршрутизатором для каждого лога, если база не указана явно."""
+        if self._db is not None:
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        groups = {}
+        for obj in objs:
+            groups.setdefault(router.db_for_write(self.model, instance=obj), []).append(obj)
+        for db, group in groups.items():
+            self.using(db).bulk_create(group, *args, **kwargs)
+        return objs
+
+
 class Log(models.Model):
     """
     Модель для логирования событий в приложении 'logs'.
@@ -71,7 +108,92 @@ class Log(models.Model):
     event_type = models.ForeignKey(EventType, on_delete=models.CASCADE)
     space_id = models.IntegerField()
 
+    objects = LogQuerySet.as_manager()
+
     class Meta:
         db_table = 'logs'
         app_label = 'logs'
         managed = False
+
+
+class DailyActivity(models.Model):
+    """
+    Модель для дневной сводки активности пользователя в приложении 'logs'.
+
+    Хранит заранее посчитанные по таблице 'logs' количества входов, выходов и действий в блоге
+    пользователя за день (UTC). Таблица заполняется инкрементально командой `rollup_activity`
+    по строкам логов с id больше отметки из `ActivityRollupState`.
+
+    Атрибуты:
+        user_id (IntegerField): Идентификатор пользователя.
+        date (DateField): Дата (UTC).
+        logins (IntegerField): Количество входов за день.
+        logouts (IntegerField): Количество выходов за день.
+        blog_actions (IntegerField): Количество действий в пространстве blog за день.
+        events (IntegerField): Количество всех логов за день; при удалении последнего строка удаляется.
+
+    Метаданные:
+        db_table (str): Имя таблицы в базе данных — 'daily_activity'.
+        app_label (str): Метка приложения, к которому принадлежит модель — 'logs'.
+        managed (bool): Указывает, что эта модель не управляется Django (не создается и не мигрируется автоматически).
+    """
+    user_id = models.IntegerField()
+    date = models.DateField()
+    logins = models.IntegerField(default=0)
+    logouts = models.IntegerField(default=0)
+    blog_actions = models.IntegerField(default=0)
+    events = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_activity'
+        app_label = 'logs'
+        managed = False
+
+
+class ActivityRollupState(models.Model):
+    """
+    Модель для отметки обработанных логов в приложении 'logs'.
+
+    Содержит одну строку с id последнего лога, учтённого в `DailyActivity`.
+
+    Атрибуты:
+        last_log_id (IntegerField): Наибольший id лога, уже учтённый в сводке.
+
+    Метаданные:
+        db_table (str): Имя таблицы в базе данных — 'daily_activity_state'.
+        app_label (str): Метка приложения, к которому принадлежит модель — 'logs'.
+        managed (bool): Указывает, что эта модель не управляется Django (не создается и не мигрируется автоматически).
+    """
+    last_log_id = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_activity_state'
+        app_label = 'logs'
+        managed = False
+
+
+class CommentCounter(models.Model):
+    """
+    Модель для счётчика комментариев пользователя к посту в приложении 'logs'.
+
+    Таблица поддерживается триггерами SQLite на таблице 'logs' (см. `UserActions.counters`)
+    и совпадает с количеством логов типа comment по каждой паре пользователь — пост.
+
+    Атрибуты:
+        user_id (IntegerField): Идентификатор пользователя.
+        post_id (IntegerField): Идентификатор поста (space_id лога).
+        comment_count (IntegerField): Количество комментариев пользователя к посту.
+
+    Метаданные:
+        db_table (str): Имя таблицы в базе данных — 'comment_counters'.
+        app_label (str): Метка приложения, к которому принадлежит модель — 'logs'.
+        managed (bool): Указывает, что эта модель не управляется Django (не создается и не мигрируется автоматически).
+    """
+    user_id = models.IntegerField()
+    post_id = models.IntegerField()
+    comment_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'comment_counters'
+        app_label = 'logs'
+        managed = False
@@ -14,3 +14,13 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'testtask.settings')
 
 application = get_asgi_application()
+
+# Справочники типов загружаются один раз при старте процесса, а не в первом запросе.
+# ASGI-серверы импортируют приложение внутри цикла событий, где Django запрещает
+# синхронные запросы к базе, поэтому загрузка выполняется в отдельном потоке.
+from concurrent.futures import ThreadPoolExecutor  # noqa: E402
+
+from UserActions.dimensions import dimensions  # noqa: E402
+
+with ThreadPoolExecutor(max_workers=1) as executor:
+    executor.submit(dimensions.preload).result()
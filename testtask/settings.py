@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,11 +48,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'UserActions.middleware.MetricsMiddleware',
+    'UserActions.middleware.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'UserActions.middleware.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'UserActions.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,6 +82,58 @@ TEMPLATES = [
 WSGI_APPLICATION = 'testtask.wsgi.application'
 
 
+# SQLite journal. WAL lets readers proceed while logs are being appended; synchronous=NORMAL
+# is durable in WAL mode except for the last transactions on power loss. Switching a database
+# to WAL rewrites its file header, and the database files in this repository are tracked, so
+# WAL is opt-in (SQLITE_WAL=1) and the rollback journal with synchronous=FULL is the default.
+
+SQLITE_WAL = os.environ.get('SQLITE_WAL') == '1'
+
+SQLITE_JOURNAL = (
+    {'journal_mode': 'WAL', 'synchronous': 'NORMAL'} if SQLITE_WAL
+    else {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+)
+
+# SQLite performance profile per alias, applied as PRAGMAs on every new connection.
+# cache_size < 0 is in KiB.
+
+SQLITE_PROFILES = {
+    'default': {
+        **SQLITE_JOURNAL,
+        'cache_size': -8000,
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+    },
+    'blogs_db': {
+        **SQLITE_JOURNAL,
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    'logs_db': {
+        **SQLITE_JOURNAL,
+        'cache_size': -64000,
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Keep connections open between requests and check them before reuse.
+SQLITE_CONN_MAX_AGE = 600
+
+
+def sqlite_options(alias: str) -> dict:
+    """Returns sqlite3 OPTIONS with the alias profile as init_command PRAGMAs."""
+    pragmas = "; ".join(f"PRAGMA {name} = {value}" for name, value in SQLITE_PROFILES[alias].items())
+    return {
+        'init_command': pragmas,
+        # Writers take the lock at BEGIN instead of failing to upgrade a read lock.
+        'transaction_mode': 'IMMEDIATE',
+        # Seconds to wait for a lock held by another connection.
+        'timeout': 20,
+    }
+
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -84,6 +141,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': sqlite_options('default'),
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
         'TEST': {
             'NAME': BASE_DIR / 'test_db.sqlite3',
             'DEPENDENCIES': [],
@@ -92,6 +152,9 @@ DATABASES = {
     'blogs_db': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'blogs_db.sqlite3',
+        'OPTIONS': sqlite_options('blogs_db'),
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
         'TEST': {
             'NAME': BASE_DIR / 'test_blogs_db.sqlite3',
             'DEPENDENCIES': [],
@@ -101,6 +164,9 @@ DATABASES = {
     'logs_db': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'logs_db.sqlite3',
+        'OPTIONS': sqlite_options('logs_db'),
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
         'TEST': {
             'NAME': BASE_DIR / 'test_logs_db.sqlite3',
             'DEPENDENCIES': [],
@@ -109,6 +175,24 @@ DATABASES = {
     }
 }
 
+# Monthly log partitions (UserActions.partitions): every logs_YYYY_MM.sqlite3 file in this
+# directory is registered as a database alias of the same name, here at startup and by
+# UserActions.partitions.discover_partitions for files created later by another process.
+
+LOG_PARTITIONS_DIR = BASE_DIR / 'log_partitions'
+
+for partition in sorted(LOG_PARTITIONS_DIR.glob('logs_[0-9][0-9][0-9][0-9]_[0-9][0-9].sqlite3')):
+    DATABASES[partition.stem] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': partition,
+        'OPTIONS': sqlite_options('logs_db'),
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {
+            'MIRROR': partition.stem,
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -153,6 +237,26 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DATABASE_ROUTERS = ['UserActions.db_routers.BlogsDBRouter', 'UserActions.db_routers.LogsDBRouter']
 
+# Read replicas per primary alias: reads are spread across them, writes go to the primary.
+# Each replica needs its own DATABASES entry (e.g. 'logs_db_replica1' pointing at a copy of
+# logs_db.sqlite3 refreshed by `manage.py sync_replicas`, with TEST MIRROR set to the primary).
+
+DATABASE_REPLICAS = {
+    'blogs_db': [],
+    'logs_db': [],
+}
+
+# User-hash sharding of the logs table (UserActions.sharding): a user's logs live in
+# LOG_SHARDS[user_id % len(LOG_SHARDS)] unless pinned elsewhere by a LogShardOverride row.
+# Every shard is a DATABASES entry shaped like logs_db; prepare new ones with
+# `manage.py reshard_logs prepare`. Pinned users are re-read every SHARD_MAP_TTL seconds.
+
+LOG_SHARDS = ['logs_db']
+
+SHARD_MAP_TTL = 5
+
+SHARD_SCATTER_WORKERS = 8
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
@@ -162,3 +266,91 @@ REST_FRAMEWORK = {
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+
+# Per-user cache of serialized comments/general datasets (UserActions.cache)
+
+DATASET_CACHE = {
+    'ENABLED': True,
+    'TTL': 300,
+    'MAX_ENTRIES': 10000,
+    'MAX_BYTES': 64 * 1024 * 1024,
+}
+
+
+# Process-wide cache of event/space type ids and login -> user id (UserActions.dimensions)
+
+DIMENSION_CACHE = {
+    'MAX_LOGINS': 100000,
+    'LOGIN_TTL': 300,
+    'NEGATIVE_TTL': 60,
+}
+
+
+# Process-wide LRU cache of post id -> (header, author login) for the comments dataset (UserActions.posts)
+
+POST_METADATA_CACHE = {
+    'MAX_ENTRIES': 50000,
+    'TTL': None,
+}
+
+
+# Background writer that batches log events off the request path (UserActions.log_writer)
+
+LOG_WRITER = {
+    'MAX_QUEUE': 100000,
+    'BATCH_SIZE': 5000,
+    'FLUSH_INTERVAL': 1.0,
+    'PUT_TIMEOUT': 0.5,
+    'SHUTDOWN_TIMEOUT': 10,
+}
+
+
+# Prometheus metrics at /metrics (UserActions.metrics): request latency and response size per view,
+# SQL query count and time per database alias. Bucket bounds are in seconds and bytes.
+
+METRICS = {
+    'ENABLED': True,
+    'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'SIZE_BUCKETS': (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+}
+
+
+# Opt-in log of slow SQL statements (UserActions.slow_queries): statements on DATABASES (and their
+# replicas, log partitions and shards) taking at least THRESHOLD_MS are appended to PATH as JSON lines
+# with params, calling view and EXPLAIN QUERY PLAN. Summarize with `manage.py slow_queries`.
+
+SLOW_QUERY_LOG = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 100,
+    'PATH': BASE_DIR / 'slow_queries.jsonl',
+    'DATABASES': ['blogs_db', 'logs_db'],
+    'EXPLAIN': True,
+}
+
+
+# On-demand profiling of single requests by staff users (UserActions.profiling): send
+# `X-Profile: cprofile|sample` or `?profile=cprofile|sample`. Profiles are stored in DIR under
+# the request id (X-Request-ID), oldest beyond MAX_PROFILES are removed. SAMPLE_INTERVAL is in seconds.
+
+PROFILING = {
+    'ENABLED': True,
+    'DIR': BASE_DIR / 'profiles',
+    'MAX_PROFILES': 200,
+    'SAMPLE_INTERVAL': 0.001,
+}
+
+
+# Request tracing (UserActions.tracing): a SAMPLE_RATE share of requests gets a trace with nested spans
+# for views, services, serializers, templates and every SQL query. Spans are appended to PATH as JSON
+# lines in Trace Event format; `manage.py traces export` converts them for chrome://tracing or Perfetto.
+
+TRACING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,
+    'PATH': BASE_DIR / 'traces.jsonl',
+}
+
+
+# Thread pool for database calls made by the async (ASGI) views (UserActions.services)
+
+ASYNC_DB_WORKERS = 32
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'testtask.settings')
 
 application = get_wsgi_application()
+
+# Справочники типов загружаются один раз при старте процесса, а не в первом запросе.
+from UserActions.dimensions import dimensions  # noqa: E402
+
+dimensions.preload()